@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from usau import archive, ratings, reports
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "usau", "data")
+_PATH = "/teams/events/match_report/?EventGameId="
+
+
+class TestArchive(unittest.TestCase):
+    def test_discover(self):
+        files = archive.discover(_DATA_DIR)
+        self.assertEqual(set(files["table"]), set(archive.TABLES))
+        self.assertTrue((files.groupby("event").size() == 4).all())
+        men = files[files["event"] == "2017_club_nationals_men"]
+        self.assertEqual(list(men["table"]), list(archive.TABLES))
+        self.assertEqual(set(men["division"]), {"club_men"})
+
+    def test_load_matches_per_event(self):
+        events = ["2017_club_nationals_men", "2018_d1college_nationals_women"]
+        loaded = archive.load_archive(_DATA_DIR, events=events)
+        self.assertEqual(loaded.events, sorted(events))
+        self.assertEqual(len(loaded.timings), 8)
+        for event in events:
+            rows = loaded.event(event, "match_results")
+            csv = pd.read_csv(os.path.join(
+                _DATA_DIR, event + "_match_results.csv"), index_col=0)
+            self.assertEqual(len(rows), len(csv))
+            self.assertEqual(list(rows["Score"]), list(csv["Score"]))
+        self.assertEqual(str(loaded.rosters["Team"].dtype), "category")
+        self.assertEqual(set(loaded.match_results["year"]), {2017, 2018})
+
+        team_ratings = ratings.TeamRatings.from_archive(loaded)
+        self.assertEqual(set(team_ratings.ratings["Division"]),
+                         {"club_men", "d1college_women"})
+
+    def test_dedupe_across_encodings(self):
+        data_dir = tempfile.mkdtemp()
+        try:
+            results = pd.DataFrame({
+                "url": [_PATH + "a%2b", _PATH + "a%2b", _PATH + "a+", _PATH + "a+"],
+                "Team": ["A", "B", "A", "B"], "Opponent": ["B", "A", "B", "A"],
+                "Score": [15, 10, 15, 10], "Opp Score": [10, 15, 10, 15]})
+            results.to_csv(os.path.join(data_dir, "2018_club_test_men_match_results.csv"))
+            results.to_csv(os.path.join(data_dir, "2018_club_test_women_match_results.csv"))
+            loaded = archive.load_archive(data_dir)
+            self.assertEqual(len(loaded.match_results), 4)
+            self.assertEqual(list(loaded.match_results.groupby("event", observed=True)
+                                  .size()), [2, 2])
+            loaded = archive.load_archive(data_dir, dedupe=False)
+            self.assertEqual(len(loaded.match_results), 8)
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_iter_matches_load(self):
+        loaded = archive.load_archive(_DATA_DIR, tables=["match_reports", "rosters"])
+        reader = archive.ArchiveReader(_DATA_DIR, tables=["match_reports", "rosters"],
+                                       max_bytes=4 << 20)
+        names = []
+        for event in reader:
+            name, = event.events
+            names.append(name)
+            for table in ("match_reports", "rosters"):
+                expected = loaded.event(name, table)
+                self.assertEqual(list(event.tables[table]["Name"]), list(expected["Name"]))
+        self.assertEqual(names, loaded.events)
+        self.assertLessEqual(reader.peak_bytes, 4 << 20)
+
+        # Estimates from the largest ratios seen cover every event read
+        self.assertEqual(sorted(reader.memory_ratios), ["match_reports", "rosters"])
+        for event in archive.ArchiveReader(_DATA_DIR, tables=["match_reports", "rosters"]):
+            self.assertGreaterEqual(reader.estimate(event.files), archive._memory(event))
+
+    def test_iter_filters_and_results(self):
+        reader = archive.ArchiveReader(_DATA_DIR, levels="club", years=[2017, 2018],
+                                       genders="mixed", results=True, read_ahead=2)
+        self.assertTrue(len(reader))
+        self.assertTrue(all(name.startswith(("2017_club_", "2018_club_")) and
+                            name.endswith("_mixed") for name in reader.events))
+        for results in reader:
+            self.assertEqual(results.gender, "mixed")
+            self.assertNotIn("event", results.match_results.columns)
+            self.assertTrue(len(results.rosters))
+            # Read as load_from_csvs reads the same files
+            expected = reports.USAUResults(results.event_info, results.gender, results.year)
+            expected.load_from_csvs(results.data_dir)
+            self.assertEqual(list(results.match_results.columns),
+                             list(expected.match_results.columns))
+            self.assertEqual(list(results.rosters.index), list(expected.rosters.index))
+
+        # Closing early signals the reader thread to stop
+        events = archive.iter_archive(_DATA_DIR)
+        next(events)
+        events.close()
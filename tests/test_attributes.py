@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+
+from usau import archive, attributes, schema
+
+
+class TestAttributes(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(attributes.parse_height("5'10\""), 70)
+        self.assertEqual(attributes.parse_height("6' 0\""), 72)
+        self.assertEqual(attributes.parse_height("6-2"), 74)
+        self.assertEqual(attributes.parse_height("68"), 68)
+        for junk in ("1'0\"", "10'11\"", "'\"", "", None, np.nan):
+            self.assertTrue(np.isnan(attributes.parse_height(junk)), junk)
+        self.assertEqual(attributes.parse_class_year("Jr."), 3)
+        self.assertEqual(attributes.parse_class_year(" fifth  Year"), 5)
+        self.assertTrue(np.isnan(attributes.parse_class_year("Alumni")))
+        self.assertEqual(attributes.parse_roles("Defense (Cutter/Handler)"),
+                         (True, True, True))
+        self.assertEqual(attributes.parse_roles("Dump"), (True, False, False))
+        self.assertEqual(attributes.parse_roles(np.nan), (False, False, False))
+
+    def test_normalize_rosters(self):
+        df = pd.DataFrame({"Height": ["5'10\"", np.nan, "1'0\"", "5'10\""],
+                           "Year": ["Sr", "Freshman", np.nan, "Grad"],
+                           "Position": ["Handler/Cutter", "Deep", np.nan, "Defense (Handler)"]})
+        for compact in (False, True):
+            if compact:
+                schema.apply_schema(df, "rosters")
+            attributes.normalize_rosters(df)
+            npt.assert_array_equal(df["Height Inches"], [70, np.nan, np.nan, 70])
+            npt.assert_array_equal(df["Class Year"], [4, 1, np.nan, 5])
+            self.assertEqual(list(df["Handler"]), [True, False, False, True])
+            self.assertEqual(list(df["Cutter"]), [True, True, False, False])
+            self.assertEqual(list(df["Defense"]), [False, False, False, True])
+
+    def test_range_index_matches_scan(self):
+        rosters = archive.load_archive(tables=["rosters"]).rosters
+        index = attributes.RosterIndex(rosters)
+        heights = rosters["Height Inches"]
+        expected = np.flatnonzero(((heights >= 66) & (heights <= 70)).values)
+        npt.assert_array_equal(index.range("Height Inches", 66, 70), expected)
+        npt.assert_array_equal(index.range("Height Inches", low=75),
+                               np.flatnonzero((heights >= 75).values))
+
+        expected = np.flatnonzero(((heights <= 67) & rosters["Handler"] &
+                                   (rosters["Goals"] >= 2)).values)
+        npt.assert_array_equal(
+            index.positions(ranges={"Height Inches": (None, 67), "Goals": (2, None)},
+                            roles=["Handler"]), expected)
+        self.assertEqual(len(index.query()), len(rosters))
+        self.assertTrue(index.query(roles=["Defense", "Cutter"])["Cutter"].all())
@@ -0,0 +1,76 @@
+import unittest
+
+import pandas as pd
+import pandas.testing as pdt
+
+from usau import archive, clean, reports
+
+
+class _Link(object):
+    def __init__(self, href, text):
+        self.attrs = {"href": href}
+        self.text = text
+
+
+class _OfflineResults(reports.USAUResults):
+    """Serves fixed html tables instead of the website"""
+    tables = {}
+
+    @classmethod
+    def get_html_tables(cls, url, match, header=None):
+        return [df.copy() for df in cls.tables[url, match]]
+
+
+_OfflineResults.tables = {
+    ("/game", "Total:"): [pd.DataFrame([["Alpha (1)", 1, 1, 2, "Total: 2"],
+                                        ["BETA (12)", 0, 1, 1, "Total: 1"]])],
+    ("/game", "Players"): [
+        pd.DataFrame({"Players": ["#7 JANE DOE", "#12 Ann McCray", "Unknown"],
+                      "G": [1, 1, 0], "A": [0, 1, 1], "D": [2, 0, 0], "T": [0, 1, 0]}),
+        pd.DataFrame({"Players": ["#1 BO LI"], "G": [1], "A": [0], "D": [0], "T": [3]}),
+    ],
+    ("/alpha", "Position"): [pd.DataFrame({"No.": [7], "Player": ["JANE DOE"],
+                                           "Position": ["Cutter"]})],
+    ("/beta", "Position"): [pd.DataFrame({"No.": [1], "Name": ["Bo Li"],
+                                          "Position": ["Handler"]})],
+}
+
+
+class TestClean(unittest.TestCase):
+    def test_match_reports_match_per_table(self):
+        reports_df = archive.load_archive(tables=["match_reports"],
+                                          events=["2018_club_nationals_mixed"]).match_reports
+        frames = clean.raw_match_reports(reports_df)
+        per_table = pd.concat([
+            reports.USAUResults.clean_match_report_stats(
+                frame.drop(list(clean.MATCH_REPORT_METADATA), axis=1)).join(
+                    frame[list(clean.MATCH_REPORT_METADATA)])
+            for frame in frames])
+        pdt.assert_frame_equal(clean.clean_match_reports(frames), per_table)
+
+    def test_scrape_match(self):
+        cleaned = _OfflineResults._scrape_match("/game")
+        raw = _OfflineResults._scrape_match("/game", clean=False)
+        pdt.assert_frame_equal(raw[0], cleaned[0])
+        pdt.assert_frame_equal(raw[2], cleaned[2])
+        self.assertIn("Players", raw[1].columns)
+        batch = clean.clean_match_reports([raw[1]])
+        pdt.assert_frame_equal(batch, cleaned[1])
+        self.assertEqual(list(batch["No."]), [7, 12, -1, 1])
+        self.assertEqual(list(batch["Name"]), ["Jane Doe", "Ann McCray", "Unknown", "Bo Li"])
+        # Already cleaned tables pass through, in order
+        pdt.assert_frame_equal(clean.clean_match_reports([cleaned[1], raw[1]]),
+                               pd.concat([cleaned[1], batch]))
+
+    def test_rosters(self):
+        links = [_Link("/alpha", "Alpha (1)"), _Link("/beta", "The (Other) BETA (12)")]
+        per_table = pd.concat([_OfflineResults._scrape_roster(link, verbose=False)
+                               for link in links])
+        per_table["Name"] = per_table["Name"].apply(reports.title_name)
+        per_table["UpperName"] = per_table["Name"].str.upper()
+        batch = clean.clean_rosters([_OfflineResults._scrape_roster(link, verbose=False,
+                                                                    clean=False)
+                                     for link in links])
+        pdt.assert_frame_equal(batch, per_table)
+        self.assertEqual(list(batch["Team"]), ["Alpha", "The (Other) BETA"])
+        self.assertEqual(list(batch["Seed"]), [1, 12])
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from usau import archive
+from usau.cube import STATS, StatCube
+
+
+class TestStatCube(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.reports = archive.load_archive(tables=["match_reports"],
+                                           events=["2018_club_nationals_men",
+                                                   "2018_club_us-open_men"]).match_reports
+        cls.cube = StatCube.from_match_reports(cls.reports)
+
+    def _groupby(self):
+        grouped = self.reports.groupby(["division", "Team", "UpperName"], observed=True)
+        players = self.cube.players.set_index(["division", "Team", "UpperName"]).index
+        return grouped, players
+
+    def test_reductions_match_groupby(self):
+        grouped, players = self._groupby()
+        totals = grouped[list(STATS)].sum().reindex(players)
+        npt.assert_array_equal(self.cube.totals().values, totals.values)
+        games = grouped["url"].nunique().reindex(players)
+        npt.assert_array_equal(self.cube.games_played().values, games.values)
+        npt.assert_allclose(self.cube.per_game()["Goals"].values,
+                            (totals["Goals"] / games).values)
+
+        share = self.cube.team_share("Goals")
+        team_sums = share.groupby(self.cube.players["team_code"]).sum()
+        npt.assert_allclose(team_sums[team_sums > 0], 1)
+
+    def test_scores_are_matrix_products(self):
+        grouped, players = self._groupby()
+        totals = grouped[list(STATS)].sum().reindex(players)
+        weights = {"Goals": 1, "Assists": 1, "Ds": 1, "Turns": -0.5}
+        expected = (totals["Goals"] + totals["Assists"] + totals["Ds"] -
+                    0.5 * totals["Turns"]).values
+        npt.assert_allclose(self.cube.scores(weights), expected)
+        both = self.cube.scores(np.array([[1, 1], [1, 0], [1, 0.2], [-0.5, -0.2]]))
+        npt.assert_allclose(both[:, 0], expected)
+        self.assertEqual(self.cube.game_scores(weights).shape, self.cube.shape[:2])
+
+        top = self.cube.leaderboard(weights, n=5)
+        self.assertEqual(list(top["Score"]), sorted(expected, reverse=True)[:5])
+
+    def test_subset_and_opponent_adjusted(self):
+        team = self.cube.team_players("Sub Zero")
+        self.assertTrue(len(team))
+        subset = self.cube.subset(players=team)
+        self.assertEqual(subset.totals()["Goals"].sum(),
+                         self.cube.team_totals().loc[("club_men", "Sub Zero"), "Goals"])
+        factors = self.cube.opponent_factors("Goals")
+        self.assertAlmostEqual(np.nanmean(factors), 1)
+        adjusted = self.cube.opponent_adjusted("Goals")
+        self.assertEqual(len(adjusted), len(self.cube.players))
+
+    def test_teams_keyed_by_division(self):
+        reports = archive.load_archive(tables=["match_reports"],
+                                       events=["2017_d1college_nationals_men",
+                                               "2017_d1college_nationals_women"]).match_reports
+        cube = StatCube.from_match_reports(reports)
+        totals = cube.team_totals()
+        self.assertEqual(sorted(totals.loc[(slice(None), "Oregon"), :].index.get_level_values(0)),
+                         ["d1college_men", "d1college_women"])
+        with self.assertRaises(ValueError):
+            cube.team_players("Oregon")
+        for division in ("d1college_men", "d1college_women"):
+            expected = reports[((reports["division"] == division) &
+                                (reports["Team"] == "Oregon")).values]["Goals"].sum()
+            self.assertEqual(totals.loc[(division, "Oregon"), "Goals"], expected)
+            self.assertEqual(cube.subset(players=cube.team_players("Oregon", division))
+                             .totals()["Goals"].sum(), expected)
+        npt.assert_allclose(cube.team_share("Goals").groupby(
+            cube.players["team_code"]).sum().loc[lambda s: s > 0], 1)
+
+    def test_save_and_memmap(self):
+        path = tempfile.mkdtemp()
+        try:
+            self.cube.save(path)
+            loaded = StatCube.load(path)
+            self.assertIsInstance(loaded.values, np.memmap)
+            npt.assert_array_equal(loaded.values, self.cube.values)
+            npt.assert_array_equal(loaded.played, self.cube.played)
+            self.assertEqual(list(loaded.players["Name"]), list(self.cube.players["Name"]))
+            npt.assert_allclose(loaded.scores({"Goals": 1}), self.cube.scores({"Goals": 1}))
+            npt.assert_allclose(loaded.opponent_factors(), self.cube.opponent_factors())
+            self.assertEqual(loaded.teams, self.cube.teams)
+        finally:
+            shutil.rmtree(path)
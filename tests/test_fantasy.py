@@ -0,0 +1,64 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy.testing as npt
+
+from usau import fantasy
+
+_INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "usau", "data", "fantasy_input.txt")
+
+
+class TestFantasyIngestion(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        mens, womens = fantasy._contest_rosters(from_csv=True)
+        cls.rosters = {"Men": mens, "Women": womens}
+
+    def test_parse_text_and_html(self):
+        text = [u"[–]alice 2 points 3 hours ago\n", u"\n",
+                u"Men's: A, B*, C\n", u"Women: D*, E\n", u"permalink reply\n",
+                u"[–]bob 1 point\n", u"Men's: F\n"]
+        entries = list(fantasy.parse_entries(text))
+        self.assertEqual([user for user, _ in entries], ["alice", "bob"])
+        self.assertEqual(dict(entries[0][1]), {"Men": ["A", "B*", "C"], "Women": ["D*", "E"]})
+
+        html = [u'<div class="comment"><p class="tagline"><a>[–]</a><a class="author">',
+                u'alice</a> 2 points</p><div class="md"><p>Men&#39;s: A, B*,\n',
+                u" C</p><p>Women: D*, E</p></div></div>"]
+        self.assertEqual(list(fantasy.parse_entries(html)), entries[:1])
+
+        self.assertEqual(fantasy.lineup_errors(entries[0][1], size=3),
+                         ["Women: 2 players"])
+        self.assertEqual(fantasy.lineup_errors(entries[1][1], size=1),
+                         ["Men: 0 captains", "Women: missing"])
+
+    def test_ingest_and_score(self):
+        with io.open(_INPUT, encoding="utf-8") as fd:
+            contest = fantasy.Contest.ingest(fd, self.rosters)
+        self.assertEqual(len(contest), 13)
+        self.assertEqual(list(contest.rejected["User"]), ["duthracht"])
+        self.assertEqual(contest.picks["Men"].shape, (13, fantasy.LINEUP_SIZE))
+
+        path = tempfile.mkdtemp()
+        try:
+            contest.save(os.path.join(path, "contest.npz"))
+            loaded = fantasy.Contest.load(os.path.join(path, "contest.npz"))
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(loaded.to_input(), contest.to_input())
+        self.assertEqual(list(loaded.rejected["User"]), ["duthracht"])
+
+        # Entries resolve as the hand-entered input did, bar its corrections
+        results = fantasy.compute_fantasy_contest_results(
+            display=False, contest=loaded, mens=self.rosters["Men"],
+            womens=self.rosters["Women"])
+        expected = fantasy.compute_fantasy_contest_results(
+            display=False, mens=self.rosters["Men"], womens=self.rosters["Women"])
+        expected = expected[expected["User"].isin(results["User"]) &
+                            (expected["User"] != "samth")].set_index("User")
+        results = results.set_index("User").loc[expected.index]
+        npt.assert_allclose(results["Total"], expected["Total"])
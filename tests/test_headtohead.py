@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from usau import archive
+from usau.headtohead import HeadToHeadIndex
+
+
+class TestHeadToHead(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.archive = archive.load_archive(events=["2017_club_nationals_men",
+                                                   "2018_club_nationals_men"])
+        cls.index = HeadToHeadIndex.from_archive(cls.archive)
+
+    def _scan(self, team_a, team_b):
+        df = self.archive.match_results
+        return df[((df["Team"] == team_a) & (df["Opponent"] == team_b)).values]
+
+    def test_matches_scan(self):
+        for team_a, team_b in [("PoNY", "Chicago Machine"), ("Revolver", "Sub Zero")]:
+            scan = self._scan(team_a, team_b)
+            summary = self.index.summary(team_a, team_b)
+            self.assertEqual(summary["Games"], len(scan))
+            self.assertEqual(summary["Wins"], (scan["Score"] > scan["Opp Score"]).sum())
+            self.assertEqual(summary["Points Scored"], scan["Score"].sum())
+            self.assertEqual(summary["Margin"],
+                             (scan["Score"].astype(int) - scan["Opp Score"]).sum())
+            reverse = self.index.summary(team_b, team_a)
+            self.assertEqual(reverse["Losses"], summary["Wins"])
+            self.assertEqual(reverse["Margin"], -summary["Margin"])
+
+    def test_progression_and_halves(self):
+        games = self.index.games("Chicago Machine", "PoNY")
+        for game, half in zip(games["Game"], games["Half Margin"]):
+            points = self.index.progression(game, "Chicago Machine")
+            self.assertTrue(len(points))
+            at_half = points[np.flatnonzero(points.max(axis=1) >= 8)[0]]
+            self.assertEqual(half, at_half[0] - at_half[1])
+            final = games.set_index("Game").loc[game]
+            self.assertLessEqual(points[-1][0], final["Score"])
+            self.assertLessEqual(points[-1][1], final["Opp Score"])
+
+    def test_unknown_and_legacy(self):
+        self.assertEqual(self.index.summary("PoNY", "Nobody")["Games"], 0)
+        self.assertEqual(len(self.index.games("Nobody", "PoNY")), 0)
+        # Without score progressions, halves are unknown
+        index = HeadToHeadIndex(self.archive.match_results)
+        summary = index.summary("PoNY", "Chicago Machine")
+        self.assertEqual(summary["Games"], self.index.summary("PoNY", "Chicago Machine")["Games"])
+        self.assertTrue(pd.isnull(summary["Average First Half Margin"]))
+        self.assertEqual(len(index.progression(0)), 0)
+
+    def test_unreported_games(self):
+        games = pd.DataFrame({"Team": ["A", "B", "A", "C"], "Opponent": ["B", "A", "C", "A"],
+                              "Score": [15, 10, np.nan, np.nan],
+                              "Opp Score": [10, 15, np.nan, np.nan],
+                              "url": ["/g1", "/g1", "/g2", "/g2"]})
+        index = HeadToHeadIndex(games)
+        self.assertEqual(index.summary("A", "B")["Games"], 1)
+        self.assertEqual(index.summary("A", "C")["Games"], 0)
+        self.assertEqual(list(index.home_score), [15])
+
+    def test_namesakes_across_divisions(self):
+        college = archive.load_archive(events=["2018_d1college_nationals_men",
+                                               "2018_d1college_nationals_women",
+                                               "2019_d1college_nationals_women"])
+        index = HeadToHeadIndex.from_archive(college)
+        with self.assertRaises(ValueError):
+            index.games("Pittsburgh", "North Carolina")
+        mens = index.summary("Pittsburgh", "North Carolina", division="d1college_men")
+        self.assertEqual((mens["Games"], mens["Wins"]), (1, 0))
+        womens = index.games("Pittsburgh", "North Carolina", division="d1college_women")
+        self.assertEqual(list(womens["event"]), ["2018_d1college_nationals_women",
+                                                 "2019_d1college_nationals_women"])
+        self.assertEqual(index.pairs("Pittsburgh", division="d1college_men")["North Carolina"], 1)
+        self.assertEqual(index.summary("Pittsburgh", "Nobody", division="club_men")["Games"], 0)
+
+    def test_pairs(self):
+        opponents = self.index.pairs("PoNY")
+        self.assertIn("Chicago Machine", opponents)
+        self.assertEqual(sum(opponents.values()),
+                         (self.archive.match_results["Team"] == "PoNY").sum())
@@ -0,0 +1,31 @@
+import unittest
+
+import numpy as np
+
+from usau import leaderboard, reports
+
+
+class TestLeaderboard(unittest.TestCase):
+    def test_top_k_indices(self):
+        values = np.array([3., 1., np.nan, 5., 2., 2., 9., 0.])
+        top = leaderboard.top_k_indices(values, [0, 3, 8], 2)
+        np.testing.assert_array_equal(top[0], [0, 1])
+        np.testing.assert_array_equal(top[1], [6, 3])
+
+    def test_matches_full_sort(self):
+        events = [reports.USAUResults.from_event("club", 2019, gender)
+                  .load_from_csvs() for gender in ("men", "women")]
+        board = leaderboard.Leaderboard(events)
+        top = board.top(num_players=10)
+        for results in events:
+            expected = (board.frame.loc[board.frame["Event"] == results._name(), "+/-"]
+                        .sort_values(ascending=False).head(10).values)
+            actual = top.loc[top["Event"] == results._name(), "+/-"].values
+            np.testing.assert_array_equal(actual, expected)
+        tables = board.tables(num_players=5, sort_per_game=True)
+        self.assertEqual(list(tables), [r._name() for r in events])
+        self.assertTrue(all(len(t) == 5 for t in tables.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import io
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from usau import markdown
+
+
+class TestMarkdown(unittest.TestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({"Name": ["Jesse Shofner", "Han Chen", np.nan],
+                                   "Goals": [3, 11, 0],
+                                   "+/-pg": [1.5, 1 / 3., np.nan]})
+
+    def test_matches_record_renderer(self):
+        alignment = [('<', '>'), ('^', '^')]
+        for float_format in (None, lambda x: "%.2f" % x):
+            with pd.option_context('display.float_format', float_format):
+                expected = markdown.to_markdown(
+                    self.frame.values, [0, 1, 2], self.frame.columns,
+                    alignment=list(alignment))
+                self.assertEqual(
+                    markdown.pandas_to_markdown(self.frame, alignment=alignment),
+                    expected)
+
+    def test_streaming_fixed_width(self):
+        stream = io.StringIO()
+        markdown.write_markdown(self.frame, stream=stream, max_width=6,
+                                chunk_size=2)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0], "|  Name  | Goals  | +/-pg  |")
+        self.assertEqual(lines[2], "| Jess.. | 3      | 1.5    |")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import itertools
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+
+from usau import pickem, reports, simulate
+from usau.simulate import snake_pools
+
+_TEAMS = ["T{i}".format(i=i) for i in range(1, 17)]
+_BRACKET = [("T12", "T8"), ("T7", "T11"), ("T6", "T10"), ("T5", "T9"),  # Prequarters
+            ("T1", "T5"), ("T4", "T12"), ("T2", "T6"), ("T3", "T7"),  # Quarters
+            ("T1", "T4"), ("T2", "T3"),  # Semis
+            ("T8", "T10"), ("T16", "T13"),  # Placement games
+            ("T1", "T2")]  # Final
+
+
+def _match_results(bracket_games, seed=0):
+    """One row per game, winner first, in shuffled order"""
+    games = [(winner, loser) for pool in snake_pools(_TEAMS, 4)
+             for winner, loser in itertools.combinations(pool, 2)] + bracket_games
+    order = np.random.RandomState(seed).permutation(len(games))
+    return pd.DataFrame([{"Team": games[i][0], "Opponent": games[i][1], "Score": 15,
+                          "Opp Score": 13, "url": "/game{i}".format(i=i)} for i in order])
+
+
+class TestBracket(unittest.TestCase):
+    def test_finishes(self):
+        bracket = pickem.Bracket(_match_results(_BRACKET), _TEAMS)
+        self.assertEqual([sorted(pool) for pool in bracket.pools],
+                         [sorted(pool) for pool in snake_pools(_TEAMS, 4)])
+        finish = dict(zip(_TEAMS, np.array(pickem.ROUNDS)[bracket.finish]))
+        self.assertEqual(finish["T1"], "Champion")
+        self.assertEqual(finish["T2"], "Finalist")
+        self.assertEqual([finish[t] for t in ("T3", "T4")], ["Semis"] * 2)
+        self.assertEqual([finish[t] for t in ("T5", "T6", "T7", "T12")], ["Quarters"] * 4)
+        self.assertEqual([finish[t] for t in ("T8", "T9", "T10", "T11")], ["Prequarters"] * 4)
+        self.assertEqual([finish[t] for t in ("T13", "T14", "T15", "T16")], ["No Bracket"] * 4)
+        self.assertTrue(bracket.complete)
+
+        live = pickem.Bracket(_match_results(_BRACKET[:9], seed=1), _TEAMS)
+        frame = live.frame().set_index("Team")
+        self.assertEqual(list(frame.index[frame["Alive"]]), ["T1", "T2", "T3"])
+        self.assertEqual(list(frame.loc[["T1", "T2", "T4"], "Finish"]),
+                         ["Finalist", "Semis", "Semis"])
+
+    def test_event(self):
+        results = reports.club_nats_mixed_2017
+        results.load_from_csvs()
+        frame = pickem.Bracket.from_results(results).frame()
+        self.assertEqual(sorted(frame["Pool Finish"]), sorted(list(range(1, 5)) * 4))
+        self.assertEqual((frame["Finish"] != "No Bracket").sum(), 12)
+
+    def test_bracket_rematch_of_pool_mates(self):
+        # T1 beats T8 in pool play; T8 wins its prequarter and then the
+        # quarterfinal rematch, which is listed first
+        pool_games = _match_results([("T8", "T11")])
+        rematch = pd.DataFrame([{"Team": "T8", "Opponent": "T1", "Score": 15,
+                                 "Opp Score": 10, "url": "/rematch"}])
+        games = pd.concat([rematch, pool_games], ignore_index=True)
+        pools = snake_pools(_TEAMS, 4)
+        for pool_urls in (set(pool_games["url"]) - {"/game24"}, None):
+            # Without the pool games' urls, the meeting that fits a bracket is taken
+            bracket = pickem.Bracket(games, _TEAMS, pools=pools, pool_urls=pool_urls)
+            frame = bracket.frame().set_index("Team")
+            self.assertEqual(list(frame.loc[["T1", "T8"], "Pool Finish"]), [1, 2])
+            self.assertEqual(list(frame.loc[["T1", "T8"], "Finish"]), ["Quarters", "Semis"])
+            self.assertEqual(list(frame.loc[["T1", "T8"], "Alive"]), [False, True])
+            self.assertIn("/rematch", bracket.bracket_urls)
+
+    def test_played_event(self):
+        results = reports.USAUResults.from_event("club", 2018, "men")
+        results.load_from_csvs()
+        bracket = pickem.Bracket.from_results(results)
+        self.assertTrue(bracket.complete)
+        finish = bracket.frame().set_index("Team")["Finish"]
+        self.assertEqual(finish["PoNY"], "Champion")  # The final is 0-0, with a progression
+        self.assertEqual(finish["Revolver"], "Finalist")
+        # Sockeye lost the PoNY semi 12-11, and then played no other bracket game
+        self.assertEqual(finish["Sockeye"], "Semis")
+        self.assertEqual(list(finish[["DiG", "HIGH FIVE", "Johnny Bravo"]]),
+                         ["Prequarters"] * 3)
+        self.assertEqual((finish != "No Bracket").sum(), 12)
+        self.assertEqual(len(bracket.pool_urls), 24)
+        self.assertEqual(len(bracket.bracket_urls), 11)
+        layout = bracket.layout()
+        self.assertEqual(len(layout), 16)
+        self.assertEqual(sum(slot is None for slot in layout), 4)
+
+        # Rows in any order give the same bracket
+        played, _ = simulate.played_games(results)
+        shuffled = played.sample(frac=1, random_state=0)
+        again = pickem.Bracket(shuffled, bracket.teams)
+        self.assertEqual(again.pools, bracket.pools)
+        npt.assert_array_equal(again.finish, bracket.finish)
+        npt.assert_array_equal(again.pool_finish, bracket.pool_finish)
+
+        # The 2019 club mixed final is unreported, but its layout is known
+        results = reports.USAUResults.from_event("club", 2019, "mixed")
+        results.load_from_csvs()
+        bracket = pickem.Bracket.from_results(results)
+        self.assertFalse(bracket.complete)
+        self.assertEqual(len(bracket.layout()), 16)
+
+    def test_infer_pools_from_unreported_games(self):
+        # Sockeye and Chicago Machine's pool game is 0-0 in the results
+        results = reports.club_nats_men_2017
+        results.load_from_csvs()
+        seeds = results.rosters[["Team", "Seed"]].drop_duplicates(subset=["Team"])
+        teams = list(seeds.sort_values("Seed")["Team"].astype(str))
+        pools = pickem.infer_pools(results.match_results, teams)
+        self.assertIn(["Sockeye", "Chicago Machine", "Florida United", "PoNY"], pools)
+
+    def test_infer_pools_uneven(self):
+        pools = pickem.infer_pools(_match_results([]), _TEAMS[:15], num_pools=4)
+        self.assertEqual(pools, snake_pools(_TEAMS[:15], 4))
+
+
+class TestPickemContest(unittest.TestCase):
+    def test_standings(self):
+        rng = np.random.RandomState(0)
+        brackets = {"Men": pickem.Bracket(_match_results(_BRACKET), _TEAMS),
+                    "Women": pickem.Bracket(_match_results(_BRACKET[:9]), _TEAMS)}
+        rows = [{"User": "u{i}".format(i=i), "Division": division, "Team": team,
+                 "Pick": pickem.ROUNDS[rng.randint(len(pickem.ROUNDS))]}
+                for i in range(50) for division in brackets for team in _TEAMS
+                if rng.rand() < 0.9]
+        picks = pd.DataFrame(rows)
+        contest = pickem.PickemContest.from_frame(picks)
+        standings = contest.standings(brackets).set_index("User")
+
+        finishes = dict(((division, team), (bracket.finish[i], bracket.alive[i]))
+                        for division, bracket in brackets.items()
+                        for i, team in enumerate(bracket.teams))
+        expected, possible = {}, {}
+        for row in rows:
+            pick = pickem.ROUNDS.index(row["Pick"])
+            finish, alive = finishes[row["Division"], row["Team"]]
+            points = pickem.ROUND_POINTS[pick]
+            expected[row["User"]] = expected.get(row["User"], 0) + (points if finish >= pick else 0)
+            possible[row["User"]] = possible.get(row["User"], 0) + (
+                points if finish >= pick or alive else 0)
+        users = sorted(expected)
+        npt.assert_allclose(standings.loc[users, "Total"], [expected[u] for u in users])
+        npt.assert_allclose(standings.loc[users, "Max"], [possible[u] for u in users])
+        npt.assert_allclose(standings["Men"] + standings["Women"], standings["Total"])
+        self.assertTrue((np.diff(standings["Total"].values) <= 0).all())
@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from bs4 import BeautifulSoup
+import pandas as pd
+from six import StringIO
+
+from usau import pipeline, reports, throttle
+
+_EVENT_INFO = {"level": "club", "event": ["nationals"],
+               "url": "USA-Ultimate-National-Championships-{y}"}
+_SOURCES = {gender: reports.USAUResults(_EVENT_INFO, gender, 2017)
+            for gender in ("men", "women")}
+
+
+class _OfflineResults(reports.USAUResults):
+    """Scrapes from the 2017 club csvs instead of the website, recording
+    which divisions had scrapes in flight at the same time"""
+    lock = threading.Lock()
+    active = {}
+    overlapped = set()
+
+    @classmethod
+    def _scraping(cls, gender, delta):
+        with cls.lock:
+            cls.active[gender] = cls.active.get(gender, 0) + delta
+            if sum(bool(n) for n in cls.active.values()) > 1:
+                cls.overlapped.update(g for g, n in cls.active.items() if n)
+
+    @classmethod
+    def _scrape_roster(cls, team_link, verbose=True, clean=True):
+        gender = team_link.attrs["gender"]
+        if gender == "mixed":
+            raise IOError("Connection reset")
+        cls._scraping(gender, 1)
+        try:
+            rosters = _SOURCES[gender].roster_dfs
+            return rosters[rosters["url"] == team_link.attrs["href"]].copy()
+        finally:
+            cls._scraping(gender, -1)
+
+    @classmethod
+    def _scrape_match(cls, url, verbose=True, clean=True):
+        gender, url = url.split("|", 1)
+        cls._scraping(gender, 1)
+        try:
+            source = _SOURCES[gender]
+            return tuple(df[df["url"] == url].copy() for df in
+                         (source.match_result_dfs, source.match_report_dfs,
+                          source.score_progression_dfs))
+        finally:
+            cls._scraping(gender, -1)
+
+
+class _GatedResults(_OfflineResults):
+    """Holds back the last match report until progress on the others has
+    been reported"""
+    last_url = None
+    reported = threading.Event()
+    gated = None
+
+    @classmethod
+    def _scrape_match(cls, url, verbose=True, clean=True):
+        if url == cls.last_url:
+            cls.gated = cls.reported.wait(5)
+        return super(_GatedResults, cls)._scrape_match(url, verbose=verbose, clean=clean)
+
+
+def _html(gender, source):
+    teams = source.roster_dfs.drop_duplicates("url")
+    html = ['<div class="pool">']
+    html += ['<a href="{url}" gender="{gender}">{team}</a>'.format(
+        url=url, gender=gender, team=team) for url, team in zip(teams["url"], teams["Team"])]
+    html += ['</div>']
+    html += ['<a href="{gender}|{url}">Game</a>'.format(gender=gender, url=url)
+             for url in pd.unique(source.match_result_dfs["url"])]
+    return "".join(html)
+
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        for source in _SOURCES.values():
+            source.load_from_csvs(compact=False)
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def _division(self, gender):
+        results = _OfflineResults(_EVENT_INFO, gender, 2017)
+        source = _SOURCES.get(gender, _SOURCES["men"])
+        results.event_page_soup = BeautifulSoup(_html(gender, source), "html.parser")
+        return results
+
+    def test_pipeline(self):
+        divisions = [self._division(gender) for gender in ("men", "women", "mixed")]
+        output = StringIO()
+        progress = pipeline.Progress(stream=output, interval=0.)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            errors = pipeline.run_pipeline(
+                divisions, lambda results: results.to_csvs(self.data_dir),
+                executor, progress)
+
+        # A failing division does not stop the others
+        self.assertEqual([name for name, error in errors.items() if error is not None],
+                         ["2017_club_nationals_mixed"])
+        self.assertLessEqual({"men", "women"}, _OfflineResults.overlapped)
+        for gender in ("men", "women"):
+            name = "2017_club_nationals_{gender}".format(gender=gender)
+            source = _SOURCES[gender]
+            num_games = source.match_result_dfs["url"].nunique()
+            self.assertEqual(progress.status[name], "done")
+            self.assertEqual(progress.counts[name]["matches"], (num_games, num_games))
+            written = pd.read_csv(os.path.join(self.data_dir, name + "_match_reports.csv"))
+            self.assertEqual(len(written), len(source.match_report_dfs))
+        self.assertEqual(progress.status["2017_club_nationals_mixed"], "failed")
+        self.assertIn("3/3 divisions", output.getvalue().splitlines()[-1])
+
+    def test_progress_with_adaptive_executor(self):
+        source = _SOURCES["men"]
+        urls = pd.unique(source.match_result_dfs["url"])
+        _GatedResults.last_url = "men|" + urls[-1]
+        results = _GatedResults(_EVENT_INFO, "men", 2017)
+        results.event_page_soup = BeautifulSoup(_html("men", source), "html.parser")
+        results.executor = throttle.AdaptiveExecutor(max_workers=2)
+        counts = []
+
+        def progress(name, stage, done, total):
+            counts.append((stage, done))
+            if stage == "matches" and done > 0:
+                _GatedResults.reported.set()
+
+        results.set_progress(progress)
+        self.assertEqual(len(results.match_reports), len(source.match_report_dfs))
+        # Progress is reported as each page finishes, not once all have
+        self.assertTrue(_GatedResults.gated)
+        self.assertEqual([done for stage, done in counts if stage == "matches"],
+                         list(range(len(urls) + 1)))
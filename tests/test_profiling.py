@@ -0,0 +1,42 @@
+import io
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+from usau import markdown, profiling, reports
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_hot_paths(self):
+        path = os.path.join(self.path, "run.prof")
+        profiler = profiling.Profiler(path, top=5).start()
+        results = reports.USAUResults.from_event(year=2017, level="club", gender="mixed",
+                                                 event="nationals")
+        results.load_from_csvs()
+        markdown.pandas_to_markdown(results.match_results.head())
+        summary = profiler.stop()
+        self.assertIsNone(profiler.stop())
+
+        times = profiling.hot_path_times(profiler.stats)
+        self.assertEqual(list(times.index), list(profiling.HOT_PATHS))
+        self.assertEqual(times.loc["load_from_csvs", "Calls"], 1)
+        self.assertEqual(times.loc["pandas_to_markdown", "Calls"], 1)
+        self.assertEqual(times.loc["_scrape_match", "Calls"], 0)
+        self.assertGreater(times.loc["load_from_csvs", "Total Seconds"], 0)
+        if profiler.snapshot is not None:
+            self.assertGreater(profiling.hot_path_memory(profiler.snapshot)["load_from_csvs"], 0)
+
+        # The profile loads in standard viewers, and the summary is kept
+        self.assertIn("load_from_csvs", [name for _, _, name in pstats.Stats(path).stats])
+        with io.open(path + ".txt", encoding="utf-8") as fd:
+            self.assertEqual(fd.read(), summary)
+        self.assertIn("Hot paths:", summary)
+        self.assertNotIn("_scrape_match", summary.split("Top 5")[0])
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from usau import ratings
+
+
+def _results(games):
+    rows = []
+    for url, (team, opp, score, opp_score) in enumerate(games):
+        rows.append({"url": str(url), "Team": team, "Opponent": opp,
+                     "Score": score, "Opp Score": opp_score})
+        rows.append({"url": str(url), "Team": opp, "Opponent": team,
+                     "Score": opp_score, "Opp Score": score})
+    return pd.DataFrame(rows)
+
+
+class TestTeamRatings(unittest.TestCase):
+    def test_least_squares_margins(self):
+        games = [("A", "B", 15, 10), ("B", "C", 15, 12), ("A", "C", 15, 9)]
+        fit = ratings.TeamRatings(regularization=1e-6)
+        fit.add_results(_results(games), event="evt", division="club_men")
+        margin = fit.predict_margin("A", "C", division="club_men")
+        # Residuals of the inconsistent cycle are spread evenly
+        self.assertAlmostEqual(margin, 20 / 3., places=3)
+        self.assertEqual(list(fit.ratings["Team"]), ["A", "B", "C"])
+
+    def test_incremental_update(self):
+        games = [("A", "B", 15, 10), ("B", "C", 15, 12), ("A", "C", 15, 7),
+                 ("C", "D", 13, 11)]
+        batch = ratings.TeamRatings().add_results(
+            _results(games), event="evt", division="d")
+        incremental = ratings.TeamRatings()
+        incremental.add_results(_results(games[:2]), event="evt", division="d")
+        incremental.fit()
+        # Re-adding already seen games is a no-op
+        incremental.add_results(_results(games), event="evt", division="d")
+        np.testing.assert_allclose(
+            batch.ratings["Rating"].values, incremental.ratings["Rating"].values,
+            atol=1e-4)
+        self.assertEqual(len(incremental.games), 4)
+
+    def test_usau_score_differential(self):
+        self.assertAlmostEqual(float(ratings.usau_score_differential(15, 14)), 125)
+        self.assertAlmostEqual(float(ratings.usau_score_differential(14, 15)), 0)
+        self.assertAlmostEqual(float(ratings.usau_score_differential(15, 7)), 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
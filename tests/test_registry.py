@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from usau import registry, reports
+
+_BASE = registry.BASE_URL
+_PAGES = {
+    registry.LISTING_URL:
+        '<a href="/events/USA-Ultimate-National-Championships-2019/">Nationals</a>'
+        '<a href="/events/Northwest-Regional-Championships-2019/">NW Regionals</a>'
+        '<a href="/events/tournament/?ViewAll=true&page=2">Next</a>',
+    _BASE + "/events/tournament/?ViewAll=true&page=2":
+        '<a href="/events/D-III-College-Championships-2019/">D-III</a>'
+        '<a href="/events/No-Year-Invite/">Undated</a>'
+        '<a href="/events/Missing-Event-2019/">Not recorded</a>',
+    _BASE + "/events/USA-Ultimate-National-Championships-2019/":
+        '<a href="schedule/Men/Club-Men/">Men</a>'
+        '<a href="schedule/Women/Club-Women/">Women</a>',
+    _BASE + "/events/Northwest-Regional-Championships-2019/":
+        '<a href="/events/Northwest-Regional-Championships-2019/schedule/Mixed/Club-Mixed/">'
+        'Mixed</a>',
+    _BASE + "/events/D-III-College-Championships-2019/":
+        '<a href="/events/D-III-College-Championships-2019/schedule/Men/CollegeMen/">Men</a>',
+    _BASE + "/events/No-Year-Invite/":
+        '<a href="/events/No-Year-Invite/schedule/Men/Club-Men/">Men</a>',
+}
+
+
+class _Fetcher(object):
+    def __init__(self):
+        self.urls = []
+
+    def fetch(self, url):
+        self.urls.append(url)
+        if url not in _PAGES:
+            raise IOError("404: {url}".format(url=url))
+        return _PAGES[url]
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.record_dir = tempfile.mkdtemp()
+        self.known = registry.EventRegistry.from_table(reports.USAUResults._EVENT_TO_URL)
+
+    def tearDown(self):
+        shutil.rmtree(self.record_dir)
+        reports.set_registry(None)
+
+    def _crawl(self, source):
+        return registry.Crawler(source, self.known).crawl()
+
+    def test_crawl_record_and_replay(self):
+        fetcher = _Fetcher()
+        crawled = self._crawl(registry.PageSource(fetcher, record_dir=self.record_dir))
+        self.assertEqual(len(fetcher.urls), 7)
+        # Replayed offline from the recorded pages, without fetching
+        replayed = self._crawl(registry.PageSource(record_dir=self.record_dir, replay=True))
+        self.assertEqual(len(fetcher.urls), 7)
+        self.assertEqual(list(replayed._events), list(crawled._events))
+
+        self.assertEqual(crawled.levels, ["club", "d3college"])
+        # Aliases of the known event are reused
+        nationals = crawled.lookup("club", "nats", 2019, "women")
+        self.assertEqual(nationals["full_url"], _BASE + "/events/USA-Ultimate-National-"
+                         "Championships-2019/schedule/Women/Club-Women/")
+        self.assertIsNone(crawled.lookup("club", "nationals", 2019, "mixed"))
+        regionals = crawled.lookup("club", "Northwest-Regional-Championships", 2019, "mixed")
+        self.assertEqual(regionals["event"], ["northwest regional championships"])
+        self.assertIsNotNone(crawled.lookup("d3college", "d iii college championships",
+                                            2019, "men"))
+
+    def test_cache_and_from_event(self):
+        crawled = self._crawl(registry.PageSource(_Fetcher()))
+        path = crawled.save(os.path.join(self.record_dir, "registry.json"))
+        loaded = registry.EventRegistry.load(path)
+        self.assertEqual(list(loaded._events), list(crawled._events))
+
+        reports.set_registry(self.known.update(loaded))
+        results = reports.USAUResults.from_event("club", 2019, "mixed",
+                                                 "northwest regional championships")
+        self.assertEqual(results.event_url, _BASE + "/events/Northwest-Regional-"
+                         "Championships-2019/schedule/Mixed/Club-Mixed/")
+        self.assertEqual(results._name(),
+                         "2019_club_northwest-regional-championships_mixed")
+        # Static events are still found, for any gender
+        results = reports.USAUResults.from_event("club", 2016, "mixed", "pro-flight")
+        self.assertEqual(results.event_full, "TCT-Pro-Flight-Finale-2016")
+        with self.assertRaises(ValueError):
+            reports.USAUResults.from_event("club", 2013, "men", "nationals")
+
+    def test_static_table_order(self):
+        # The first matching row of the table wins, and open-ended rows
+        # continue indefinitely
+        self.assertEqual(self.known.lookup("d1college", "nationals", 2018, "men")["url"],
+                         "USA-Ultimate-D-I-College-Championships-{y}")
+        self.assertEqual(self.known.lookup("club", "us open", 2050, "mixed")["url"],
+                         "{y}-US-Open-Club-Championship")
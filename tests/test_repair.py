@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+
+from usau import archive, repair
+
+_NAN = np.nan
+# Per game: home and away scores after each point, and the final score
+_GAMES = [
+    ([0, 1, 1, 2], [0, 0, 1, 1], (2, 1)),  # Clean
+    ([0, 1, _NAN, 2], [0, 0, 1, 1], (2, 1)),  # Blank cell
+    ([0, 1, 2, 1, 2], [0, 0, 0, 1, 1], (2, 1)),  # Point entered, then corrected
+    ([0, 0, 1], [0, 1, 1], (1, 2)),  # Missing final point
+    ([0, 0, 0, 1], [0, 1, 2, 2], (2, 1)),  # Swapped
+    ([0, 1], [0, 0], (5, 4)),  # Incomplete
+    ([0, _NAN, 1, 1], [0, _NAN, 0, 1], (2, 1)),  # Blank row, missing final point
+]
+
+
+def _scores(games):
+    rows = [{"home_score": home, "away_score": away, "url": "/game{i}".format(i=i),
+             "home_final_score": final[0], "away_final_score": final[1]}
+            for i, (homes, aways, final) in enumerate(games)
+            for home, away in zip(homes, aways)]
+    return pd.DataFrame(rows)
+
+
+class TestRepair(unittest.TestCase):
+    def test_repair_scores(self):
+        repaired, repairs = repair.repair_scores(_scores(_GAMES))
+        self.assertEqual(list(repairs["url"]), ["/game{i}".format(i=i) for i in range(7)])
+        self.assertEqual(list(repairs["repair"]), [
+            0, repair.BLANK_CELLS, repair.NON_MONOTONE, repair.MISSING_FINAL,
+            repair.SWAPPED, repair.MISMATCH, repair.MISSING_FINAL])
+        self.assertEqual(repair.describe(repair.SWAPPED | repair.MISMATCH),
+                         "swapped home/away, mismatched final score")
+
+        games = dict(list(repaired.groupby("url", sort=False)))
+        for i in (0, 1, 2, 6):
+            game = games["/game{i}".format(i=i)]
+            npt.assert_array_equal(game["home_score"], [0, 1, 1, 2])
+            npt.assert_array_equal(game["away_score"], [0, 0, 1, 1])
+            npt.assert_array_equal(game.index, np.arange(4))
+        npt.assert_array_equal(games["/game3"]["away_score"], [0, 1, 1, 2])
+        npt.assert_array_equal(games["/game4"]["home_score"], [0, 1, 2, 2])
+        npt.assert_array_equal(games["/game4"]["away_score"], [0, 0, 0, 1])
+        self.assertEqual(len(games["/game5"]), 2)
+
+    def test_typos_are_dropped(self):
+        home, away, rows, _, codes = repair.repair_progressions(
+            np.array([0, 1, 1, 2, 2, 3, 3, 3, 4, 0, 1, 1, 12, 2, 3]),
+            np.array([0, 0, 1, 1, 2, 2, 0, 3, 3, 0, 0, 1, 1, 2, 2]),
+            np.array([0, 9]), np.array([4, 3]), np.array([3, 2]))
+        # A low typo only loses its own row, rather than lowering the earlier rows
+        npt.assert_array_equal(home[:8], [0, 1, 1, 2, 2, 3, 3, 4])
+        npt.assert_array_equal(away[:8], [0, 0, 1, 1, 2, 2, 3, 3])
+        npt.assert_array_equal(rows[:8], [0, 1, 2, 3, 4, 5, 7, 8])
+        # As does a high typo
+        npt.assert_array_equal(home[8:], [0, 1, 1, 2, 3])
+        npt.assert_array_equal(away[8:], [0, 0, 1, 2, 2])
+        npt.assert_array_equal(codes, [repair.NON_MONOTONE] * 2)
+
+    def test_many_corrections(self):
+        # A high and a low typo in one game
+        home, away, _, _, codes = repair.repair_progressions(
+            np.array([0, 1, 9, 2, 2, 3, 3, 3, 4]), np.array([0, 0, 1, 1, 2, 2, 0, 3, 3]),
+            np.array([0]), np.array([4]), np.array([3]))
+        npt.assert_array_equal(home, [0, 1, 2, 2, 3, 3, 4])
+        npt.assert_array_equal(away, [0, 0, 1, 2, 2, 3, 3])
+        self.assertEqual(codes[0], repair.NON_MONOTONE | repair.MANY_CORRECTIONS)
+        self.assertEqual(repair.describe(codes[0]), "non-monotone, several rows corrected")
+
+    def test_repairs_are_stable(self):
+        stored = archive.load_archive(tables=["scores"],
+                                      events=["2018_club_pro-elite_men",
+                                              "2017_club_nationals_mixed"])
+        before = len(stored.scores)
+        repairs = repair.repair_archive(stored)
+        flags = repairs["repair"].values
+        self.assertTrue((flags & repair.NON_MONOTONE).any())
+        self.assertTrue((flags & repair.SWAPPED).any())
+        self.assertLessEqual(len(stored.scores), before)
+
+        # Repaired progressions never step down or repeat a state, and
+        # repairing again changes nothing
+        steps = stored.scores.groupby(["event", "url"], observed=True, sort=False)[
+            ["home_score", "away_score"]].diff().dropna()
+        self.assertTrue((steps >= 0).all(axis=None))
+        self.assertTrue((steps.sum(axis=1) > 0).all())
+        again = repair.repair_archive(stored)
+        npt.assert_array_equal(again["repair"].values, flags & repair.MISMATCH)
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from usau import reports, schema
+
+
+class TestSchema(unittest.TestCase):
+    def test_concat_years_stays_categorical(self):
+        events = [reports.USAUResults.from_event("club", year, "women")
+                  .load_from_csvs() for year in (2017, 2018, 2019)]
+        results = schema.concat_tables([e.match_results for e in events],
+                                       "match_results", ignore_index=True)
+        self.assertIsInstance(results["Team"].dtype, pd.CategoricalDtype)
+        self.assertEqual(results["Team"].dtype, results["Opponent"].dtype)
+        self.assertEqual(results["Score"].dtype, np.int8)
+        self.assertEqual(len(results), sum(len(e.match_results) for e in events))
+        self.assertIn("Fury", set(results["Team"]))
+
+    def test_compact_is_opt_in(self):
+        results = reports.USAUResults.from_event("club", 2017, "women")
+        self.assertFalse(isinstance(results.load_from_csvs().match_results["Team"].dtype,
+                                    pd.CategoricalDtype))
+        self.assertFalse(results.compact)
+        compact = results.load_from_csvs(compact=True).match_results
+        self.assertIsInstance(compact["Team"].dtype, pd.CategoricalDtype)
+        self.assertTrue(results.compact)
+
+    def test_downcast_keeps_missing_and_wide_values(self):
+        df = pd.DataFrame({"Seed": [1, 2, 300], "Score": [15, np.nan, 3],
+                           "Team": ["Fury", None, "Fury"]})
+        schema.apply_schema(df, "match_results", registry=schema.CategoryRegistry())
+        self.assertEqual(df["Seed"].dtype, np.int64)
+        self.assertEqual(df["Score"].dtype, np.float32)
+        self.assertTrue(df["Team"].isnull().iloc[1])
+        self.assertEqual(list(df["Team"].cat.categories), ["Fury"])
+
+
+if __name__ == "__main__":
+    unittest.main()
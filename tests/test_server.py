@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from usau import server
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "usau", "data")
+_EVENT = "2017_club_nationals_men"
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Copy a single event, so that refreshes can touch its files
+        cls.data_dir = tempfile.mkdtemp()
+        for filename in os.listdir(_DATA_DIR):
+            if filename.startswith(_EVENT):
+                shutil.copy(os.path.join(_DATA_DIR, filename), cls.data_dir)
+        cls.store = server.DataStore(cls.data_dir)
+        cls.service = server.QueryService(cls.store)
+        cls.server = server.Server(cls.service, port=0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base = "http://127.0.0.1:{port}".format(port=cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.data_dir)
+
+    def _get(self, path, status=200):
+        response = requests.get(self.base + path)
+        self.assertEqual(response.status_code, status, response.text)
+        return response.json()
+
+    def test_endpoints(self):
+        self.assertEqual(self._get("/events"), [{"event": _EVENT}])
+        leaders = self._get("/leaderboard?event={e}&n=5".format(e=_EVENT))[_EVENT]
+        self.assertEqual(len(leaders), 5)
+        self.assertEqual(set(leaders[0]), {"Name", "Team", "Gs", "As", "Ds", "Ts",
+                                           "+/-", "+/-pg", "#Games"})
+        teams = self._get("/team_results?event={e}".format(e=_EVENT))[_EVENT]
+        self.assertEqual(len(teams), 16)
+        self.assertEqual(sum(t["Games Played"] for t in teams), 110)
+        games = self._get("/match_results?event={e}&team=Revolver".format(e=_EVENT))
+        self.assertTrue(all(g["Team"] == "Revolver" for g in games[_EVENT]))
+        scores = self._get("/score_progressions?event={e}&url={u}".format(
+            e=_EVENT, u=requests.utils.quote(games[_EVENT][0]["url"])))[_EVENT]
+        self.assertTrue(scores and all(s["url"] == games[_EVENT][0]["url"]
+                                       for s in scores))
+        players = self._get("/players?name=" + leaders[0]["Name"].lower())
+        self.assertEqual(players[_EVENT][0]["Name"], leaders[0]["Name"])
+
+    def test_errors(self):
+        self.assertIn("error", self._get("/nonexistent", status=404))
+        self.assertIn("error", self._get("/leaderboard", status=400))
+        self.assertIn("error", self._get("/team_results?event=2010_club_nationals_men",
+                                         status=404))
+
+    def test_cache_and_refresh(self):
+        cache = self.service.cache
+        path = "/team_results?event={e}".format(e=_EVENT)
+        responses = []
+        misses = cache.misses
+        threads = [threading.Thread(target=lambda: responses.append(self._get(path)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(responses), 8)
+        self.assertEqual(cache.misses, misses + 1)
+        loaded = self.store.event(_EVENT)
+
+        # Touching the csvs triggers a reload, and invalidates the response
+        csv = os.path.join(self.data_dir, _EVENT + "_match_results.csv")
+        os.utime(csv, (os.path.getmtime(csv) + 10,) * 2)
+        self.assertEqual(self.store.refresh_stale(), [_EVENT])
+        self.assertIsNot(self.store.event(_EVENT), loaded)
+        self.assertEqual(self._get(path), responses[0])
+        self.assertEqual(cache.misses, misses + 2)
+
+        refreshed = requests.post(self.base + "/refresh?event=" + _EVENT).json()
+        self.assertEqual(refreshed, {"refreshed": [_EVENT]})
+        self.assertEqual(self.store.refresh_stale(), [])
+
+
+class _SlowStore(server.DataStore):
+    """Counts loads, and holds loads of one event until released"""
+
+    def __init__(self, *args, **kwargs):
+        super(_SlowStore, self).__init__(*args, **kwargs)
+        self.loads = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def _load(self, name):
+        self.loads.append(name)
+        if name == _EVENT:
+            self.started.set()
+            self.release.wait(5)
+        return super(_SlowStore, self)._load(name)
+
+
+class TestDataStore(unittest.TestCase):
+    def test_event_loads_do_not_block_others(self):
+        store = _SlowStore(_DATA_DIR)
+        other = "2017_club_nationals_women"
+        store.event(other)
+        threads = [threading.Thread(target=store.event, args=(_EVENT,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Served while the slow event is loading
+        self.assertTrue(store.started.wait(5))
+        self.assertIsNotNone(store.event(other))
+        self.assertEqual(store.versions([other]), (0,))
+        self.assertFalse(store.release.is_set())
+        store.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(store.loads, [other, _EVENT])
+        self.assertEqual(store._loading, {})
+
+
+class TestFantasy(unittest.TestCase):
+    def test_fantasy_standings(self):
+        service = server.QueryService(server.DataStore(_DATA_DIR))
+        standings = json.loads(service.query("fantasy", {}))
+        self.assertEqual(len(standings), 14)
+        self.assertEqual(standings[0]["User"], "ultimatefrisbee")
+        self.assertAlmostEqual(standings[0]["Total"], 462.4)
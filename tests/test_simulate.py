@@ -0,0 +1,104 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from usau import reports, simulate
+
+
+class TestTournamentSimulator(unittest.TestCase):
+    def setUp(self):
+        self.teams = ["T{i}".format(i=i) for i in range(1, 17)]
+        self.pools = simulate.snake_pools(self.teams, 4)
+        self.strengths = dict(zip(self.teams, simulate.strengths_from_seeds(
+            np.arange(1, 17))))
+
+    def test_snake_pools(self):
+        self.assertEqual(self.pools[0], ["T1", "T8", "T9", "T16"])
+        self.assertEqual(simulate.bracket_order(8), [1, 8, 4, 5, 2, 7, 3, 6])
+
+    def test_reproducible_probabilities(self):
+        sim = simulate.TournamentSimulator(self.pools, self.strengths)
+        result = sim.simulate(5000, seed=7, chunk_size=1000)
+        summary = result.summary()
+        np.testing.assert_allclose(summary["Champion"].sum(), 1)
+        np.testing.assert_allclose(summary["Quarters"].sum(), 8)
+        np.testing.assert_allclose(result.place_counts.sum(axis=0), 4 * 5000)
+        again = sim.simulate(5000, seed=7, chunk_size=1000)
+        np.testing.assert_array_equal(result.round_counts, again.round_counts)
+        self.assertEqual(summary["Team"].iloc[0], "T1")
+
+    def test_played_games_are_fixed(self):
+        # T16 upsets every team in its pool and then wins the final
+        played = pd.DataFrame([
+            {"url": "a", "Team": "T16", "Opponent": "T1", "Score": 15, "Opp Score": 3},
+            {"url": "b", "Team": "T16", "Opponent": "T8", "Score": 15, "Opp Score": 3},
+            {"url": "c", "Team": "T16", "Opponent": "T9", "Score": 15, "Opp Score": 3},
+        ])
+        sim = simulate.TournamentSimulator(self.pools, self.strengths, played=played)
+        summary = sim.simulate(2000, seed=0).summary().set_index("Team")
+        self.assertEqual(summary.loc["T16", "Pool #1"], 1)
+        self.assertEqual(summary.loc["T16", "Quarters"], 1)
+
+    def test_pool_games_are_not_taken_from_row_order(self):
+        # T1 and T8 meet in pool play and again in the bracket, with the
+        # bracket game listed first
+        played = pd.DataFrame([
+            {"url": "bracket", "Team": "T8", "Opponent": "T1", "Score": 15, "Opp Score": 10},
+            {"url": "pool", "Team": "T1", "Opponent": "T8", "Score": 15, "Opp Score": 12},
+        ])
+        sim = simulate.TournamentSimulator(self.pools, self.strengths, played=played,
+                                           pool_urls={"pool"})
+        t1, t8 = sim.team_index["T1"], sim.team_index["T8"]
+        self.assertEqual(sim.pool_margins[t1, t8], 3)
+        self.assertEqual(sim.bracket_margins[t1, t8], -5)
+
+        # Without pool urls, the first meeting in the order given is the pool game
+        pool = np.array([0, 0, 0, 1])
+        mask = simulate.pool_game_mask(["a", "b", "c", "d"], np.array([0, 1, 1, 0]),
+                                       np.array([1, 0, 2, 3]), pool)
+        self.assertEqual(list(mask), [True, False, True, False])
+
+    def test_played_event_is_fixed(self):
+        results = reports.USAUResults.from_event("club", 2018, "men")
+        results.load_from_csvs()
+        sim = simulate.TournamentSimulator.from_results(results)
+        self.assertEqual(np.isfinite(sim.pool_margins).sum() // 2, 24)
+        summary = sim.simulate(1000, seed=0).summary().set_index("Team")
+        self.assertEqual(summary.loc["PoNY", "Champion"], 1)
+        self.assertEqual(summary.loc["Revolver", "Finals"], 1)
+        self.assertEqual(summary.loc["Sockeye", "Semis"], 1)
+        self.assertEqual(summary.loc["Sockeye", "Finals"], 0)
+        self.assertEqual(summary[["Pool #1", "Pool #2", "Pool #3", "Pool #4"]]
+                         .isin([0, 1]).all().all(), True)
+
+    def test_bracket_layout(self):
+        layout = simulate.seeded_layout(4, 3)
+        self.assertEqual(layout[:4], [(0, 0), None, (3, 1), (0, 2)])
+        with self.assertRaises(ValueError):
+            simulate.TournamentSimulator(self.pools, self.strengths, bracket=layout[:8])
+
+    def test_pool_game_between_pools_warns(self):
+        played = pd.DataFrame([
+            {"url": "a", "Team": "T1", "Opponent": "T2", "Score": 15, "Opp Score": 3},
+            {"url": "b", "Team": "T1", "Opponent": "T8", "Score": 0, "Opp Score": 0},
+        ])
+        with self.assertLogs("usau.simulate", level="WARNING"):
+            sim = simulate.TournamentSimulator(self.pools, self.strengths, played=played,
+                                               pool_urls={"a", "b"})
+        t1, t2, t8 = (sim.team_index[t] for t in ("T1", "T2", "T8"))
+        self.assertEqual(sim.bracket_margins[t1, t2], 12)
+        self.assertTrue(np.isnan(sim.pool_margins[t1, t8]))  # unreported
+
+    def test_rank_pool_restarts_tiebreakers(self):
+        # 2019 D-I men's pool A: teams 1-3 tie at 2-2 and 1-1 between them.
+        # 1 leads on point differential between them, leaving 2 and 3 tied;
+        # 2 beat 3, though 3 has the better overall point differential.
+        a = np.array([0, 2, 1, 0, 3, 0, 1, 0, 1, 2])
+        b = np.array([2, 4, 2, 4, 4, 3, 4, 1, 3, 3])
+        margin = np.array([9, 2, 6, 11, 4, 6, 6, 7, -2, 4])
+        self.assertEqual(simulate.rank_pool(range(5), a, b, margin), [0, 1, 2, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from usau import reports
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_roundtrip(self):
+        results = reports.USAUResults.from_event("club", 2018, "men").load_from_csvs()
+        results.match_urls = sorted(set(results.match_results["url"]))
+        path = results.to_snapshot(data_dir=self.tmp_dir)
+        self.assertEqual(os.path.basename(path), "2018_club_nationals_men.usnap")
+
+        loaded = reports.USAUResults.from_snapshot(path)
+        self.assertEqual(loaded._name(), results._name())
+        self.assertEqual(loaded.match_urls, results.match_urls)
+        self.assertEqual(loaded.provenance["source"], "csv")
+        for attr in ("roster_dfs", "match_report_dfs", "match_result_dfs",
+                     "score_progression_dfs"):
+            pd.testing.assert_frame_equal(getattr(loaded, attr),
+                                          getattr(results, attr))
+        # Numeric columns are views of the memory-mapped file
+        base = loaded.score_progressions["home_score"].values
+        while base.base is not None and not isinstance(base, np.memmap):
+            base = base.base
+        self.assertIsInstance(base, np.memmap)
+
+
+if __name__ == "__main__":
+    unittest.main()
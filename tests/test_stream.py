@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from bs4 import BeautifulSoup
+import pandas as pd
+
+from usau import reports, stream
+
+_EVENT_INFO = {"level": "club", "event": ["nationals"],
+               "url": "USA-Ultimate-National-Championships-{y}"}
+_SOURCE = reports.USAUResults(_EVENT_INFO, "men", 2017)
+
+
+class _OfflineResults(reports.USAUResults):
+    """Scrapes from the 2017 club men csvs instead of the website"""
+    calls = []
+    fail_after = None
+    slow_url = None
+
+    @classmethod
+    def _scrape_roster(cls, team_link, verbose=True, clean=True):
+        rosters = _SOURCE.roster_dfs
+        return rosters[rosters["url"] == team_link.attrs["href"]].copy()
+
+    @classmethod
+    def _scrape_match(cls, url, verbose=True, clean=True):
+        if cls.fail_after is not None and len(cls.calls) >= cls.fail_after:
+            raise IOError("Connection reset")
+        if url == cls.slow_url:
+            time.sleep(0.5)
+        cls.calls.append(url)
+        return tuple(df[df["url"] == url].copy() for df in
+                     (_SOURCE.match_result_dfs, _SOURCE.match_report_dfs,
+                      _SOURCE.score_progression_dfs))
+
+
+class TestStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        _SOURCE.load_from_csvs(compact=False)
+        teams = _SOURCE.roster_dfs.drop_duplicates("url")
+        html = ['<div class="pool">']
+        html += ['<a href="{url}">{team} ({seed})</a>'.format(url=url, team=team, seed=seed)
+                 for url, team, seed in zip(teams["url"], teams["Team"], teams["Seed"])]
+        html += ['</div>']
+        html += ['<a href="{url}">Game</a>'.format(url=url)
+                 for url in pd.unique(_SOURCE.match_result_dfs["url"])]
+        cls.html = "".join(html)
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, "test.ndjson")
+        _OfflineResults.calls = []
+        _OfflineResults.fail_after = None
+        _OfflineResults.slow_url = None
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def _results(self):
+        results = _OfflineResults(_EVENT_INFO, "men", 2017)
+        results.event_page_soup = BeautifulSoup(self.html, "html.parser")
+        return results.set_stream(self.path, flush_every=1)
+
+    def test_sink_compact_and_partial_lines(self):
+        with stream.StreamSink(self.path, header={"name": "test"}) as sink:
+            sink.write("a", scores=pd.DataFrame({"home_score": [0, 1]}, index=[5, 6]))
+            sink.write("b", scores=pd.DataFrame({"home_score": [2.5, None]}))
+            sink.write("a", scores=pd.DataFrame({"home_score": [3]}))
+        with open(self.path, "a") as fd:
+            fd.write('{"key": "c", "tables": {"sco')  # Crash mid-write
+        self.assertEqual(stream.read_header(self.path), {"name": "test"})
+        self.assertEqual([r["key"] for r in stream.read_records(self.path)],
+                         ["a", "b", "a"])
+        scores = stream.compact(self.path)["scores"]
+        self.assertEqual(list(scores.index), [0, 0, 1])
+        self.assertTrue(scores["home_score"].isnull().iloc[2])
+
+        with stream.StreamSink(self.path) as sink:  # Resume
+            self.assertEqual(sink.keys("scores"), {"a", "b"})
+            sink.write("c", scores=pd.DataFrame({"home_score": [4]}))
+        self.assertEqual(len(stream.compact(self.path)["scores"]), 4)
+
+    def test_tail(self):
+        sink = stream.StreamSink(self.path, flush_every=1)
+        keys = []
+        reader = threading.Thread(target=lambda: keys.extend(
+            r["key"] for r in stream.tail(self.path, poll_interval=0.01, timeout=5)))
+        reader.start()
+        for key in "abc":
+            sink.write(key, rosters=pd.DataFrame({"No.": [1]}))
+        sink.close(end=True)
+        reader.join(5)
+        self.assertEqual(keys, ["a", "b", "c"])
+
+    def test_scrape_to_stream(self):
+        results = self._results()
+        rosters = results.rosters
+        self.assertEqual(len(rosters), len(_SOURCE.roster_dfs))
+        self.assertEqual(len(results.match_results), len(_SOURCE.match_result_dfs))
+        self.assertEqual(len(results.score_progressions),
+                         len(_SOURCE.score_progression_dfs))
+        self.assertEqual(list(results.score_progressions["home_score"]),
+                         list(_SOURCE.score_progression_dfs["home_score"]))
+        self.assertEqual(results.provenance["source"], "stream")
+        # Compact dtypes only when asked for, as for csvs
+        self.assertNotEqual(str(rosters["Team"].dtype), "category")
+        compacted = stream.compact(self.path, tables=["rosters"], compact_dtypes=True)
+        self.assertEqual(str(compacted["rosters"]["Team"].dtype), "category")
+        self.assertEqual(results.finalize_stream(), self.path)
+        with self.assertRaises(ValueError):
+            results.finalize_stream()
+
+    def test_stream_writes_as_completed(self):
+        results = self._results()
+        results.set_executor("thread", max_workers=4)
+        urls = list(pd.unique(_SOURCE.match_result_dfs["url"]))
+        _OfflineResults.slow_url = urls[0]
+        results.match_reports
+        # A slow first page holds back none of the others
+        keys = [r["key"] for r in stream.read_records(self.path)
+                if "match_results" in r["tables"]]
+        self.assertEqual(sorted(keys), sorted(urls))
+        self.assertEqual(keys[-1], urls[0])
+        self.assertEqual(results.match_urls, urls)
+        # Without a stream, results keep the order of the event page
+        results = _OfflineResults(_EVENT_INFO, "men", 2017)
+        results.event_page_soup = BeautifulSoup(self.html, "html.parser")
+        results.set_executor("thread", max_workers=4)
+        self.assertEqual(list(pd.unique(results.match_results["url"])), urls)
+
+    def test_resume_after_crash(self):
+        _OfflineResults.fail_after = 20
+        results = self._results()
+        results.rosters
+        with self.assertRaises(IOError):
+            results.match_reports
+        self.assertEqual(len(stream.compact(self.path)["match_results"]), 2 * 20)
+
+        _OfflineResults.fail_after = None
+        results = self._results()
+        self.assertEqual(len(results.match_results), len(_SOURCE.match_result_dfs))
+        self.assertEqual(len(_OfflineResults.calls),
+                         _SOURCE.match_result_dfs["url"].nunique())
@@ -0,0 +1,206 @@
+import importlib
+import threading
+import time
+import unittest
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+
+from usau import reports, throttle
+
+_TABLE = ("<html><body><table><tr><th>Name</th><th>Position</th></tr>"
+          "<tr><td>A</td><td>Cutter</td></tr></table></body></html>")
+
+
+def _has_module(name):
+    try:
+        importlib.import_module(name)
+        return True
+    except ImportError:
+        return False
+
+
+# pd.read_html needs lxml, or html5lib with bs4
+_HAS_HTML_PARSER = _has_module("lxml") or _has_module("html5lib")
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Stand-in for play.usaultimate.org with injected latency and throttling
+
+    /throttle/<key>/<n> returns 429 to the first n requests for key,
+    /error/<key>/<n> returns 503 likewise, and /slow sleeps before answering.
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+        try:
+            time.sleep(server.latency)
+            parts = self.path.strip("/").split("/")
+            if parts[0] in ("throttle", "error") and hits <= int(parts[2]):
+                self.send_response(429 if parts[0] == "throttle" else 503)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            if parts[0] == "missing":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = _TABLE.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class TestThrottle(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        self.server.lock = threading.Lock()
+        self.server.active = self.server.peak = 0
+        self.server.hits = {}
+        self.server.latency = 0.
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = "http://127.0.0.1:{port}".format(port=self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _fetcher(self, **kwargs):
+        limiter = throttle.AdaptiveLimiter(initial=2, maximum=4, cooldown=0.)
+        kwargs.setdefault("rate", 1000)
+        return throttle.Fetcher(limiter, backoff=0.01, timeout=5, **kwargs)
+
+    def test_retries_throttled_and_errors(self):
+        fetcher = self._fetcher()
+        self.assertIn("Cutter", fetcher.fetch(self.base + "/throttle/a/2"))
+        self.assertIn("Cutter", fetcher.fetch(self.base + "/error/a/1"))
+        self.assertEqual(fetcher.stats["throttled"], 3)
+        self.assertEqual(fetcher.stats["requests"], 5)
+        self.assertEqual(min(l for _, l in fetcher.limiter.history), 1)
+
+    def test_gives_up(self):
+        fetcher = self._fetcher()
+        fetcher.retries = 1
+        with self.assertRaises(throttle.requests.HTTPError):
+            fetcher.fetch(self.base + "/throttle/b/5")
+        with self.assertRaises(throttle.requests.HTTPError):
+            fetcher.fetch(self.base + "/missing")
+        self.assertEqual(self.server.hits["/missing"], 1)  # Not retried
+
+    def test_missing_pages_are_not_congestion(self):
+        fetcher = self._fetcher()
+        for _ in range(3):
+            with self.assertRaises(throttle.requests.HTTPError):
+                fetcher.fetch(self.base + "/missing")
+        self.assertGreaterEqual(fetcher.limiter.limit, 2)
+        self.assertNotIn(1, [limit for _, limit in fetcher.limiter.history])
+
+    def test_concurrency_bounded_and_increasing(self):
+        self.server.latency = 0.02
+        fetcher = self._fetcher()
+        executor = throttle.AdaptiveExecutor(fetcher, max_workers=8)
+        urls = [self.base + "/ok/{i}".format(i=i) for i in range(40)]
+        pages = list(executor.map(fetcher.fetch, urls))
+        self.assertEqual(len(pages), 40)
+        self.assertLessEqual(self.server.peak, 4)
+        self.assertEqual(fetcher.limiter.limit, 4)
+        executor.shutdown()
+
+    def test_slow_responses_decrease(self):
+        self.server.latency = 0.05
+        fetcher = self._fetcher()
+        fetcher.limiter.latency_target = 0.01
+        fetcher.fetch(self.base + "/slow")
+        self.assertEqual(fetcher.limiter.limit, 1)
+
+    def test_token_bucket(self):
+        bucket = throttle.TokenBucket(rate=50, burst=5)
+        start = time.time()
+        for _ in range(15):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.18)
+
+    def test_executor_retries_failed_at_end(self):
+        calls = []
+
+        def flaky(x):
+            calls.append(x)
+            if x == 1 and calls.count(x) == 1:
+                return throttle.RETRY
+            if x == 3 and calls.count(x) == 1:
+                raise IOError("Connection reset")
+            return x * 10
+
+        executor = throttle.AdaptiveExecutor(max_workers=2, retry_delay=0.)
+        self.assertEqual(list(executor.map(flaky, range(5), chunksize=5)),
+                         [0, 10, 20, 30, 40])
+        self.assertEqual(sorted(calls[5:]), [1, 3])
+        executor.shutdown()
+
+    def test_executor_none_is_a_result(self):
+        calls = []
+
+        def empty(x):
+            calls.append(x)
+            return None
+
+        executor = throttle.AdaptiveExecutor(max_workers=2, retry_delay=60.)
+        start = time.time()
+        self.assertEqual(list(executor.map(empty, [1, 2])), [None, None])
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(sorted(calls), [1, 2])
+
+        # Unless the task asks for it
+        executor.retry_delay = 0.
+        self.assertEqual(dict(executor.completed(throttle.retry_none(empty), [1, 2])),
+                         {0: None, 1: None})
+        self.assertEqual(len(calls), 2 + 2 * (executor.retry_rounds + 1))
+        executor.shutdown()
+
+    def test_executor_yields_as_completed(self):
+        release = threading.Event()
+
+        def task(x):
+            if x == 0:
+                release.wait(5)
+            return x
+
+        executor = throttle.AdaptiveExecutor(max_workers=4, retry_delay=0.)
+        completed = executor.completed(task, range(4))
+        first = [next(completed) for _ in range(3)]
+        self.assertEqual(sorted(first), [(1, 1), (2, 2), (3, 3)])
+        release.set()
+        self.assertEqual(list(completed), [(0, 0)])
+        executor.shutdown()
+
+    @unittest.skipUnless(_HAS_HTML_PARSER, "No HTML parser for pd.read_html")
+    def test_read_html_through_fetcher(self):
+        fetcher = self._fetcher()
+        reports.set_fetcher(fetcher)
+        try:
+            tables = reports.memoize_read_html(self.base + "/throttle/c/1",
+                                               match="Position", header=0)
+        finally:
+            reports.set_fetcher(None)
+            reports._table_cache.clear()
+        self.assertEqual(list(tables[0]["Position"]), ["Cutter"])
+        self.assertEqual(fetcher.stats["throttled"], 1)
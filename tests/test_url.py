@@ -0,0 +1,47 @@
+import unittest
+
+import pandas as pd
+
+from usau import urls
+
+_PATH = "/teams/events/match_report/?EventGameId="
+
+
+class TestCanonicalUrls(unittest.TestCase):
+    def test_game_id_encodings(self):
+        hrefs = [_PATH + "ab%2bcd%3d",
+                 _PATH + "ab+cd%3D",
+                 _PATH + "ab%2Bcd=",
+                 "http://play.usaultimate.org" + _PATH + "ab%2bcd%3d"]
+        self.assertEqual(set(urls.canonical_game_id(h) for h in hrefs),
+                         {"ab+cd="})
+        self.assertEqual(set(urls.canonical_match_url(h) for h in hrefs),
+                         {_PATH + "ab%2bcd%3d"})
+
+    def test_no_game_id(self):
+        self.assertIsNone(urls.canonical_game_id("/teams/events/Eventlogin/"))
+        self.assertEqual(urls.canonical_match_url("/foo"), "/foo")
+        self.assertEqual(list(urls.game_ids(["/foo", _PATH + "x%2b"])),
+                         ["/foo", "x+"])
+
+    def test_game_index(self):
+        index = urls.GameIndex([_PATH + "a%2b"])
+        self.assertIn(_PATH + "a+", index)
+        new = index.new_urls([_PATH + "a+", _PATH + "b", _PATH + "b",
+                              _PATH + "c%3d", _PATH + "c="])
+        self.assertEqual(new, [_PATH + "b", _PATH + "c%3d"])
+        self.assertEqual(len(index), 1)  # new_urls does not modify the index
+        self.assertTrue(index.add(_PATH + "b"))
+        self.assertFalse(index.add(_PATH + "b"))
+        self.assertEqual(list(index), [_PATH + "a%2b", _PATH + "b"])
+
+    def test_dedupe_games(self):
+        df = pd.DataFrame({
+            "url": [_PATH + "a%2b", _PATH + "a%2b", _PATH + "a+", _PATH + "a+",
+                    _PATH + "b", _PATH + "a+"],
+            "event": ["x", "x", "x", "x", "x", "y"],
+            "Team": ["A", "B", "A", "B", "C", "A"],
+        })
+        deduped = urls.dedupe_games(df, keys=["event"])
+        self.assertEqual(list(deduped.index), [0, 1, 4, 5])
+        self.assertEqual(len(urls.dedupe_games(df)), 3)
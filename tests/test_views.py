@@ -0,0 +1,55 @@
+import unittest
+
+from usau import reports
+
+_EVENT_INFO = {"level": "club", "event": ["nationals"],
+               "url": "USA-Ultimate-National-Championships-{y}"}
+
+
+class TestDerivedViews(unittest.TestCase):
+    def setUp(self):
+        self.results = reports.USAUResults(_EVENT_INFO, "men", 2017).load_from_csvs()
+
+    def test_memoized_without_mutation(self):
+        columns = list(self.results.match_results.columns)
+        team_results = self.results.team_results
+        self.assertIs(self.results.team_results, team_results)
+        self.assertEqual(list(self.results.match_results.columns), columns)
+        self.assertEqual(team_results["Games Played"].sum(), 110)
+
+    def test_invalidation(self):
+        team_results = self.results.team_results
+        missing = self.results.missing_tallies
+        self.results.roster_dfs = self.results.roster_dfs.copy()
+        self.assertIs(self.results.team_results, team_results)
+
+        self.results.match_result_dfs = self.results.match_result_dfs.iloc[:10]
+        self.assertLess(self.results.team_results["Games Played"].sum(), 110)
+        self.assertIsNot(self.results.missing_tallies, missing)
+
+        self.results.load_from_csvs()
+        self.assertEqual(self.results.team_results["Games Played"].sum(), 110)
+
+    def test_custom_view(self):
+        calls = []
+
+        def num_games(results):
+            calls.append(results)
+            return results.match_results["url"].nunique()
+
+        reports.USAUResults.register_view("num_games", num_games,
+                                          tables=["match_results"])
+        try:
+            self.assertEqual(self.results.view("num_games"), 55)
+            self.assertEqual(self.results.view("num_games"), 55)
+            self.assertEqual(len(calls), 1)
+            self.results.score_progression_dfs = self.results.score_progression_dfs
+            self.results.view("num_games")
+            self.assertEqual(len(calls), 1)
+            self.results.invalidate_views()
+            self.results.view("num_games")
+            self.assertEqual(len(calls), 2)
+        finally:
+            del reports.USAUResults._VIEWS["num_games"]
+        with self.assertRaises(KeyError):
+            self.results.view("num_games")
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from usau import archive, winprob
+from usau import ratings as ratings_module
+
+
+class TestWinProbability(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.archive = archive.load_archive(tables=["scores"])
+        cls.scores = cls.archive.scores
+        cls.model = winprob.WinProbability.from_archive(cls.archive)
+
+    def test_counts_and_symmetry(self):
+        scores = self.scores[(self.scores["home_final_score"] !=
+                              self.scores["away_final_score"]).values]
+        self.assertEqual(self.model.counts.sum(), 2 * len(scores))
+        # Brute force count of one state
+        state = ((scores["home_score"] == 7) & (scores["away_score"] == 5)).values
+        mirrored = ((scores["home_score"] == 5) & (scores["away_score"] == 7)).values
+        wins = ((scores["home_final_score"] > scores["away_final_score"]).values[state].sum() +
+                (scores["away_final_score"] > scores["home_final_score"]).values[mirrored].sum())
+        self.assertEqual(self.model.counts[0, 7, 5], state.sum() + mirrored.sum())
+        self.assertEqual(self.model.wins[0, 7, 5], wins)
+
+        table = self.model.table[0]
+        npt.assert_allclose(table + table.T, 1)
+        self.assertAlmostEqual(self.model.lookup(0, 0), 0.5)
+        self.assertGreater(self.model.lookup(12, 8), 0.9)
+        self.assertLess(self.model.lookup(8, 12), 0.1)
+        self.assertTrue(((table >= 0) & (table <= 1)).all())
+
+    def test_smoothing_sparse_states(self):
+        # A never observed state takes the win rate of its neighbours
+        self.assertEqual(self.model.counts[0, 20, 3], 0)
+        self.assertGreater(self.model.lookup(25, 3), 0.9)
+        sharp = winprob.WinProbability.fit(self.scores, strength=1e-9)
+        observed = sharp.counts > 0
+        npt.assert_allclose(sharp.table[observed],
+                            (sharp.wins / np.maximum(sharp.counts, 1))[observed],
+                            atol=1e-6)
+
+    def test_seed_buckets(self):
+        model = winprob.WinProbability.from_archive(self.archive, by="seed")
+        self.assertEqual(len(model.table), len(winprob.SEED_BINS) + 1)
+        self.assertGreater(model.lookup(0, 0, covariate=6), 0.5)
+        self.assertLess(model.lookup(0, 0, covariate=-6), 0.5)
+        self.assertAlmostEqual(model.lookup(0, 0, covariate=6) +
+                               model.lookup(0, 0, covariate=-6), 1)
+
+        archive_results = archive.load_archive(tables=["match_results", "scores"])
+        ratings = ratings_module.TeamRatings.from_archive(archive_results)
+        model = winprob.WinProbability.from_archive(archive_results, by="rating",
+                                                    ratings=ratings)
+        self.assertGreater(model.lookup(7, 7, covariate=5), model.lookup(7, 7, covariate=-5))
+
+    def test_win_probability_added(self):
+        df = winprob.win_probability_added(self.scores, self.model)
+        per_game = df.groupby(["event", "url"], observed=True, sort=False)
+        final = per_game["home_wp"].last()
+        npt.assert_allclose(per_game["home_wpa"].sum(), final - 0.5, atol=1e-9)
+        self.assertEqual(df["home_wpa"].isnull().sum(), 0)
+
+    def test_save_load(self):
+        path = tempfile.mkdtemp()
+        try:
+            filename = self.model.save(os.path.join(path, "winprob.npz"))
+            loaded = winprob.WinProbability.load(filename)
+            npt.assert_array_equal(loaded.table, self.model.table)
+            self.assertEqual(loaded.lookup(9, 11), self.model.lookup(9, 11))
+        finally:
+            shutil.rmtree(path)
@@ -0,0 +1,461 @@
+"""
+Bulk loading of every event in a data directory.
+
+Every ``{year}_{level}_{event}_{gender}_{table}.csv`` file (as written by
+:func:`usau.reports.USAUResults.to_csvs`) is parsed on a thread or process
+pool, and each table kind is concatenated once, with key columns naming the
+event each row came from. Games listed more than once within an event, e.g.
+under differently encoded match report urls, are dropped.
+
+:func:`iter_archive` instead yields one event at a time, reading the next
+in a background thread while the caller works on the current one, so only
+an event or two is resident at once.
+
+Example:
+
+    archive = usau.archive.load_archive()
+    archive.timings.sort_values("Seconds").tail()
+    ratings = usau.ratings.TeamRatings().add_results(archive.match_results)
+
+    ratings = usau.ratings.TeamRatings()
+    for event in usau.archive.iter_archive(tables=["match_results"], levels=["club"]):
+        ratings.add_results(event.match_results)
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict, deque
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import six
+
+from usau import attributes, schema
+from usau.urls import dedupe_games
+
+_logger = logging.getLogger(__name__)
+
+_clock = getattr(time, "perf_counter", time.time)
+
+TABLES = ("rosters", "match_reports", "match_results", "scores")
+# Tables with one or more rows per game, keyed by match report url
+GAME_TABLES = ("match_reports", "match_results", "scores")
+# Key columns attached to every table, from the file names
+KEYS = ("event", "division", "year", "level", "tournament", "gender")
+
+_FILE_RE = re.compile(r"^(\d{4})_([a-z0-9]+)_(.+)_(men|mixed|women)_"
+                      r"(rosters|match_reports|match_results|scores)\.csv$")
+
+
+def _default_data_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def discover(data_dir=None):
+    """Find every event's csvs in a directory
+
+    Files written before the current naming scheme (e.g. ``*-Rosters.csv``)
+    are not included.
+
+    Returns:
+        pd.DataFrame: one row per file, with the event keys, "table" and
+            "path", ordered by event then table
+    """
+    data_dir = os.path.expanduser(data_dir or _default_data_dir())
+    rows = []
+    for filename in os.listdir(data_dir):
+        match = _FILE_RE.match(filename)
+        if match is None:
+            continue
+        year, level, tournament, gender, table = match.groups()
+        event = "{year}_{level}_{tournament}_{gender}".format(
+            year=year, level=level, tournament=tournament, gender=gender)
+        rows.append(OrderedDict([
+            ("event", event),
+            ("division", "{level}_{gender}".format(level=level, gender=gender)),
+            ("year", int(year)),
+            ("level", level),
+            ("tournament", tournament),
+            ("gender", gender),
+            ("table", table),
+            ("path", os.path.join(data_dir, filename)),
+        ]))
+    files = pd.DataFrame(rows, columns=list(KEYS) + ["table", "path"])
+    files["order"] = files["table"].map({t: i for i, t in enumerate(TABLES)})
+    return (files.sort_values(["event", "order"]).drop("order", axis=1)
+            .reset_index(drop=True))
+
+
+def _read_csv(path):
+    """Parse one csv; module-level so it pickles to process pool workers
+
+    Returns:
+        (pd.DataFrame, float): table and seconds spent
+    """
+    start = _clock()
+    df = schema.read_table(path)
+    return df, _clock() - start
+
+
+class Archive(object):
+    """Tables of many events, each stacked into a single DataFrame
+
+    Attributes:
+        rosters, match_reports, match_results, scores (pd.DataFrame): Tables
+            of all events, with the :data:`KEYS` columns attached
+        files (pd.DataFrame): Files loaded, as from :func:`discover`
+        timings (pd.DataFrame): Per-file rows and parse seconds
+        elapsed (float): Wall clock seconds of the whole load
+    """
+
+    def __init__(self, tables, files, timings, elapsed):
+        self.tables = tables
+        self.files = files
+        self.timings = timings
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return ("Archive<{n} events, {rows} roster rows>"
+                .format(n=len(self.events), rows=len(self.rosters)))
+
+    def __getattr__(self, name):
+        tables = self.__dict__.get("tables", {})
+        if name in tables:
+            return tables[name]
+        raise AttributeError(name)
+
+    @property
+    def events(self):
+        """Names of the loaded events, as in USAUResults._name()"""
+        return list(pd.unique(self.files["event"].values))
+
+    def event(self, name, table):
+        """Rows of a table for a single event"""
+        df = self.tables[table]
+        return df.loc[(df["event"] == name).values]
+
+
+def _attach_keys(df, keys, lengths):
+    """Add the event key columns of each chunk to a concatenated table"""
+    for col in KEYS:
+        values = keys[col].values
+        if col == "year":
+            df[col] = np.repeat(values.astype(np.int16), lengths)
+        else:
+            categories, codes = np.unique(values.astype(str), return_inverse=True)
+            df[col] = pd.Categorical.from_codes(np.repeat(codes, lengths),
+                                                categories=categories)
+    return df
+
+
+def _select(files, tables=TABLES, events=None, levels=None, years=None, genders=None):
+    """Files of some tables and events, filtered on their names alone"""
+    mask = np.asarray(files["table"].isin(tables).values)
+    for col, values in (("event", events), ("level", levels), ("year", years),
+                        ("gender", genders)):
+        if values is None:
+            continue
+        if np.isscalar(values):
+            values = [values]
+        mask = mask & files[col].isin(list(values)).values
+    return files[mask].reset_index(drop=True)
+
+
+def _assemble(files, frames, tables, compact=True, dedupe=True):
+    """Concatenate parsed files into one table per kind
+
+    Args:
+        files (pd.DataFrame): As from :func:`discover`
+        frames (list[pd.DataFrame]): Parsed file of each row of files
+
+    Returns:
+        OrderedDict: table name to pd.DataFrame
+    """
+    loaded = OrderedDict()
+    for table in tables:
+        mask = (files["table"] == table).values
+        if not mask.any():
+            continue
+        chunks = [frames[i] for i in np.flatnonzero(mask)]
+        # Cast once after concatenating, rather than per file. Each file's
+        # index is kept, as load_from_csvs keeps it
+        df = pd.concat(chunks, sort=False)
+        if compact:
+            schema.apply_schema(df, table)
+        if table == "rosters":
+            attributes.normalize_rosters(df)
+        df = _attach_keys(df, files[mask], [len(chunk) for chunk in chunks])
+        if dedupe and table in GAME_TABLES:
+            before = len(df)
+            df = dedupe_games(df, keys=["event"])
+            if len(df) < before:
+                _logger.info("Dropped {n} duplicated game rows from {table}"
+                             .format(n=before - len(df), table=table))
+        loaded[table] = df
+    return loaded
+
+
+def load_archive(data_dir=None, executor=None, tables=TABLES, events=None,
+                 compact=True, dedupe=True):
+    """Load every event in a data directory
+
+    Args:
+        data_dir (str): Directory of csvs; defaults to the bundled usau/data
+        executor (concurrent.futures.Executor): Pool on which to parse files.
+            By default a thread pool, since most of the parse time is spent
+            in pandas' C parser.
+        tables (list[str]): Table kinds to load
+        events (list[str]): Only load these events (USAUResults._name())
+        compact (bool): Cast columns to the dtypes of :mod:`usau.schema`
+        dedupe (bool): Drop games duplicated under different urls, see
+            :func:`usau.urls.dedupe_games`
+
+    Returns:
+        Archive
+    """
+    start = _clock()
+    files = _select(discover(data_dir), tables, events)
+
+    own_executor = executor is None
+    if own_executor:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=min(32, multiprocessing.cpu_count() * 2))
+    try:
+        parsed = list(executor.map(_read_csv, files["path"]))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    frames = [df for df, _ in parsed]
+    timings = files[["event", "table", "path"]].copy()
+    timings["Rows"] = [len(df) for df in frames]
+    timings["Seconds"] = [seconds for _, seconds in parsed]
+
+    loaded = _assemble(files, frames, tables, compact=compact, dedupe=dedupe)
+
+    elapsed = _clock() - start
+    _logger.info("Loaded {n} files in {s:.3f}s ({cpu:.3f}s parsing)"
+                 .format(n=len(files), s=elapsed, cpu=timings["Seconds"].sum()))
+    return Archive(loaded, files, timings, elapsed)
+
+
+def _memory(archive):
+    """Bytes held by an archive's tables"""
+    return int(sum(df.memory_usage(deep=True).sum() for df in archive.tables.values()))
+
+
+def _to_results(archive):
+    """USAUResults of a single event archive, as if loaded from its csvs"""
+    from usau.reports import USAUResults
+
+    keys = archive.files.iloc[0]
+    results = USAUResults.from_event(level=keys["level"], year=keys["year"],
+                                     gender=keys["gender"], event=keys["tournament"])
+    for table, attr in (("rosters", "roster_dfs"), ("match_reports", "match_report_dfs"),
+                        ("match_results", "match_result_dfs"),
+                        ("scores", "score_progression_dfs")):
+        df = archive.tables.get(table)
+        if df is not None:
+            df = df.drop(list(KEYS), axis=1)
+        setattr(results, attr, df)
+    results.data_dir = os.path.dirname(keys["path"])
+    results.provenance = {"source": "csv", "path": os.path.abspath(keys["path"])}
+    return results
+
+
+class ArchiveReader(object):
+    """Iterable over events one at a time, in :func:`discover` order
+
+    Each event's files are parsed by a background thread, up to
+    ``read_ahead`` events ahead of the caller, so parsing overlaps whatever
+    the caller does with the current event. Events are only read while the
+    queued events, the one the caller holds and the estimated parsed size of
+    the next event fit within ``max_bytes``; an event is always read when
+    nothing else is resident. The estimate scales the event's csv bytes on
+    disk by the largest ratio of parsed to disk bytes of each table read so
+    far, so nothing is read ahead until each table has been read once, and
+    an event parsing larger than any before can overshoot the cap. The
+    caller's event is taken to be released when it asks for the next one.
+
+    Args:
+        data_dir (str): Directory of csvs; defaults to the bundled usau/data
+        tables (list[str]): Table kinds to read
+        events, levels, years, genders (list): Only read matching events,
+            filtered on file names before any file is opened
+        results (bool): Yield USAUResults rather than single event
+            :class:`Archive` objects
+        read_ahead (int): Most events parsed ahead of the caller
+        max_bytes (int): Cap on resident bytes of events; None for no cap
+        compact, dedupe (bool): As in :func:`load_archive`
+
+    Attributes:
+        files (pd.DataFrame): Files to read, as from :func:`discover`
+        peak_bytes (int): Most bytes of events resident at once so far,
+            including the one being parsed
+        memory_ratios (dict): Per table, the largest ratio of parsed to disk
+            bytes of an event so far
+    """
+
+    def __init__(self, data_dir=None, tables=TABLES, events=None, levels=None,
+                 years=None, genders=None, results=False, read_ahead=1,
+                 max_bytes=None, compact=True, dedupe=True):
+        self.files = _select(discover(data_dir), tables, events, levels, years, genders)
+        self.tables = [table for table in TABLES if table in tables]
+        self.results = results
+        self.read_ahead = max(1, read_ahead)
+        self.max_bytes = max_bytes
+        self.compact = compact
+        self.dedupe = dedupe
+        self.peak_bytes = 0
+        self.memory_ratios = {}
+
+    def __repr__(self):
+        return "ArchiveReader<{n} events>".format(n=len(self))
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def events(self):
+        return list(pd.unique(self.files["event"].values))
+
+    def _read(self, files):
+        start = _clock()
+        parsed = [_read_csv(path) for path in files["path"]]
+        frames = [df for df, _ in parsed]
+        timings = files[["event", "table", "path"]].copy()
+        timings["Rows"] = [len(df) for df in frames]
+        timings["Seconds"] = [seconds for _, seconds in parsed]
+        tables = _assemble(files, frames, self.tables, compact=self.compact,
+                           dedupe=self.dedupe)
+        return Archive(tables, files, timings, _clock() - start)
+
+    @staticmethod
+    def _disk_bytes(files):
+        """Per table, bytes of csvs on disk"""
+        sizes = {}
+        for table, path in zip(files["table"], files["path"]):
+            sizes[table] = sizes.get(table, 0) + os.path.getsize(path)
+        return sizes
+
+    def estimate(self, files):
+        """Estimated bytes of an event once parsed, see :attr:`memory_ratios`
+
+        Args:
+            files (pd.DataFrame): The event's rows of :attr:`files`
+
+        Returns:
+            int: or None if a table has not been read yet
+        """
+        sizes = self._disk_bytes(files)
+        if any(table not in self.memory_ratios for table in sizes):
+            return None
+        return int(sum(size * self.memory_ratios[table] for table, size in sizes.items()))
+
+    def _measure(self, archive):
+        """Update :attr:`memory_ratios` from a parsed event"""
+        sizes = self._disk_bytes(archive.files)
+        for table, df in archive.tables.items():
+            if sizes.get(table):
+                ratio = df.memory_usage(deep=True).sum() / float(sizes[table])
+                self.memory_ratios[table] = max(self.memory_ratios.get(table, 0.), ratio)
+
+    def __iter__(self):
+        names = self.events
+        by_event = dict((name, self.files[(self.files["event"] == name).values]
+                         .reset_index(drop=True)) for name in names)
+        cond = threading.Condition()
+        queue = deque()  # (archive or exc_info, bytes); None when done
+        # Bytes of queued events, the caller's event and the one being parsed
+        state = {"queued": 0, "held": 0, "reading": 0, "stop": False}
+
+        def resident():
+            return state["queued"] + state["held"] + state["reading"]
+
+        def sample():
+            self.peak_bytes = max(self.peak_bytes, resident())
+
+        def fits(size):
+            if self.max_bytes is None or resident() == 0:
+                return True
+            return size is not None and resident() + size <= self.max_bytes
+
+        def reader():
+            try:
+                for name in names:
+                    with cond:
+                        estimate = self.estimate(by_event[name])
+                        while not state["stop"] and (len(queue) >= self.read_ahead or
+                                                     not fits(estimate)):
+                            cond.wait()
+                        if state["stop"]:
+                            return
+                        state["reading"] = estimate or 0
+                        sample()
+                    archive = self._read(by_event[name])
+                    size = _memory(archive)
+                    with cond:
+                        self._measure(archive)
+                        queue.append((archive, size))
+                        state["queued"] += size
+                        state["reading"] = 0
+                        sample()
+                        cond.notify_all()
+            except Exception:
+                with cond:
+                    queue.append((sys.exc_info(), None))
+                    cond.notify_all()
+                return
+            with cond:
+                queue.append(None)
+                cond.notify_all()
+
+        thread = threading.Thread(target=reader, name="archive-reader")
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                with cond:
+                    state["held"] = 0
+                    cond.notify_all()
+                    while not queue:
+                        cond.wait()
+                    item = queue.popleft()
+                    if item is not None and item[1] is not None:
+                        state["queued"] -= item[1]
+                        state["held"] = item[1]
+                        cond.notify_all()
+                if item is None:
+                    return
+                archive, size = item
+                item = None
+                if size is None:
+                    six.reraise(*archive)
+                if self.results:
+                    try:
+                        archive = _to_results(archive)
+                    except ValueError as e:  # Not in the event registry
+                        _logger.warning("Skipping {event}: {e}".format(
+                            event=archive.events[0], e=e))
+                        continue
+                yield archive
+                archive = None
+        finally:
+            with cond:
+                state["stop"] = True
+                cond.notify_all()
+
+
+def iter_archive(data_dir=None, **kwargs):
+    """Iterate over the events of a data directory, see :class:`ArchiveReader`
+
+    Yields:
+        Archive: the tables of one event, or USAUResults if results=True
+    """
+    return iter(ArchiveReader(data_dir, **kwargs))
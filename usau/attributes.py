@@ -0,0 +1,182 @@
+"""
+Numeric player attributes parsed from roster text, and a range index over
+them.
+
+Rosters list heights as free text (``5'10"``), class years as words and
+positions as e.g. "Defense (Cutter)". :func:`normalize_rosters` adds
+"Height Inches", "Class Year" (1 for freshmen through 5 for fifth years and
+graduates) and "Handler", "Cutter" and "Defense" role flags, parsing each
+distinct value once. Heights outside 4'0" to 7'6", which are data entry
+junk such as 1'0", are NaN.
+
+:class:`RosterIndex` keeps sorted copies of the numeric columns of a whole
+archive's rosters, so range and role queries are binary searches rather
+than scans.
+
+Example:
+
+    index = RosterIndex.from_archive(usau.archive.load_archive(tables=["rosters"]))
+    index.query(ranges={"Height Inches": (None, 67)}, roles=["Handler"])
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import re
+
+import numpy as np
+import pandas as pd
+
+MIN_HEIGHT = 48  # Inches; 4'0"
+MAX_HEIGHT = 90  # 7'6"
+
+_HEIGHT_RE = re.compile(r"""^\s*(\d)\s*['\-]\s*(\d{1,2})?\s*(?:"|'')?\s*$""")
+_INCHES_RE = re.compile(r"""^\s*(\d{2})\s*(?:"|in)?\s*$""")
+
+CLASS_YEARS = {
+    "fr": 1, "freshman": 1, "first year": 1,
+    "so": 2, "soph": 2, "sophomore": 2,
+    "jr": 3, "junior": 3,
+    "sr": 4, "senior": 4,
+    "5th": 5, "5th year": 5, "fifth year": 5, "super senior": 5,
+    "gr": 5, "grad": 5, "graduate": 5,
+}
+
+# Role flag to the position words that imply it
+ROLES = OrderedDict([
+    ("Handler", ("handler", "dump")),
+    ("Cutter", ("cutter", "deep", "mid")),
+    ("Defense", ("defense",)),
+])
+
+ATTRIBUTE_COLUMNS = ("Height Inches", "Class Year") + tuple(ROLES)
+
+
+def _parse_unique(series, parse, dtype=float):
+    """Apply parse to each distinct value of a series, then map back"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.values
+        uniques = series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    parsed = np.array([parse(value) for value in uniques] + [parse(None)], dtype=dtype)
+    return pd.Series(parsed[codes], index=series.index)  # Code -1 is missing
+
+
+def parse_height(text):
+    """Inches of a height like 5'10", or NaN if missing or implausible"""
+    if not isinstance(text, str):
+        return np.nan
+    match = _HEIGHT_RE.match(text)
+    if match is not None:
+        inches = int(match.group(1)) * 12 + int(match.group(2) or 0)
+    else:
+        match = _INCHES_RE.match(text)
+        if match is None:
+            return np.nan
+        inches = int(match.group(1))
+    return float(inches) if MIN_HEIGHT <= inches <= MAX_HEIGHT else np.nan
+
+
+def parse_class_year(text):
+    """Ordinal of a class year like "Junior" or "Jr.", or NaN"""
+    if not isinstance(text, str):
+        return np.nan
+    return float(CLASS_YEARS.get(" ".join(text.lower().replace(".", "").split()), np.nan))
+
+
+def parse_roles(text):
+    """Role flags of a position, e.g. "Defense (Cutter/Handler)" is
+    a handler, a cutter and on defense"""
+    words = re.findall(r"[a-z]+", text.lower()) if isinstance(text, str) else ()
+    return tuple(any(word in words for word in role_words)
+                 for role_words in ROLES.values())
+
+
+def normalize_rosters(df):
+    """Add the :data:`ATTRIBUTE_COLUMNS` to a roster table, in place
+
+    Returns:
+        pd.DataFrame: df, for chaining
+    """
+    if df is None:
+        return df
+    df["Height Inches"] = (_parse_unique(df["Height"], parse_height).astype(np.float32)
+                           if "Height" in df.columns else np.nan)
+    df["Class Year"] = (_parse_unique(df["Year"], parse_class_year).astype(np.float32)
+                        if "Year" in df.columns else np.nan)
+    if "Position" in df.columns:
+        roles = _parse_unique(df["Position"],
+                              lambda text: sum(flag << i for i, flag in
+                                               enumerate(parse_roles(text))),
+                              dtype=np.int8).values
+    else:
+        roles = np.zeros(len(df), dtype=np.int8)
+    for i, role in enumerate(ROLES):
+        df[role] = (roles >> i) & 1 == 1
+    return df
+
+
+class RosterIndex(object):
+    """Sorted indexes of a roster table's numeric attributes and roles
+
+    Args:
+        rosters (pd.DataFrame): Rosters with the :data:`ATTRIBUTE_COLUMNS`,
+            e.g. of a whole archive; normalized if they are missing
+        columns (list[str]): Numeric columns to index for range queries
+    """
+
+    def __init__(self, rosters, columns=("Height Inches", "Class Year", "Goals",
+                                         "Assists", "Ds", "Turns")):
+        if any(col not in rosters.columns for col in ATTRIBUTE_COLUMNS):
+            rosters = normalize_rosters(rosters.copy())
+        self.rosters = rosters
+        self._sorted = {}  # column -> (sorted values, row positions)
+        for col in columns:
+            if col not in rosters.columns:
+                continue
+            values = rosters[col].values.astype(np.float64)
+            positions = np.flatnonzero(~np.isnan(values))
+            order = np.argsort(values[positions], kind="mergesort")
+            self._sorted[col] = (values[positions][order], positions[order])
+        self._roles = {role: np.flatnonzero(rosters[role].values) for role in ROLES}
+
+    @classmethod
+    def from_archive(cls, archive, **kwargs):
+        """Constructor from a :class:`usau.archive.Archive`'s rosters"""
+        return cls(archive.rosters, **kwargs)
+
+    def __len__(self):
+        return len(self.rosters)
+
+    def range(self, column, low=None, high=None):
+        """Sorted row positions with low <= column <= high; NaN never matches"""
+        values, positions = self._sorted[column]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return np.sort(positions[start:end])
+
+    def role(self, role):
+        """Sorted row positions of players with a role flag"""
+        return self._roles[role]
+
+    def positions(self, ranges=None, roles=()):
+        """Sorted row positions matching every range and role
+
+        Args:
+            ranges (dict): Column to (low, high), either of which may be None
+            roles (list[str]): Role flags, e.g. ["Handler", "Defense"]
+        """
+        candidates = [self.range(col, low, high)
+                      for col, (low, high) in (ranges or {}).items()]
+        candidates += [self.role(role) for role in roles]
+        if not candidates:
+            return np.arange(len(self.rosters))
+        candidates.sort(key=len)
+        result = candidates[0]
+        for other in candidates[1:]:
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def query(self, ranges=None, roles=()):
+        """Rows matching every range and role, see :func:`positions`"""
+        return self.rosters.iloc[self.positions(ranges, roles)]
@@ -0,0 +1,195 @@
+"""
+Batch, vectorized cleaning of raw scraped roster and match report tables.
+
+The per-table cleaning of :func:`usau.reports.USAUResults.clean_match_report_stats`
+and :func:`usau.reports.USAUResults.split_team_seed` calls Python functions
+per row of every table. Here the raw tables of all the rosters or match
+reports of an event are concatenated first, and the jersey number and name
+splitting, title-casing, seed parsing and column aliasing are done once,
+with pandas string methods. The output matches the per-table cleaning.
+
+Run as a script to benchmark both on the match reports of the whole archive:
+
+    python -m usau.clean
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import time
+
+import numpy as np
+import pandas as pd
+
+_clock = getattr(time, "perf_counter", time.time)
+
+# Raw match report columns to their cleaned aliases, in the order added
+MATCH_REPORT_ALIASES = OrderedDict([
+    ("G", ("Gs", "Goals")),
+    ("A", ("As", "Assists")),
+    ("D", ("Ds",)),
+    ("T", ("Ts", "Turns")),
+])
+# Columns attached to match report tables by USAUResults._scrape_match
+MATCH_REPORT_METADATA = ("url", "Team", "Seed", "Score", "Opp Team", "Opp Seed",
+                         "Opp Score")
+# Raw roster columns renamed by website updates
+ROSTER_ALIASES = {"Player": "Name"}
+
+
+def split_players(players):
+    """Vectorized split of '#N First Last' into N (or -1) and 'First Last'
+
+    Returns:
+        (pd.Series, pd.Series): jersey numbers and names
+    """
+    numbered = players.str.startswith("#").fillna(False).astype(bool).values
+    numbers = np.full(len(players), -1, dtype=np.int64)
+    if numbered.any():
+        numbers[numbered] = (players[numbered].str.split(n=1).str[0]
+                             .str[1:].astype(np.int64).values)
+    names = players.where(~numbered, players.str.split(" ", n=1).str[1])
+    return pd.Series(numbers, index=players.index), names
+
+
+def title_names(names):
+    """Vectorized :func:`usau.reports.title_name`"""
+    upper = names.str.isupper().fillna(False).astype(bool)
+    return names.where(~upper, names.str.title())
+
+
+def split_team_seeds(texts):
+    """Vectorized split of 'Team (N)' into team names and seeds"""
+    parts = texts.str.rsplit(" (", n=1, expand=True)
+    return parts[0], parts[1].str[:-1].astype(np.int64)
+
+
+def _batched(frames, is_raw, clean):
+    """Clean the raw frames in one batch, passing through the others"""
+    frames = [frame for frame in frames if frame is not None]
+    raw = [frame for frame in frames if is_raw(frame)]
+    if not raw:
+        return pd.concat(frames) if frames else None
+    cleaned = clean(pd.concat(raw))
+    if len(raw) == len(frames):
+        return cleaned
+    # Split the batch back up, to keep the frames in order
+    bounds = np.cumsum([0] + [len(frame) for frame in raw])
+    chunks = iter([cleaned.iloc[start:end] for start, end in zip(bounds, bounds[1:])])
+    return pd.concat([next(chunks) if is_raw(frame) else frame for frame in frames])
+
+
+def _clean_match_reports(table):
+    numbers, names = split_players(table["Players"])
+    table = table.copy()
+    table["No."] = numbers.values
+    table["Name"] = title_names(names).values
+    table["UpperName"] = table["Name"].str.upper()
+    for raw, aliases in MATCH_REPORT_ALIASES.items():
+        for alias in aliases:
+            table[alias] = table[raw]
+    # Columns in the order of per-table cleaning, which attaches the
+    # metadata after cleaning
+    added = ["No.", "Name", "UpperName"] + [alias for aliases in
+                                           MATCH_REPORT_ALIASES.values()
+                                           for alias in aliases]
+    dropped = set(["Players"] + list(MATCH_REPORT_ALIASES))
+    metadata = [col for col in MATCH_REPORT_METADATA if col in table.columns]
+    columns = [col for col in table.columns
+               if col not in dropped and col not in added and col not in metadata]
+    return table[columns + added + metadata]
+
+
+def clean_match_reports(frames):
+    """Clean the raw match report tables of many games at once
+
+    Args:
+        frames (list[pd.DataFrame]): Tables as returned by
+            ``USAUResults._scrape_match(url, clean=False)``; already cleaned
+            tables are passed through
+
+    Returns:
+        pd.DataFrame: as the concatenation of per-table
+            :func:`USAUResults.clean_match_report_stats`
+    """
+    return _batched(frames, lambda frame: "Players" in frame.columns,
+                    _clean_match_reports)
+
+
+def _clean_rosters(table):
+    table = table.copy()
+    names, seeds = split_team_seeds(table["Team"])
+    table["Team"] = names.values
+    table.insert(table.columns.get_loc("Team") + 1, "Seed", seeds.values)
+    return table
+
+
+def clean_rosters(frames):
+    """Clean the raw roster tables of many teams at once
+
+    Args:
+        frames (list[pd.DataFrame]): Tables as returned by
+            ``USAUResults._scrape_roster(link, clean=False)``, whose "Team"
+            is the link text, e.g. "Revolver (1)"; already cleaned tables
+            are passed through
+
+    Returns:
+        pd.DataFrame: Rosters with team names and seeds split, names
+            title-cased and the "UpperName" column
+    """
+    frames = [frame.rename(columns=ROSTER_ALIASES)
+              if frame is not None and "Name" not in frame.columns else frame
+              for frame in frames]
+    table = _batched(frames, lambda frame: "Seed" not in frame.columns,
+                     _clean_rosters)
+    if table is not None:
+        table["Name"] = title_names(table["Name"])
+        table["UpperName"] = table["Name"].str.upper()
+    return table
+
+
+def raw_match_reports(df):
+    """Raw match report tables, as scraped, of cleaned match reports; e.g. to
+    benchmark or test re-cleaning the archive
+
+    Returns:
+        list[pd.DataFrame]: one table per team per game
+    """
+    players = np.where(df["No."].values >= 0,
+                       "#" + df["No."].astype(str) + " " + df["UpperName"].astype(str),
+                       df["UpperName"].astype(str))
+    raw = pd.DataFrame(OrderedDict(
+        [("Players", players)] +
+        [(raw, df[aliases[0]].values) for raw, aliases in MATCH_REPORT_ALIASES.items()] +
+        [(col, df[col].values) for col in MATCH_REPORT_METADATA]), index=df.index)
+    keys = df["url"].astype(str) + "|" + df["Team"].astype(str)
+    return [group for _, group in raw.groupby(keys.values, sort=False)]
+
+
+def benchmark(archive=None):
+    """Seconds to clean the archive's match reports per table and in batch
+
+    Returns:
+        dict: "per_table" and "batch" seconds, and the number of "rows"
+    """
+    from usau import archive as archive_module
+    from usau.reports import USAUResults
+
+    if archive is None:
+        archive = archive_module.load_archive(tables=["match_reports"])
+    frames = raw_match_reports(archive.match_reports)
+
+    start = _clock()
+    per_table = pd.concat([USAUResults.clean_match_report_stats(
+        frame.drop(list(MATCH_REPORT_METADATA), axis=1)) for frame in frames])
+    per_table_seconds = _clock() - start
+
+    start = _clock()
+    batch = clean_match_reports(frames)
+    batch_seconds = _clock() - start
+    assert (per_table["Name"].values == batch["Name"].values).all()
+    return {"rows": len(batch), "tables": len(frames),
+            "per_table": per_table_seconds, "batch": batch_seconds}
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,296 @@
+"""
+Dense player x game x stat cube of match report statistics.
+
+Players and games are integer coded once, so per-player and per-team
+reductions are NumPy reductions over axes, rather than pandas groupbys over
+string keys, and scoring players by any weights of the stats (e.g. +/- or
+fantasy scores) is a single matrix product.
+
+A cube of the whole archive is ~5.5k players by ~1.5k games; stored as
+int16 that is ~66MB, which :func:`StatCube.save` writes as .npy files that
+:func:`StatCube.load` memory-maps.
+
+Example:
+
+    cube = StatCube.from_archive(usau.archive.load_archive(tables=["match_reports"]))
+    cube.leaderboard({"Goals": 1, "Assists": 1, "Ds": 1, "Turns": -0.5}, n=10)
+    cube.team_share("Goals").nlargest(10)
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import six
+
+STATS = ("Goals", "Assists", "Ds", "Turns")
+# Player axis keys; preceded by "division" when the frame has it, since
+# e.g. college men's and women's teams share names
+PLAYER_KEYS = ("Team", "UpperName")
+
+
+class StatCube(object):
+    """Player x game x stat array, with the labels of each axis
+
+    Attributes:
+        values (np.ndarray): int16, (players, games, stats)
+        played (np.ndarray): bool, (players, games), whether the player
+            appeared in the game's match report
+        players (pd.DataFrame): Per player code, "division" (if known), the
+            :data:`PLAYER_KEYS`, "Name" and "No."; plus "team_code", into
+            :attr:`teams`
+        games (pd.DataFrame): Per game code, "url" (and "event"), and the
+            codes of both teams, "home" and "away"
+        teams (list): Teams by code; (division, team) tuples if the
+            division is known, else team names
+        stats (tuple[str]): Names of the stat axis
+    """
+
+    def __init__(self, values, played, players, games, teams, stats=STATS):
+        self.values = values
+        self.played = played
+        self.players = players
+        self.games = games
+        self.teams = [tuple(team) if isinstance(team, list) else team for team in teams]
+        self.stats = tuple(stats)
+
+    def __repr__(self):
+        return ("StatCube<{p} players x {g} games x {s} stats>"
+                .format(p=len(self.players), g=len(self.games), s=len(self.stats)))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @classmethod
+    def from_match_reports(cls, df, stats=STATS):
+        """Build from a match reports table, as of USAUResults.match_reports
+        or, with its "event" and "division" columns, of an archive"""
+        game_keys = ["event", "url"] if "event" in df.columns else ["url"]
+        division_keys = ["division"] if "division" in df.columns else []
+        player_keys = division_keys + list(PLAYER_KEYS)
+        player_codes = df.groupby(player_keys, sort=False, observed=True).ngroup().values
+        game_codes = df.groupby(game_keys, sort=False, observed=True).ngroup().values
+        num_players, num_games = player_codes.max() + 1, game_codes.max() + 1
+
+        values = np.zeros((num_players, num_games, len(stats)), dtype=np.int16)
+        # Players can be listed twice in a report, e.g. namesakes without numbers
+        np.add.at(values, (player_codes, game_codes),
+                  df[list(stats)].fillna(0).values.astype(np.int16))
+        played = np.zeros((num_players, num_games), dtype=bool)
+        played[player_codes, game_codes] = True
+
+        first = ~pd.Series(player_codes).duplicated().values
+        team_names = np.r_[df["Team"].astype(str).values, df["Opp Team"].astype(str).values]
+        if division_keys:
+            divisions = np.tile(df["division"].astype(str).values, 2)
+            team_codes, teams = pd.factorize(pd.MultiIndex.from_arrays([divisions, team_names]))
+            teams = list(teams)
+        else:
+            team_codes, teams = pd.factorize(team_names)
+        team_codes, opp_codes = team_codes[:len(df)], team_codes[len(df):]
+        players = pd.DataFrame(OrderedDict(
+            [(col, df[col].values[first]) for col in player_keys + ["Name", "No."]] +
+            [("team_code", team_codes[first])]))
+        players.index = player_codes[first]
+        players = players.sort_index()
+
+        game_first = ~pd.Series(game_codes).duplicated().values
+        games = pd.DataFrame(OrderedDict(
+            [(col, df[col].astype(str).values[game_first]) for col in game_keys] +
+            [("home", team_codes[game_first]), ("away", opp_codes[game_first])]))
+        games.index = game_codes[game_first]
+        return cls(values, played, players, games.sort_index(), teams, stats)
+
+    @classmethod
+    def from_archive(cls, archive, **kwargs):
+        """Constructor from a :class:`usau.archive.Archive`"""
+        return cls.from_match_reports(archive.match_reports, **kwargs)
+
+    @classmethod
+    def from_results(cls, results, **kwargs):
+        """Constructor from a single USAUResults event"""
+        return cls.from_match_reports(results.match_reports, **kwargs)
+
+    def _stat(self, stat):
+        return self.stats.index(stat)
+
+    def _weights(self, weights):
+        """Weights as an array over stats; dicts default missing stats to 0"""
+        if isinstance(weights, dict):
+            return np.array([weights.get(stat, 0) for stat in self.stats], dtype=float)
+        return np.asarray(weights, dtype=float)
+
+    def subset(self, players=None, games=None):
+        """Cube of some players and/or games, by code or boolean mask"""
+        players = slice(None) if players is None else np.asarray(players)
+        games = slice(None) if games is None else np.asarray(games)
+        return StatCube(self.values[players][:, games], self.played[players][:, games],
+                        self.players.iloc[players], self.games.iloc[games],
+                        self.teams, self.stats)
+
+    def team_code(self, team, division=None):
+        """Code of a team in :attr:`teams`
+
+        Args:
+            division (str): e.g. "club_men"; only needed if the team's
+                name is in more than one division
+        """
+        if division is not None:
+            return self.teams.index((division, team))
+        matches = [code for code, key in enumerate(self.teams)
+                   if (key[1] if isinstance(key, tuple) else key) == team]
+        if len(matches) > 1:
+            raise ValueError("Team {team} is ambiguous across divisions; "
+                             "pass division=".format(team=team))
+        if not matches:
+            raise ValueError("Unknown team {team}".format(team=team))
+        return matches[0]
+
+    def team_players(self, team, division=None):
+        """Codes of a team's players"""
+        return np.flatnonzero(self.players["team_code"].values ==
+                              self.team_code(team, division))
+
+    def _team_index(self):
+        if self.teams and isinstance(self.teams[0], tuple):
+            return pd.MultiIndex.from_tuples(self.teams, names=["division", "Team"])
+        return pd.Index(self.teams)
+
+    def _frame(self, values, columns=None):
+        return pd.DataFrame(values, index=self.players.index,
+                            columns=columns or list(self.stats))
+
+    def totals(self):
+        """pd.DataFrame of each player's totals of each stat"""
+        return self._frame(self.values.sum(axis=1, dtype=np.int64))
+
+    def games_played(self):
+        return pd.Series(self.played.sum(axis=1), index=self.players.index)
+
+    def per_game(self):
+        """Per-game averages over the games each player appeared in"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._frame(self.values.sum(axis=1, dtype=np.int64) /
+                               self.played.sum(axis=1)[:, None])
+
+    def consistency(self):
+        """Standard deviation of each stat over the games each player
+        appeared in"""
+        counts = self.played.sum(axis=1)[:, None]
+        values = self.values.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = values.sum(axis=1) / counts
+            squares = (values ** 2).sum(axis=1) / counts
+            return self._frame(np.sqrt(np.maximum(squares - mean ** 2, 0)))
+
+    def team_game_totals(self):
+        """Array (teams, games, stats) of each team's totals in each game"""
+        totals = np.zeros((len(self.teams),) + self.values.shape[1:], dtype=np.int64)
+        np.add.at(totals, self.players["team_code"].values, self.values)
+        return totals
+
+    def team_totals(self):
+        """pd.DataFrame of each team's totals of each stat"""
+        totals = np.zeros((len(self.teams), len(self.stats)), dtype=np.int64)
+        np.add.at(totals, self.players["team_code"].values,
+                  self.values.sum(axis=1, dtype=np.int64))
+        return pd.DataFrame(totals, index=self._team_index(), columns=list(self.stats))
+
+    def team_share(self, stat="Goals"):
+        """Each player's share of their team's total of a stat"""
+        team = self.team_totals()[stat].values[self.players["team_code"].values]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(self.values[:, :, self._stat(stat)].sum(axis=1) / team,
+                             index=self.players.index)
+
+    def opponent_factors(self, stat="Goals"):
+        """Per team, the average of a stat its opponents produced against it
+        per game, relative to the average over all teams"""
+        totals = self.team_game_totals()[:, :, self._stat(stat)]
+        home, away = self.games["home"].values, self.games["away"].values
+        games = np.arange(len(self.games))
+        conceded = np.zeros(len(self.teams))
+        np.add.at(conceded, home, totals[away, games])
+        np.add.at(conceded, away, totals[home, games])
+        num_games = np.bincount(np.r_[home, away], minlength=len(self.teams))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            conceded = conceded / num_games
+        return conceded / np.nanmean(conceded)
+
+    def opponent_adjusted(self, stat="Goals"):
+        """Each player's total of a stat, with each game's production divided
+        by the opponent's :func:`opponent_factors`"""
+        factors = self.opponent_factors(stat)
+        player, game = np.nonzero(self.played)
+        team = self.players["team_code"].values[player]
+        home, away = self.games["home"].values[game], self.games["away"].values[game]
+        opponent = np.where(team == home, away, home)
+        adjusted = np.zeros(len(self.players))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            np.add.at(adjusted, player,
+                      self.values[player, game, self._stat(stat)] / factors[opponent])
+        return pd.Series(adjusted, index=self.players.index)
+
+    def scores(self, weights):
+        """Players' totals weighted by stat, as one matrix product
+
+        Args:
+            weights (dict | array): Weight of each stat, e.g. {"Goals": 1,
+                "Turns": -0.5}; or a (stats, k) array of k weightings
+
+        Returns:
+            np.ndarray: (players,) or (players, k) scores
+        """
+        return self.values.sum(axis=1, dtype=np.int64).dot(self._weights(weights))
+
+    def game_scores(self, weights):
+        """Per player per game weighted scores, (players, games[, k])"""
+        return self.values.dot(self._weights(weights))
+
+    def leaderboard(self, weights, n=25, per_game=False):
+        """Top n players by weighted score"""
+        scores = self.scores(weights)
+        if per_game:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scores = scores / self.played.sum(axis=1)
+        columns = [col for col in ("division",) + PLAYER_KEYS[:1] if col in self.players]
+        df = self.players[columns + ["Name", "No."]].copy()
+        df["Games"] = self.played.sum(axis=1)
+        df["Score"] = scores
+        return df.nlargest(n, "Score")
+
+    def save(self, path):
+        """Write to a directory of .npy arrays and json axis labels"""
+        path = os.path.expanduser(path)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        np.save(os.path.join(path, "values.npy"), self.values)
+        np.save(os.path.join(path, "played.npy"), self.played)
+        axes = {"stats": list(self.stats), "teams": self.teams,
+                "players": json.loads(self.players.to_json(orient="split")),
+                "games": json.loads(self.games.to_json(orient="split"))}
+        with io.open(os.path.join(path, "axes.json"), "w", encoding="utf-8") as fd:
+            fd.write(six.text_type(json.dumps(axes)))
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Read a cube written by :func:`save`, memory-mapping the arrays
+
+        Args:
+            mmap_mode (str): As in np.load; None to read into memory
+        """
+        path = os.path.expanduser(path)
+        with io.open(os.path.join(path, "axes.json"), encoding="utf-8") as fd:
+            axes = json.load(fd)
+        frames = [pd.DataFrame(axes[axis]["data"], index=axes[axis]["index"],
+                               columns=axes[axis]["columns"])
+                  for axis in ("players", "games")]
+        return cls(np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, "played.npy"), mmap_mode=mmap_mode),
+                   frames[0], frames[1], axes["teams"], axes["stats"])
@@ -7,6 +7,8 @@ import argparse
 import logging
 import os
 
+import usau.pipeline
+import usau.profiling
 import usau.reports
 
 _logger = logging.getLogger()
@@ -35,11 +37,29 @@ if __name__ == "__main__":
                              "concurrency to speed up downloading reports")
     parser.add_argument("--max_workers", type=int, default=4,
                         help="Number of workers to use for concurrency")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Download on threads (implies --parallel thread), adapting "
+                             "the number of concurrent requests to server latency and "
+                             "throttling, starting from --max_workers, and retry failed "
+                             "pages at the end")
+    parser.add_argument("--stream", action="store_true",
+                        help="Append each scraped page to {data_dir}/{event}.ndjson as it "
+                             "arrives, resuming from the file if it exists")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Download all genders at once, sharing one pool of "
+                             "--max_workers threads and one HTTP session, with a "
+                             "progress display")
     parser.add_argument("--log_level", default="INFO",
                         help="Python logging verbosity level")
+    usau.profiling.add_profile_argument(parser)
     args = parser.parse_args()
+    if args.adaptive:
+        if args.parallel == "process":
+            parser.error("--adaptive runs on threads; use --parallel thread")
+        args.parallel = "thread"
 
     logging.basicConfig(level=args.log_level)
+    usau.profiling.start_profiling(args.profile)
     if args.proxy:
         # As noted in argparser, this probably doesn't affect proxy settings of urllib,
         # might need to set http_proxy as environment variable outside of this script.
@@ -51,6 +71,15 @@ if __name__ == "__main__":
             args.gender = ["men", "women"]
         _logger.info("Downloading results for genders: {genders}"
                      .format(genders=args.gender))
+
+    def download(results):
+        if args.stream:
+            results.set_stream(data_dir=args.data_dir)
+        results.to_csvs(data_dir=args.data_dir)
+        if args.stream:
+            results.finalize_stream()
+
+    divisions = []
     for gender in args.gender:
         if args.url is not None:
             results = (usau.reports.USAUResults
@@ -63,7 +92,33 @@ if __name__ == "__main__":
                                        level=args.level))
         else:
             raise ValueError("Need --url or --event")
-        if args.parallel:
-            results.set_executor(mode=args.parallel,
-                                 max_workers=args.max_workers)
-        results.to_csvs(data_dir=args.data_dir)
+        divisions.append(results)
+
+    if args.pipeline:
+        if args.parallel == "process":
+            parser.error("--pipeline shares threads across divisions; "
+                         "use --parallel thread")
+        # One executor, and through the fetcher one session, for all divisions
+        divisions[0].set_executor(mode="thread", max_workers=args.max_workers,
+                                  adaptive=args.adaptive)
+        if usau.reports._fetcher is None:
+            from usau import throttle
+            usau.reports.set_fetcher(throttle.Fetcher(throttle.AdaptiveLimiter(
+                initial=args.max_workers, maximum=args.max_workers)))
+        executor = divisions[0].executor
+        errors = usau.pipeline.run_pipeline(divisions, download, executor,
+                                            usau.pipeline.Progress())
+        executor.shutdown()
+        failed = [name for name, error in errors.items() if error is not None]
+        if failed:
+            _logger.error("Failed to download: {names}".format(names=failed))
+    else:
+        for results in divisions:
+            if args.parallel:
+                results.set_executor(mode=args.parallel,
+                                     max_workers=args.max_workers,
+                                     adaptive=args.adaptive)
+            download(results)
+    if usau.reports._fetcher is not None:
+        _logger.info("Request statistics: {stats}"
+                     .format(stats=usau.reports._fetcher.summary()))
@@ -5,28 +5,58 @@ Summarize ultimate fantasy scores and results.
 from __future__ import print_function
 
 import argparse
+import array
+from collections import OrderedDict
+import difflib
+import io
+import itertools
+import os
+import re
 
 import numpy as np
 import pandas as pd
+import six
 
-from usau import markdown, reports
+from usau import markdown, profiling, reports
 
+try:
+    from html import unescape
+except ImportError:  # py2
+    from six.moves.html_parser import HTMLParser
+    unescape = HTMLParser().unescape
 
-def compute_fantasy_picks(captain_multiplier=2, from_csv=False, fantasy_input=None):
-    """Convert fantasy picks to an indicator matrix"""
+
+def _contest_rosters(from_csv=False, mens=None, womens=None):
+    """Rosters to pick from; by default those of 2016 D-I college nationals"""
     # I'll wait until a next fantasy contest to see if this should be generalized ..
-    if from_csv:
-        reports.d1_college_nats_men_2016.load_from_csvs()
-        reports.d1_college_nats_women_2016.load_from_csvs()
-    fantasy_mens = reports.d1_college_nats_men_2016.rosters
-    fantasy_womens = reports.d1_college_nats_women_2016.rosters
+    if from_csv and (mens is None or womens is None):
+        reports.d1college_nats_men_2016.load_from_csvs()
+        reports.d1college_nats_women_2016.load_from_csvs()
+    if mens is None:
+        mens = reports.d1college_nats_men_2016.rosters
+    if womens is None:
+        womens = reports.d1college_nats_women_2016.rosters
+    return mens, womens
+
+
+def compute_fantasy_picks(captain_multiplier=2, from_csv=False, fantasy_input=None,
+                          mens=None, womens=None):
+    """Convert fantasy picks to an indicator matrix
+
+    Args:
+        mens, womens (pd.DataFrame): Rosters to pick from; by default those of
+            2016 D-I college nationals. These are copied, not modified.
+    """
+    mens, womens = _contest_rosters(from_csv, mens, womens)
+    fantasy_mens = mens.copy()
+    fantasy_womens = womens.copy()
 
     fantasy_input = fantasy_input or get_fantasy_input()
-    for user, fantasy_lines in fantasy_input.iteritems():
+    for user, fantasy_lines in six.iteritems(fantasy_input):
         fantasy_mens[user] = 0
         fantasy_womens[user] = 0
 
-        for gender, fantasy_line in fantasy_lines.iteritems():
+        for gender, fantasy_line in six.iteritems(fantasy_lines):
             for player in fantasy_line:
                 player_multiplier = 1
                 if player.endswith("*"):
@@ -77,17 +107,17 @@ def compute_athlete_fantasy_scores(df, min_players=20, goal_weight=1, assist_wei
     df["Fantasy Score"] = (df.Goals * goal_weight + df.Assists * assist_weight +
                            df.Ds * d_weight + df.Turns * turn_weight)
     # Sort players by fantasy score and mark top min_players
-    top_fantasy_players = np.zeros(len(df), dtype=np.bool)
+    top_fantasy_players = np.zeros(len(df), dtype=bool)
     top_fantasy_players[df["Fantasy Score"].argsort(
     ).values[::-1][:min_players]] = True
     # Union of all players with non-zero fantasy picks and top min_players by fantasy score
-    result = (df[(df["Fantasy Picks"] > 0) | top_fantasy_players]
-              .sort(["Fantasy Score", "Seed"], ascending=False))
-    return result
+    result = df[(df["Fantasy Picks"] > 0) | top_fantasy_players]
+    return result.sort_values(["Fantasy Score", "Seed"], ascending=False)
 
 
 def compute_fantasy_contest_results(min_players=20, use_markdown=False, display=True, from_csv=False,
-                                    fantasy_input=None, beta=0.2, captain_multiplier=2):
+                                    fantasy_input=None, beta=0.2, captain_multiplier=2,
+                                    mens=None, womens=None, contest=None):
     """Calculate fantasy results (for athletes and contest users)
 
     Args:
@@ -95,9 +125,20 @@ def compute_fantasy_contest_results(min_players=20, use_markdown=False, display=
         display (bool): Display results to stdout / jupyter
         use_markdown (bool): Print results as a markdown-formatted table
         from_csv (bool): Load data from offline csvs
+        mens, womens (pd.DataFrame): Rosters, see :func:`compute_fantasy_picks`
+        contest (Contest): Ingested entries, see :func:`ingest_contest`; scored
+            as arrays rather than a column per user, instead of fantasy_input
     """
-    mens, womens, users = compute_fantasy_picks(from_csv=from_csv, captain_multiplier=captain_multiplier,
-                                                fantasy_input=fantasy_input)
+    if contest is not None:
+        mens, womens = [df.copy() for df in _contest_rosters(from_csv, mens, womens)]
+        mens["Fantasy Picks"] = contest.pick_counts("Men", mens, captain_multiplier)
+        womens["Fantasy Picks"] = contest.pick_counts("Women", womens, captain_multiplier)
+    else:
+        mens, womens, users = compute_fantasy_picks(from_csv=from_csv, captain_multiplier=captain_multiplier,
+                                                    fantasy_input=fantasy_input,
+                                                    mens=mens, womens=womens)
+    # Fantasy Score is added to the full rosters, which entries are scored by
+    all_mens, all_womens = mens, womens
     # Show the top-scoring players, sorted by fantasy score
     mens = compute_athlete_fantasy_scores(mens, min_players=min_players,
                                           d_weight=beta, turn_weight=-beta)
@@ -111,14 +152,22 @@ def compute_fantasy_contest_results(min_players=20, use_markdown=False, display=
         markdown.display(womens[display_cols], use_markdown=use_markdown)
 
     # Show the fantasy contest users sorted by fantasy score
-    results = []
-    for user in users:
-        results.append({"User": user,
-                        "Men's": sum(mens["Fantasy Score"] * mens[user]),
-                        "Women's": sum(womens["Fantasy Score"] * womens[user])})
-    results = pd.DataFrame(results)
+    if contest is not None:
+        results = pd.DataFrame(OrderedDict([
+            ("User", contest.users),
+            ("Men's", contest.entry_scores("Men", all_mens, all_mens["Fantasy Score"],
+                                           captain_multiplier)),
+            ("Women's", contest.entry_scores("Women", all_womens, all_womens["Fantasy Score"],
+                                             captain_multiplier))]))
+    else:
+        results = []
+        for user in users:
+            results.append({"User": user,
+                            "Men's": sum(mens["Fantasy Score"] * mens[user]),
+                            "Women's": sum(womens["Fantasy Score"] * womens[user])})
+        results = pd.DataFrame(results)
     results["Total"] = results["Men's"] + results["Women's"]
-    results = results.sort("Total", ascending=False)[
+    results = results.sort_values("Total", ascending=False)[
         ["User", "Total", "Men's", "Women's"]]
     if display:
         markdown.display(results, use_markdown=use_markdown)
@@ -191,6 +240,321 @@ def get_fantasy_input():
     }
 
 
+# Contest entries, as posted in a forum thread: a user line such as
+# "[-]scottyskin96 2 points 19 hours ago", then one line per division such
+# as "Men's: Dalton Smith, John Stubbs*, ...", with the captain starred
+DIVISIONS = ("Men", "Women")
+LINEUP_SIZE = 7
+
+_USER_RE = re.compile(u"^\\s*\\[[\u2013+-]\\]\\s*([\\w-]+)", re.UNICODE)
+_LINEUP_RE = re.compile(r"^\s*(Men|Women)(?:'s)?\s*:\s*(.*)$", re.IGNORECASE)
+_BLOCK_TAG_RE = re.compile(r"</?(?:p|div|br|li|ul|ol|tr|h\d)\b[^>]*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def _html_lines(lines):
+    """Text lines of streamed html, broken at block tags; tags and lines
+    split across chunks are carried over"""
+    pending, text = "", ""
+    for line in lines:
+        pending += line.replace("\r", " ").replace("\n", " ")
+        start = pending.rfind("<")
+        if start > pending.rfind(">"):  # Tag still open
+            chunk, pending = pending[:start], pending[start:]
+        else:
+            chunk, pending = pending, ""
+        text += unescape(_TAG_RE.sub("", _BLOCK_TAG_RE.sub("\n", chunk)))
+        text_lines = text.split("\n")
+        text = text_lines.pop()
+        for text_line in text_lines:
+            yield text_line
+    text += unescape(_TAG_RE.sub("", pending))
+    for text_line in text.split("\n"):
+        yield text_line
+
+
+def parse_entries(lines, html=None):
+    """Stream (user, lineups) contest entries out of raw text
+
+    Args:
+        lines (iterable[str]): Lines of plain text or of saved html, e.g. an
+            open file; read once, in order
+        html (bool): Whether lines are html; by default guessed from
+            the first non-blank line
+
+    Yields:
+        (str, OrderedDict): User and the list of raw picks by division, in
+            the order posted; captains keep their trailing asterisk
+    """
+    lines = iter(lines)
+    if html is None:
+        first = next((line for line in lines if line.strip()), "")
+        html = first.lstrip().startswith("<")
+        lines = itertools.chain([first], lines)
+    if html:
+        lines = _html_lines(lines)
+    user, lineups = None, None
+    for line in lines:
+        match = _USER_RE.match(line)
+        if match is not None:
+            if user is not None:
+                yield user, lineups
+            user, lineups = match.group(1), OrderedDict()
+            continue
+        match = _LINEUP_RE.match(line)
+        if match is not None and user is not None:
+            division = match.group(1).capitalize()
+            lineups[division] = [pick.strip() for pick in match.group(2).split(",")
+                                 if pick.strip()]
+    if user is not None:
+        yield user, lineups
+
+
+def lineup_errors(lineups, size=LINEUP_SIZE, divisions=DIVISIONS):
+    """Problems with an entry's lineups, e.g. ["Men: 6 players"]; empty if valid"""
+    errors = []
+    for division in divisions:
+        picks = lineups.get(division)
+        if not picks:
+            errors.append("{div}: missing".format(div=division))
+            continue
+        if len(picks) != size:
+            errors.append("{div}: {n} players".format(div=division, n=len(picks)))
+        captains = sum(pick.endswith("*") for pick in picks)
+        if captains != 1:
+            errors.append("{div}: {n} captains".format(div=division, n=captains))
+    return errors
+
+
+def _pick_key(pick):
+    """Normalized name of a pick, without any captain marker"""
+    return " ".join(pick.rstrip("*").upper().split())
+
+
+class NameResolver(object):
+    """Resolves picked names to roster rows, each distinct name once
+
+    A name matches the one player whose name contains it, else the one
+    player whose name contains its last word, else the closest spelling
+    of a full or last name (e.g. "Freystatter" for "Freystaetter").
+
+    Args:
+        roster (pd.DataFrame): With "UpperName"
+    """
+
+    def __init__(self, roster, cutoff=0.8):
+        self.roster = roster
+        self.names = pd.Series(roster["UpperName"].astype(str).values)
+        self.cutoff = cutoff
+        self._cache = {}
+
+    def _unique(self, mask):
+        positions = np.flatnonzero(mask)
+        return positions[0] if len(positions) == 1 else None
+
+    def resolve_one(self, key):
+        """Roster position of a normalized name, or -1"""
+        if not key:
+            return -1
+        position = self._unique(self.names.str.contains(key, regex=False).values)
+        if position is None:
+            position = self._unique(
+                self.names.str.contains(key.split()[-1], regex=False).values)
+        if position is None:
+            candidates = self.names.values if " " in key else self.names.str.split().str[-1].values
+            close = difflib.get_close_matches(key, [c for c in candidates if isinstance(c, str)],
+                                              n=1, cutoff=self.cutoff)
+            if close:
+                position = self._unique(candidates == close[0])
+        return -1 if position is None else int(position)
+
+    def resolve(self, keys):
+        """np.ndarray of roster positions of normalized names; -1 if unresolved"""
+        for key in set(keys) - set(self._cache):
+            self._cache[key] = self.resolve_one(key)
+        return np.array([self._cache[key] for key in keys], dtype=np.int64)
+
+
+class Contest(object):
+    """Compact fantasy contest of validated entries
+
+    Attributes:
+        users (np.ndarray): Users of the valid entries
+        picks (dict): Per division, (entries, LINEUP_SIZE) int array of codes
+            into players; the captain is in the first column
+        players (dict): Per division, pd.DataFrame of the picked players'
+            "Team" and "UpperName"
+        rejected (pd.DataFrame): "User" and "Error" of invalid entries
+    """
+
+    def __init__(self, users, picks, players, rejected=None):
+        self.users = np.asarray(users, dtype=np.str_)
+        self.picks = picks
+        self.players = players
+        self.rejected = (rejected if rejected is not None else
+                         pd.DataFrame(columns=["User", "Error"]))
+
+    def __repr__(self):
+        return ("Contest<{n} entries, {r} rejected>"
+                .format(n=len(self.users), r=len(self.rejected)))
+
+    def __len__(self):
+        return len(self.users)
+
+    @classmethod
+    def ingest(cls, lines, rosters, html=None, size=LINEUP_SIZE):
+        """Build from raw entry text in a single streaming pass
+
+        Picks are interned as they stream by, so memory grows with the number
+        of entries only by a few ints each; distinct names are then resolved
+        against the rosters in one batch.
+
+        Args:
+            lines (iterable[str]): See :func:`parse_entries`
+            rosters (dict): Division to roster, e.g. {"Men": mens, "Women": womens}
+
+        Returns:
+            Contest
+        """
+        divisions = tuple(rosters)
+        keys = dict((division, OrderedDict()) for division in divisions)
+        codes = dict((division, array.array("i")) for division in divisions)
+        users, rejected, seen = [], [], set()
+        for user, lineups in parse_entries(lines, html=html):
+            errors = lineup_errors(lineups, size=size, divisions=divisions)
+            if user in seen:
+                errors.append("Duplicate entry")
+            if errors:
+                rejected.append((user, "; ".join(errors)))
+                continue
+            seen.add(user)
+            users.append(user)
+            for division in divisions:
+                # Captain first
+                picks = sorted(lineups[division], key=lambda pick: not pick.endswith("*"))
+                interned = keys[division]
+                for pick in picks:
+                    codes[division].append(interned.setdefault(_pick_key(pick), len(interned)))
+
+        valid = np.ones(len(users), dtype=bool)
+        errors = [[] for _ in users]
+        picks, players = {}, {}
+        for division in divisions:
+            names = list(keys[division])
+            positions = NameResolver(rosters[division]).resolve(names)
+            entry_positions = positions[np.frombuffer(codes[division], dtype=np.int32)
+                                        .reshape(-1, size)]
+            unresolved = entry_positions < 0
+            ordered = np.sort(entry_positions, axis=1)
+            repeated = (ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0)
+            for i in np.flatnonzero(unresolved.any(axis=1) | repeated.any(axis=1)):
+                valid[i] = False
+                name_codes = codes[division][i * size:(i + 1) * size]
+                missing = [names[code] for code, miss in zip(name_codes, unresolved[i]) if miss]
+                if missing:
+                    errors[i].append("{div}: unresolved {names}"
+                                     .format(div=division, names=", ".join(missing)))
+                if repeated[i].any():
+                    errors[i].append("{div}: repeated player".format(div=division))
+            picks[division] = entry_positions
+        rejected += [(user, "; ".join(error)) for user, error, ok
+                     in zip(users, errors, valid) if not ok]
+
+        for division in divisions:
+            # Recode roster positions to the picked players only
+            used, inverse = np.unique(picks[division][valid], return_inverse=True)
+            roster = rosters[division]
+            players[division] = pd.DataFrame(OrderedDict(
+                (col, roster[col].astype(str).values[used]) for col in ("Team", "UpperName")))
+            picks[division] = inverse.reshape(-1, size).astype(np.int32)
+        return cls(np.array(users, dtype=np.str_)[valid], picks, players,
+                   pd.DataFrame(rejected, columns=["User", "Error"]))
+
+    def save(self, path):
+        """Write to a compressed .npz file"""
+        arrays = {"users": self.users,
+                  "divisions": np.array(list(self.picks), dtype=np.str_),
+                  "rejected_users": np.asarray(self.rejected["User"], dtype=np.str_),
+                  "rejected_errors": np.asarray(self.rejected["Error"], dtype=np.str_)}
+        for division, picks in self.picks.items():
+            arrays[division + "_picks"] = picks
+            for col in ("Team", "UpperName"):
+                arrays[division + "_" + col] = np.asarray(self.players[division][col], dtype=np.str_)
+        np.savez_compressed(path, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a contest written by :func:`save`"""
+        data = np.load(path)
+        picks, players = OrderedDict(), OrderedDict()
+        for division in data["divisions"]:
+            division = str(division)
+            picks[division] = data[division + "_picks"]
+            players[division] = pd.DataFrame(OrderedDict(
+                (col, data[division + "_" + col]) for col in ("Team", "UpperName")))
+        rejected = pd.DataFrame({"User": data["rejected_users"],
+                                 "Error": data["rejected_errors"]},
+                                columns=["User", "Error"])
+        return cls(data["users"], picks, players, rejected)
+
+    def roster_positions(self, division, roster):
+        """Positions in a roster of each entry's picks, (entries, LINEUP_SIZE)"""
+        keys = pd.MultiIndex.from_arrays([roster["Team"].astype(str).values,
+                                          roster["UpperName"].astype(str).values])
+        picked = pd.MultiIndex.from_arrays([self.players[division]["Team"].values,
+                                            self.players[division]["UpperName"].values])
+        positions = keys.get_indexer(picked)
+        if (positions < 0).any():
+            raise ValueError("Picked {div} players missing from roster: {names}".format(
+                div=division,
+                names=list(self.players[division]["UpperName"].values[positions < 0])))
+        return positions[self.picks[division]]
+
+    def pick_counts(self, division, roster, captain_multiplier=2):
+        """Per roster row, the picks of the player, captains counted
+        captain_multiplier times"""
+        positions = self.roster_positions(division, roster)
+        counts = np.bincount(positions.ravel(), minlength=len(roster))
+        counts += (captain_multiplier - 1) * np.bincount(positions[:, 0], minlength=len(roster))
+        return counts
+
+    def entry_scores(self, division, roster, scores, captain_multiplier=2):
+        """Each entry's total of per roster row scores of its picks"""
+        positions = self.roster_positions(division, roster)
+        scores = np.asarray(scores, dtype=float)
+        return scores[positions].sum(axis=1) + (captain_multiplier - 1) * scores[positions[:, 0]]
+
+    def to_input(self):
+        """Mapping of users to lineups, as :func:`get_fantasy_input`"""
+        return OrderedDict(
+            (user, OrderedDict(
+                (division, [name + ("*" if j == 0 else "") for j, name in enumerate(
+                    self.players[division]["UpperName"].values[self.picks[division][i]])])
+                for division in self.picks))
+            for i, user in enumerate(self.users))
+
+
+def ingest_contest(path, rosters, contest_path=None, encoding="utf-8"):
+    """Ingest a raw entries file, optionally writing the compact contest
+
+    Args:
+        path (str): Plain text or saved html of the entries
+        rosters (dict): Division to roster
+        contest_path (str): Where to write the .npz contest, if given
+
+    Returns:
+        Contest
+    """
+    with io.open(os.path.expanduser(path), encoding=encoding) as fd:
+        contest = Contest.ingest(fd, rosters)
+    for user, error in contest.rejected.itertuples(index=False):
+        print("Rejected entry of {user}: {error}".format(user=user, error=error))
+    if contest_path is not None:
+        contest.save(contest_path)
+    return contest
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--num_players", type=int, default=20,
@@ -199,12 +563,27 @@ if __name__ == "__main__":
                         help="Output as markdown")
     parser.add_argument("--csv", action="store_true",
                         help="Load data from offline csvs")
+    parser.add_argument("--entries",
+                        help="Raw contest entries (text or saved html) to ingest")
+    parser.add_argument("--contest",
+                        help="Compact contest file; written when ingesting --entries, "
+                        "else read")
+    profiling.add_profile_argument(parser)
     args = parser.parse_args()
+    profiling.start_profiling(args.profile)
+
+    contest = None
+    if args.entries:
+        mens, womens = _contest_rosters(from_csv=args.csv)
+        contest = ingest_contest(args.entries, {"Men": mens, "Women": womens},
+                                 contest_path=args.contest)
+    elif args.contest:
+        contest = Contest.load(args.contest)
 
     with pd.option_context("display.width", 1000,
                            "display.max_rows", 100,
                            "display.max_columns", 100,
                            "display.max_colwidth", 100):
-        compute_fantasy_contest_results(num_players=args.num_players,
+        compute_fantasy_contest_results(min_players=args.num_players,
                                         use_markdown=args.markdown,
-                                        from_csv=args.csv)
+                                        from_csv=args.csv, contest=contest)
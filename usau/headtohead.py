@@ -0,0 +1,270 @@
+"""
+Head-to-head index of games between pairs of teams, across events.
+
+Games are grouped contiguously by unordered team pair, so all games between
+two teams are a slice found by a single dict lookup. Score progressions of
+all games are stored in one contiguous array, with per-game offsets, and
+each game's halftime score is precomputed; so head-to-head summaries cost
+O(number of games between the pair) rather than a scan of the archive.
+
+Example:
+
+    index = HeadToHeadIndex.from_archive(usau.archive.load_archive())
+    index.games("Revolver", "Ring of Fire")
+    index.summary("Revolver", "Ring of Fire")
+    index.progression(index.game_ids("Revolver", "Ring of Fire")[0])
+
+With a "division" column (as in archives), teams are keyed by (division,
+team), so namesakes such as a school's men's and women's teams are kept
+apart; pass division= when a name is in more than one division.
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from usau import schema
+from usau.urls import game_ids
+
+
+def _event_game_keys(df):
+    """Key per row unique to (event, canonical game id)"""
+    events = (df["event"].astype(str).values if "event" in df.columns
+              else np.repeat("", len(df)))
+    return pd.Series(events, dtype=object) + "|" + pd.Series(
+        game_ids(df["url"]), dtype=object)
+
+
+class HeadToHeadIndex(object):
+    """Games and score progressions, indexed by unordered team pair
+
+    Game arrays are ordered so that the games of each pair are contiguous,
+    and each game is stored from the perspective of the team listed first
+    in its match results (the home team, for scraped events).
+
+    Args:
+        match_results (pd.DataFrame): As in USAUResults.match_results, two
+            rows per game, with "event" and "division" columns if spanning
+            events
+        scores (pd.DataFrame): As in USAUResults.score_progressions; games
+            without a progression (e.g. legacy csvs) have empty slices
+        half_at (int): Points that end the first half, i.e. 8 in games to 15
+    """
+
+    def __init__(self, match_results, scores=None, half_at=8):
+        self.half_at = half_at
+        keys = _event_game_keys(match_results)
+        # Unreported games have no score to store
+        first = (~keys.duplicated().values & match_results["Score"].notnull().values &
+                 match_results["Opp Score"].notnull().values)
+        games = match_results[first]
+        keys = keys[first].values
+
+        home, away = games["Team"].astype(str).values, games["Opponent"].astype(str).values
+        if "division" in games.columns:
+            divisions = np.tile(games["division"].astype(str).values, 2)
+            codes, self.teams = pd.factorize(pd.MultiIndex.from_arrays(
+                [divisions, np.concatenate([home, away])]))
+        else:
+            codes, self.teams = pd.factorize(np.concatenate([home, away]))
+        # Team names, or (division, team) tuples if the division is known
+        self.teams = list(self.teams)
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        home_ids, away_ids = codes[:len(games)], codes[len(games):]
+        pair = (np.minimum(home_ids, away_ids).astype(np.int64) * len(self.teams) +
+                np.maximum(home_ids, away_ids))
+
+        # Group games by pair, keeping archive order within a pair
+        order = np.argsort(pair, kind="mergesort")
+        pair = pair[order]
+        starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+        ends = np.r_[starts[1:], len(pair)]
+        self._pairs = {(int(p) // len(self.teams), int(p) % len(self.teams)): (s, e)
+                       for p, s, e in zip(pair[starts], starts, ends)}
+
+        self.home = home_ids[order]
+        self.away = away_ids[order]
+        self.home_score = games["Score"].values[order].astype(np.int16)
+        self.away_score = games["Opp Score"].values[order].astype(np.int16)
+        self.event = (games["event"].astype(str).values[order]
+                      if "event" in games.columns else np.repeat("", len(games)))
+        self.url = games["url"].astype(str).values[order]
+        self._build_progressions(keys[order], home[order], scores)
+
+    def _build_progressions(self, keys, home_teams, scores):
+        n = len(keys)
+        self.half_home = np.full(n, np.nan)
+        self.half_away = np.full(n, np.nan)
+        if scores is None or not len(scores):
+            self.offsets = np.zeros(n + 1, dtype=np.int64)
+            self.progressions = np.zeros((0, 2), dtype=np.int16)
+            return
+        game = pd.Index(keys).get_indexer(_event_game_keys(scores).values)
+        valid = ((game >= 0) & scores["home_score"].notnull().values &
+                 scores["away_score"].notnull().values)
+        game = game[valid]
+        order = np.argsort(game, kind="mergesort")  # Points stay in order
+        game = game[order]
+        progressions = np.column_stack([
+            scores["home_score"].values[valid][order],
+            scores["away_score"].values[valid][order]]).astype(np.int16)
+        # Orient each progression like its game, swapping if needed
+        swap = (scores["home_team"].astype(str).values[valid][order] !=
+                home_teams[game])
+        progressions[swap] = progressions[swap][:, ::-1]
+        self.progressions = progressions
+        self.offsets = np.r_[0, np.cumsum(np.bincount(game, minlength=n))]
+
+        # Score at the first point where either team reaches half_at
+        reached = progressions.max(axis=1) >= self.half_at
+        position = np.where(reached, np.arange(len(progressions)), len(progressions))
+        lengths = np.diff(self.offsets)
+        has_points = lengths > 0
+        first = np.full(n, len(progressions))
+        first[has_points] = np.minimum.reduceat(position, self.offsets[:-1][has_points])
+        halved = has_points & (first < self.offsets[1:])
+        self.half_home[halved] = progressions[first[halved], 0]
+        self.half_away[halved] = progressions[first[halved], 1]
+
+    @classmethod
+    def from_archive(cls, archive, **kwargs):
+        """Constructor from a :class:`usau.archive.Archive`"""
+        return cls(archive.match_results, archive.tables.get("scores"), **kwargs)
+
+    @classmethod
+    def from_results(cls, results_iter, **kwargs):
+        """Constructor from an iterable of loaded USAUResults"""
+        match_results, scores = [], []
+        for results in results_iter:
+            division = "{level}_{gender}".format(level=results.event_info["level"],
+                                                 gender=results.gender)
+            match_results.append(results.match_results.assign(
+                event=results._name(), division=division))
+            if results.score_progressions is not None:
+                scores.append(results.score_progressions.assign(event=results._name()))
+        return cls(schema.concat_tables(match_results, "match_results",
+                                        ignore_index=True, sort=False),
+                   schema.concat_tables(scores, "scores", ignore_index=True,
+                                        sort=False) if scores else None,
+                   **kwargs)
+
+    def __len__(self):
+        return len(self.home)
+
+    def __repr__(self):
+        return ("HeadToHeadIndex<{n} games, {p} team pairs>"
+                .format(n=len(self), p=len(self._pairs)))
+
+    def _name(self, code):
+        team = self.teams[code]
+        return team[1] if isinstance(team, tuple) else team
+
+    def team_code(self, team, division=None):
+        """Code of a team in :attr:`teams`, or None if it has no games
+
+        Args:
+            division (str): e.g. "club_men"; only needed if the team's
+                name is in more than one division
+        """
+        if division is not None:
+            return self.team_index.get((division, team))
+        if team in self.team_index:
+            return self.team_index[team]
+        matches = [code for code, key in enumerate(self.teams)
+                   if isinstance(key, tuple) and key[1] == team]
+        if len(matches) > 1:
+            raise ValueError("Team {team} is ambiguous across divisions; "
+                             "pass division=".format(team=team))
+        return matches[0] if matches else None
+
+    def _slice(self, team_a, team_b, division=None):
+        a, b = self.team_code(team_a, division), self.team_code(team_b, division)
+        if a is None or b is None:
+            return 0, 0
+        return self._pairs.get((min(a, b), max(a, b)), (0, 0))
+
+    def game_ids(self, team_a, team_b, division=None):
+        """Positions of the games between two teams, in archive order"""
+        return np.arange(*self._slice(team_a, team_b, division))
+
+    def games(self, team_a, team_b, division=None):
+        """Returns pd.DataFrame of the games between two teams, from team_a's
+        perspective
+
+        Args:
+            division (str): Division of both teams, e.g. "d1college_women";
+                only needed if a name is in more than one division
+        """
+        start, end = self._slice(team_a, team_b, division)
+        # Whether team_a is the away team of each game
+        flip = self.away[start:end] == self.team_code(team_a, division)
+        score = np.where(flip, self.away_score[start:end], self.home_score[start:end])
+        opp_score = np.where(flip, self.home_score[start:end], self.away_score[start:end])
+        half = np.where(flip, self.half_away[start:end], self.half_home[start:end])
+        opp_half = np.where(flip, self.half_home[start:end], self.half_away[start:end])
+        return pd.DataFrame(OrderedDict([
+            ("Game", np.arange(start, end)),
+            ("event", self.event[start:end]),
+            ("url", self.url[start:end]),
+            ("Team", team_a),
+            ("Opponent", team_b),
+            ("Score", score),
+            ("Opp Score", opp_score),
+            ("Margin", score.astype(int) - opp_score),
+            ("Half Margin", half - opp_half),
+        ]))
+
+    def progression(self, game, team=None):
+        """Point-by-point score of a game, as an (n points x 2) array
+
+        Args:
+            game (int): Position, as from :func:`game_ids`
+            team (str): Column 0 is this team's score; by default, the first
+                team in the game's match results
+        """
+        points = self.progressions[self.offsets[game]:self.offsets[game + 1]]
+        if team is not None and self._name(self.away[game]) == team:
+            points = points[:, ::-1]
+        return points
+
+    def summary(self, team_a, team_b, division=None):
+        """Head-to-head record, point totals and margins by half
+
+        Args:
+            division (str): As in :func:`games`
+
+        Returns:
+            OrderedDict
+        """
+        games = self.games(team_a, team_b, division)
+        margin = games["Margin"].values
+        half = games["Half Margin"].values
+        with np.errstate(invalid="ignore"):
+            return OrderedDict([
+                ("Team", team_a),
+                ("Opponent", team_b),
+                ("Games", len(games)),
+                ("Wins", int((margin > 0).sum())),
+                ("Losses", int((margin < 0).sum())),
+                ("Points Scored", int(games["Score"].sum())),
+                ("Points Lost", int(games["Opp Score"].sum())),
+                ("Margin", int(margin.sum())),
+                ("Average Margin", margin.mean() if len(margin) else np.nan),
+                ("Average First Half Margin",
+                 np.nanmean(half) if np.isfinite(half).any() else np.nan),
+                ("Average Second Half Margin",
+                 np.nanmean(margin - half) if np.isfinite(half).any() else np.nan),
+            ])
+
+    def pairs(self, team, division=None):
+        """Opponents of a team, with the number of games against each
+
+        Args:
+            division (str): As in :func:`games`
+        """
+        i = self.team_code(team, division)
+        return OrderedDict((self._name(b if a == i else a), end - start)
+                           for (a, b), (start, end) in self._pairs.items()
+                           if i in (a, b))
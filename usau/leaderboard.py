@@ -0,0 +1,175 @@
+"""
+Player +/- leaderboards over any number of events.
+
+All events' rosters are stacked into one frame, so +/- and per-game
+normalization are computed in a single vectorized pass, and each event's
+top players are found by partial selection rather than a full sort.
+
+Example:
+
+    events = [usau.reports.USAUResults.from_event("club", 2018, gender, event)
+                  .load_from_csvs()
+              for event in ("us open", "pro elite", "nationals")
+              for gender in ("men", "mixed", "women")]
+    for name, table in Leaderboard(events).tables(num_players=10).items():
+        print(name)
+        print(table)
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from usau.reports import USAUResults
+
+_STAT_COLUMNS = ("Goals", "Assists", "Ds", "Turns")
+
+
+def compute_plus_minus(df, g_weight=1, a_weight=1, d_weight=1, turn_weight=-0.5):
+    """Weighted sum of a player's goals, assists, Ds and turns"""
+    return (g_weight * df["Goals"].fillna(0) +
+            a_weight * df["Assists"].fillna(0) +
+            d_weight * df["Ds"].fillna(0) +
+            turn_weight * df["Turns"].fillna(0))
+
+
+def team_games_played(match_results):
+    """Per-team games and points played, for per-game normalization
+
+    Only games with recorded goals are counted, since players can't
+    accumulate statistics in games where none were tracked.
+    """
+    matches = match_results.drop_duplicates(subset=["Team", "url"])
+    matches = matches[matches["Gs"] > 0]
+    return pd.DataFrame(OrderedDict([
+        ("Team", matches["Team"].values),
+        ("Team Games Played", np.ones(len(matches), dtype=np.int64)),
+        ("Team Points Played", (matches["Score"] + matches["Opp Score"]).values),
+        ("Team Score", matches["Score"].values),
+        ("Team Opp Score", matches["Opp Score"].values),
+    ])).groupby("Team", observed=True).sum()
+
+
+USAUResults.register_view(
+    "team_games_played", lambda results: team_games_played(results.match_results),
+    tables=("match_results",))
+
+
+def top_k_indices(values, offsets, k):
+    """Indices of the k largest values within each [start, end) slice
+
+    Args:
+        values (np.ndarray): Values to select on; NaNs rank last
+        offsets (list[int]): Slice boundaries, of length number of slices + 1
+        k (int): Number of values to select per slice
+
+    Returns:
+        list[np.ndarray]: per slice, indices into values ordered by descending
+            value, ties broken by position
+    """
+    values = np.where(np.isnan(values), -np.inf, values)
+    selected = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        chunk = values[start:end]
+        if len(chunk) > k:
+            candidates = np.argpartition(-chunk, k - 1)[:k]
+        else:
+            candidates = np.arange(len(chunk))
+        order = np.lexsort((candidates, -chunk[candidates]))
+        selected.append(start + candidates[order])
+    return selected
+
+
+class Leaderboard(object):
+    """Player +/- leaderboards for a batch of events
+
+    Args:
+        events (list[usau.reports.USAUResults]): Events with rosters and
+            match results available, e.g. via :func:`load_from_csvs`
+        goal_weight, assist_weight, d_weight, turn_weight (float):
+            Weights for :func:`compute_plus_minus`
+    """
+
+    def __init__(self, events, goal_weight=1, assist_weight=1, d_weight=1,
+                 turn_weight=-0.5):
+        self.events = list(events)
+        self.weights = dict(g_weight=goal_weight, a_weight=assist_weight,
+                            d_weight=d_weight, turn_weight=turn_weight)
+        self._frame = None
+        self._offsets = None
+
+    def team_games(self, results):
+        """Cached :func:`team_games_played` for an event"""
+        return results.view("team_games_played")
+
+    @property
+    def frame(self):
+        """Returns pd.DataFrame of all events' rosters with +/- columns
+
+        Rows are grouped contiguously by event, in the order events were given.
+        """
+        if self._frame is not None:
+            return self._frame
+        rosters = []
+        for results in self.events:
+            roster = results.rosters
+            if "Points" in roster.columns:
+                roster = roster.rename(columns={"Points": "Goals"})
+            elif "Goals" not in roster.columns:
+                raise ValueError("No goals column found for {event}: {columns}"
+                                 .format(event=results, columns=roster.columns))
+            roster = roster.join(self.team_games(results), on="Team")
+            roster["Event"] = results._name()
+            rosters.append(roster)
+        frame = pd.concat(rosters, ignore_index=True, sort=False)
+
+        for col in _STAT_COLUMNS:
+            frame[col] = frame[col].fillna(0).astype(int)
+        frame["+/-"] = compute_plus_minus(frame, **self.weights)
+        frame["+/- per Game"] = frame["+/-"] / frame["Team Games Played"]
+        frame["#Games"] = frame["Team Games Played"]
+
+        self._offsets = np.concatenate([[0], np.cumsum([len(r) for r in rosters])])
+        self._frame = frame
+        return frame
+
+    def top(self, num_players=25, sort_per_game=False, keep_teams=None,
+            skip_teams=None):
+        """Returns pd.DataFrame of the top players of each event
+
+        Args:
+            num_players (int): Number of players per event
+            sort_per_game (bool): Rank by per-game +/- instead of total
+            keep_teams (list[str]): Only consider players of these teams
+            skip_teams (list[str]): Ignore players of these teams
+        """
+        frame = self.frame
+        values = frame["+/- per Game" if sort_per_game else "+/-"].values.astype(float)
+        if keep_teams:
+            values = np.where(frame["Team"].isin(keep_teams).values, values, np.nan)
+        if skip_teams:
+            values = np.where(frame["Team"].isin(skip_teams).values, np.nan, values)
+        selected = top_k_indices(values, self._offsets, num_players)
+        # Drop filtered-out players that only filled out an event's quota
+        selected = [idx[~np.isnan(values[idx])] for idx in selected]
+        return frame.iloc[np.concatenate(selected)].reset_index(drop=True)
+
+    def tables(self, num_players=25, **kwargs):
+        """Per-event leaderboards in the display format of top_n_player_stats
+
+        Returns:
+            OrderedDict: event name to pd.DataFrame
+        """
+        top = self.top(num_players=num_players, **kwargs)
+        tables = OrderedDict()
+        for results in self.events:
+            res = top.loc[top["Event"] == results._name()]
+            tables[results._name()] = (
+                res[["Name", "Team", "Goals", "Assists", "Ds", "Turns",
+                     "+/-", "+/- per Game", "#Games"]]
+                .rename(columns={"Goals": "Gs", "Assists": "As", "Turns": "Ts",
+                                 "+/- per Game": "+/-pg"})
+                .reset_index(drop=True))
+        return tables
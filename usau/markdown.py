@@ -8,6 +8,9 @@ documentation for details:
   http://www.stack.nl/~dimitri/doxygen/manual/markdown.html#md_tables.
 """
 
+import io
+
+import numpy as np
 import pandas as pd
 
 # Translation dictionaries for table alignment
@@ -94,18 +97,137 @@ def to_markdown(records, fields, headings, alignment=None, float_format=None):
                     for a, w in zip(cell_align, column_widths)])
     ruling = '| ' + _ + ' |'
 
-    ret = u""
-    ret += (heading_template.format(*headings).rstrip() + '\n')
-    ret += (ruling.rstrip() + '\n')
+    lines = [heading_template.format(*headings).rstrip(), ruling.rstrip()]
     for row in zip(*columns):
-        ret += (row_template.format(*row).rstrip() + '\n')
-    return ret
+        lines.append(row_template.format(*row).rstrip())
+    return u"\n".join(lines) + u"\n"
+
 
+def _format_column(series, float_format=None):
+    """Format a column of a dataframe as an array of strings
+
+    Equivalent to :func:`evaluate_field` on each cell, but only dispatches
+    per cell for object columns which may hold floats.
+    """
+    if series.dtype.kind in 'iub' or (series.dtype.kind == 'f' and
+                                      float_format is None):
+        return series.to_numpy().astype(np.str_)
+    values = series.to_numpy(dtype=object)
+    if float_format is not None and series.dtype.kind in 'fO':
+        return np.array([float_format(v) if isinstance(v, float) else str(v)
+                         for v in values], dtype=np.str_)
+    return values.astype(np.str_)
+
+
+def _truncate(values, width):
+    """Cut strings longer than width, marking the cut with '..'"""
+    lengths = np.char.str_len(values)
+    if not (lengths > width).any():
+        return values
+    # Casting to a narrower fixed-width unicode dtype truncates
+    cut = np.char.add(values.astype('<U{n}'.format(n=max(width - 2, 1))), u'..')
+    return np.where(lengths > width, cut.astype('<U{n}'.format(n=width)), values)
+
+
+def _pad(values, align, width):
+    """Pad an array of strings to width, as format spec '{:<width}' would"""
+    values = np.asarray(values, dtype=np.str_)
+    if align == '<':
+        return np.char.ljust(values, width)
+    elif align == '>':
+        return np.char.rjust(values, width)
+    # str.center and format's '^' differ in where the odd space goes
+    return np.array(['{:^{w}}'.format(v, w=width) for v in values], dtype=np.str_)
+
+
+def write_markdown(frame, stream=None, alignment=None, float_format=None,
+                   max_width=None, chunk_size=10000):
+    """Render a dataframe as a markdown table, column-wise
+
+    Writes a heading row, a ruling row of dashes with colons marking each
+    column's alignment, then one row per record, cells separated by " | "
+    and padded to the column width. Each cell is formatted as by
+    :func:`evaluate_field`: with ``float_format`` for floats and ``str``
+    otherwise, so integers print as "1" even in all-numeric frames. Cells
+    are formatted and padded per column with vectorized string operations,
+    and rows are written to the stream in chunks rather than concatenated.
+
+    Args:
+        frame (pd.DataFrame): Table to render
+        stream (file-like): Destination with a write() method; if None,
+            the table is returned as a string.
+        alignment: As in :func:`to_markdown`
+        float_format: lambda which returns a formatted string for a float;
+            defaults to pandas' display.float_format option.
+        max_width (int | list[int]): Fixed-width mode. Each column is exactly
+            this wide and longer cells are truncated, so that no pass over
+            the data is needed to size the columns and rows stream out as
+            they are formatted.
+        chunk_size (int): Number of rows to format and write at a time
 
-def pandas_to_markdown(frame, alignment=None):
-    """Convert a pandas dataframe to markdown"""
-    return to_markdown(frame.values, list(range(len(frame.columns))), frame.columns,
-                       alignment=alignment)
+    Returns:
+        str | None: markdown table, if no stream was given
+    """
+    if stream is None:
+        buf = io.StringIO()
+        write_markdown(frame, stream=buf, alignment=alignment,
+                       float_format=float_format, max_width=max_width,
+                       chunk_size=chunk_size)
+        return buf.getvalue()
+
+    float_format = float_format or pd.get_option('display.float_format')
+    headings = [u"{}".format(h) for h in frame.columns]
+    num_columns = len(headings)
+
+    extended_align = list(alignment) if alignment is not None else []
+    extended_align = extended_align[:num_columns]
+    extended_align += [('^', '<')] * (num_columns - len(extended_align))
+    heading_align, cell_align = zip(*extended_align) if num_columns else ((), ())
+
+    columns = None
+    if max_width is None:
+        # Format everything up front, since widths depend on every cell
+        columns = [_format_column(frame.iloc[:, i], float_format)
+                   for i in range(num_columns)]
+        field_widths = [np.char.str_len(column).max() if len(column) else 0
+                        for column in columns]
+        heading_widths = [max(len(head), 2) for head in headings]
+        column_widths = [max(x) for x in zip(field_widths, heading_widths)]
+    else:
+        column_widths = (list(max_width) if hasattr(max_width, "__iter__")
+                         else [max_width] * num_columns)
+        column_widths = [max(w, 2) for w in column_widths]
+        headings = [_truncate(np.array([head], dtype=np.str_), w)[0]
+                    for head, w in zip(headings, column_widths)]
+
+    heading = ' | '.join(['{:' + a + str(w) + '}'
+                          for a, w in zip(heading_align, column_widths)])
+    ruling = ' | '.join([left_rule[a] + '-' * (w - 2) + right_rule[a]
+                         for a, w in zip(cell_align, column_widths)])
+    stream.write(('| ' + heading + ' |').format(*headings).rstrip() + u'\n')
+    stream.write(('| ' + ruling + ' |').rstrip() + u'\n')
+
+    for start in range(0, len(frame), chunk_size):
+        stop = min(start + chunk_size, len(frame))
+        if columns is not None:
+            cells = [column[start:stop] for column in columns]
+        else:
+            cells = [_truncate(_format_column(frame.iloc[start:stop, i],
+                                              float_format), w)
+                     for i, w in enumerate(column_widths)]
+        padded = [_pad(column, a, w).tolist()
+                  for column, a, w in zip(cells, cell_align, column_widths)]
+        stream.write(u''.join([(u'| ' + u' | '.join(row) + u' |').rstrip() + u'\n'
+                               for row in zip(*padded)]))
+
+
+def pandas_to_markdown(frame, alignment=None, stream=None, max_width=None):
+    """Convert a pandas dataframe to markdown
+
+    See :func:`write_markdown` for streaming to a file and fixed-width output.
+    """
+    return write_markdown(frame, stream=stream, alignment=alignment,
+                          max_width=max_width)
 
 
 def display(frame, use_markdown=True):
@@ -0,0 +1,465 @@
+"""
+Pick'em contests on how far teams finish in an event's bracket.
+
+Match results have no round labels, and stored events have no game order,
+so each division's bracket is rebuilt from the graph of its games, with the
+format :class:`usau.simulate.TournamentSimulator` assumes: round robin pools,
+whose top ``advance`` teams enter a single elimination bracket, the top pool
+finishers getting any byes. Pools are the round robin cliques of the games
+(see :func:`infer_pools`). Every entrant but the champion loses exactly one
+bracket game, so a team's round is its entry round plus its bracket wins;
+which wins were bracket rather than placement games is resolved from the
+teams yet to lose back through the teams they beat. Pool mates that met
+again have their pool game told apart by the event page's pool tables where
+known, and otherwise by which meeting fits a bracket. Teams whose next
+bracket game is not yet played stay alive, which is what lets standings
+update as bracket games finish. Pass ``pools`` where the games leave them
+ambiguous.
+
+Contestants pick a finishing round per team, scored by a lookup table of
+(pick, actual finish). By default a pick scores its round's
+:data:`ROUND_POINTS` if the team reaches at least that round, as in the
+2018 #thegame notebook. All entries are scored at once with array indexing.
+
+Example:
+
+    brackets = {results.gender: Bracket.from_results(results)
+                for results in (usau.reports.club_nats_men_2018,
+                                usau.reports.club_nats_women_2018)}
+    contest = PickemContest.from_frame(picks)  # User, Division, Team, Pick
+    contest.standings(brackets).head()
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import itertools
+import logging
+
+import numpy as np
+import pandas as pd
+
+from usau.simulate import played_games, pool_game_mask, rank_pool, snake_pools
+
+_logger = logging.getLogger(__name__)
+
+# Finishing rounds, worst to best; codes are indices
+ROUNDS = ("No Bracket", "Prequarters", "Quarters", "Semis", "Finalist", "Champion")
+ROUND_POINTS = (0, 1, 2, 5, 9, 13)
+# Round name by number of teams in the bracket round
+_BRACKET_ROUNDS = OrderedDict([(2, "Finalist"), (4, "Semis"), (8, "Quarters"),
+                               (16, "Prequarters")])
+# Most ways to split pools, or to pick pool games of rematches, to consider
+_MAX_CANDIDATES = 1024
+
+
+def _games(match_results):
+    """Unique played games as (team, opponent, score, opp score, url) columns"""
+    games = match_results.drop_duplicates(subset=["url"])
+    games = games.dropna(subset=["Score", "Opp Score"])
+    # 0-0 and other tied results are unreported games
+    games = games[games["Score"].values != games["Opp Score"].values]
+    return (games["Team"].astype(str).values, games["Opponent"].astype(str).values,
+            games["Score"].values.astype(float), games["Opp Score"].values.astype(float),
+            games["url"].values)
+
+
+def _partitions(teams, met, size):
+    """Splits of teams into round robin cliques of a size"""
+    if not teams:
+        yield []
+        return
+    first = teams[0]
+    opponents = [t for t in teams[1:] if frozenset((first, t)) in met]
+    for combo in itertools.combinations(opponents, size - 1):
+        if all(frozenset(pair) in met for pair in itertools.combinations(combo, 2)):
+            pool = (first,) + combo
+            for rest in _partitions([t for t in teams if t not in pool], met, size):
+                yield [list(pool)] + rest
+
+
+def infer_pools(match_results, teams, num_pools=4, pool_urls=None):
+    """Pools as the round robin cliques of the games played
+
+    Every meeting counts, including unreported games. Where bracket and
+    placement games close other cliques, so that the games fit more than one
+    split into pools, the split closest to snake seeding is taken.
+
+    Args:
+        teams (list[str]): In seed order
+        num_pools (int): Number of (equal sized) pools
+        pool_urls (set): Urls of the pool games, if known; only these count
+
+    Returns:
+        list[list[str]]: Team names by pool, each in seed order; snake seeded
+            by :func:`usau.simulate.snake_pools` if games are missing
+    """
+    if len(teams) % num_pools:
+        _logger.warning("{n} teams do not split into {p} equal pools, snake seeding"
+                        .format(n=len(teams), p=num_pools))
+        return snake_pools(teams, num_pools)
+    games = (match_results if pool_urls is None
+             else match_results[match_results["url"].isin(pool_urls).values])
+    met = set(frozenset(pair) for pair in zip(games["Team"].astype(str),
+                                              games["Opponent"].astype(str)))
+    splits = list(itertools.islice(_partitions(list(teams), met, len(teams) // num_pools),
+                                   _MAX_CANDIDATES))
+    if not splits:
+        _logger.warning("Unable to infer pools from games played, "
+                        "snake seeding {n} pools".format(n=num_pools))
+        return snake_pools(teams, num_pools)
+    if len(splits) > 1:
+        _logger.warning("Games played fit {n} splits into pools; taking the closest "
+                        "to snake seeding".format(n=len(splits)))
+        snake = [set(pool) for pool in snake_pools(teams, num_pools)]
+        # Pairs of teams pooled together in both
+        splits.sort(key=lambda pools: -sum(len(s & set(pool)) * (len(s & set(pool)) - 1)
+                                           for pool in pools for s in snake))
+    return splits[0]
+
+
+def _pool_game_choices(urls, a, b, pool, pool_urls=None):
+    """Candidate masks of the pool games
+
+    With ``pool_urls`` there is just one. Otherwise the pool game of pool mates
+    that met more than once may be any of their meetings, so there is a mask
+    per combination, starting with that of :func:`usau.simulate.pool_game_mask`.
+    """
+    if pool_urls is not None:
+        yield pool_game_mask(urls, a, b, pool, pool_urls)
+        return
+    mates = (pool[a] == pool[b]) & (pool[a] >= 0)
+    pairs = np.minimum(a, b) * len(pool) + np.maximum(a, b)
+    meetings = [np.flatnonzero(mates & (pairs == pair)) for pair in np.unique(pairs[mates])]
+    for games in itertools.islice(itertools.product(*meetings), _MAX_CANDIDATES):
+        mask = np.zeros(len(a), dtype=bool)
+        mask[list(games)] = True
+        yield mask
+
+
+def _elimination_rounds(winner, loser, entry, num_rounds):
+    """Rounds of a single elimination bracket, from its games in any order
+
+    Every entrant but the champion loses exactly one bracket game. The games
+    a team won before it are its bracket wins, one per round from its entry
+    round, and any after are placement games. Teams yet to lose have only
+    bracket wins, so the rounds they have reached are known. The teams they
+    beat are assigned to those rounds counting back from the latest, those
+    with more wins first, and resolved the same way; a choice that leaves a
+    team unable to have reached its round is backtracked.
+
+    Args:
+        winner, loser (np.ndarray): Team indices of the non-pool games
+            between bracket entrants
+        entry (np.ndarray): Per team, its first bracket round (1 with a bye),
+            or -1 if not in the bracket
+        num_rounds (int): Rounds before the champion is decided
+
+    Returns:
+        (np.ndarray, np.ndarray): Per team, the round it was knocked out in or
+            has reached (num_rounds for the champion), -1 if not in the
+            bracket; and per team and round, the index of the game it won in
+            that round, or -1. None if the games fit no bracket.
+    """
+    n = len(entry)
+    wins = [[] for _ in range(n)]
+    for game, team in enumerate(winner):
+        wins[team].append(game)
+    lost = np.zeros(n, dtype=bool)
+    lost[loser] = True
+    entrants = np.flatnonzero(entry >= 0)
+    reached = np.full(n, -1, dtype=np.int64)
+    won = np.full((n, num_rounds), -1, dtype=np.int64)
+    todo = [(team, entry[team] + len(wins[team])) for team in entrants if not lost[team]]
+    if any(top > num_rounds for _, top in todo):
+        return None
+    for team, top in todo:
+        reached[team] = top
+
+    def solve(todo):
+        if not todo:
+            return bool((reached[entrants] >= 0).all())
+        (team, top), rest = todo[0], todo[1:]
+        rounds = list(range(top - 1, entry[team] - 1, -1))
+        options = sorted((game for game in wins[team] if reached[loser[game]] < 0),
+                         key=lambda game: (-len(wins[loser[game]]), loser[game]))
+        for games in itertools.permutations(options, len(rounds)):
+            victims = loser[list(games)]
+            if len(set(victims)) < len(victims) or any(
+                    not entry[v] <= r <= entry[v] + len(wins[v])
+                    for v, r in zip(victims, rounds)):
+                continue
+            reached[victims] = rounds
+            won[team, rounds] = games
+            if solve(rest + list(zip(victims, rounds))):
+                return True
+            reached[victims] = -1
+            won[team, rounds] = -1
+        return False
+
+    return (reached, won) if solve(todo) else None
+
+
+class Bracket(object):
+    """Each team's finishing round of a division, so far
+
+    Args:
+        match_results (pd.DataFrame): As in USAUResults.match_results, in
+            any order
+        teams (list[str]): Team names in seed order
+        pools (list[list[str]]): By default, see :func:`infer_pools`
+        advance (int): Number of teams per pool that enter the bracket
+        pool_urls (set): Urls of the played pool games, e.g. from the event
+            page; by default pool mates' pool games are those that fit a
+            bracket
+
+    Attributes:
+        finish (np.ndarray): Per team, the code into :data:`ROUNDS` of the
+            round it was eliminated in, or has reached if still alive
+        alive (np.ndarray): Per team, whether it is still in the bracket
+        pool_urls, bracket_urls (set): Urls of the games taken as pool
+            games, and as bracket games; the others are placement games
+    """
+
+    def __init__(self, match_results, teams, pools=None, num_pools=4, advance=3,
+                 pool_urls=None):
+        self.teams = list(teams)
+        self.team_index = {t: i for i, t in enumerate(self.teams)}
+        self.pools = pools or infer_pools(match_results, self.teams, num_pools,
+                                          pool_urls=pool_urls)
+        self.advance = advance
+        n = len(self.teams)
+        self.pool = np.full(n, -1, dtype=np.int64)
+        self.pool_finish = np.full(n, -1, dtype=np.int64)
+        self.finish = np.zeros(n, dtype=np.int8)
+        self.alive = np.zeros(n, dtype=bool)
+        self.num_rounds = 0
+        while 2 ** self.num_rounds < advance * len(self.pools):
+            self.num_rounds += 1
+
+        team, opp, score, opp_score, urls = _games(match_results)
+        known = np.array([t in self.team_index and o in self.team_index
+                          for t, o in zip(team, opp)], dtype=bool)
+        if not known.all():
+            _logger.warning("Ignoring {n} games between unknown teams"
+                            .format(n=int((~known).sum())))
+        a = np.array([self.team_index[t] for t in team[known]], dtype=np.int64)
+        b = np.array([self.team_index[o] for o in opp[known]], dtype=np.int64)
+        margin = (score - opp_score)[known]
+        urls = urls[known]
+        for p, pool in enumerate(self.pools):
+            self.pool[[self.team_index[t] for t in pool]] = p
+
+        first = None
+        for is_pool in _pool_game_choices(urls, a, b, self.pool, pool_urls):
+            first = is_pool if first is None else first
+            if self._fit(a, b, margin, urls, is_pool):
+                break
+        else:
+            _logger.warning("Bracket games do not fit a single elimination bracket; "
+                            "finishes are approximate")
+            self._fit(a, b, margin, urls, first, strict=False)
+
+    def _rank_pools(self, a, b, margin):
+        """Pool finishes; see :func:`usau.simulate.rank_pool`"""
+        for p in range(len(self.pools)):
+            ids = np.flatnonzero(self.pool == p)
+            self.pool_finish[rank_pool(ids, a, b, margin)] = np.arange(len(ids))
+
+    def _fit(self, a, b, margin, urls, is_pool, strict=True):
+        """Rank pools and play out the bracket, given which games are pool
+        games; False if the other games fit no bracket, unless not strict"""
+        self._rank_pools(a[is_pool], b[is_pool], margin[is_pool])
+        # Bracket seeds by pool finish, then pool order; the top seeds get byes
+        entrants = np.flatnonzero((self.pool_finish >= 0) & (self.pool_finish < self.advance))
+        entrants = entrants[np.lexsort((self.pool[entrants], self.pool_finish[entrants]))]
+        entry = np.full(len(self.teams), -1, dtype=np.int64)
+        entry[entrants] = 0
+        entry[entrants[:2 ** self.num_rounds - len(entrants)]] = 1
+
+        games = np.flatnonzero(~is_pool & (entry[a] >= 0) & (entry[b] >= 0))
+        winner = np.where(margin[games] > 0, a[games], b[games])
+        loser = np.where(margin[games] > 0, b[games], a[games])
+        rounds = _elimination_rounds(winner, loser, entry, self.num_rounds)
+        if rounds is None:
+            if strict:
+                return False
+            # Count every win between entrants as a bracket win
+            wins = np.bincount(winner, minlength=len(self.teams))
+            lost = np.bincount(loser, minlength=len(self.teams)) > 0
+            reached = np.where(entry >= 0, np.minimum(entry + wins, self.num_rounds - lost), -1)
+            won = np.full((len(self.teams), self.num_rounds), -1, dtype=np.int64)
+            bracket_games = np.arange(len(games))
+        else:
+            reached, won = rounds
+            bracket_games = won[won >= 0]
+
+        codes = np.array([ROUNDS.index(name) for size, name in _BRACKET_ROUNDS.items()
+                          if size <= 2 ** self.num_rounds][::-1] + [ROUNDS.index("Champion")])
+        self.finish[:] = np.where(reached >= 0, codes[reached], 0)
+        self.alive[:] = reached >= 0
+        self.alive[loser[bracket_games]] = False
+        self.alive[reached == self.num_rounds] = False
+        self._reached = reached
+        # Per team and round, the team it beat
+        self._beaten = np.full_like(won, -1)
+        self._beaten[won >= 0] = loser[won[won >= 0]]
+        self.pool_urls = set(urls[is_pool])
+        self.bracket_urls = set(urls[games[bracket_games]])
+        return True
+
+    @classmethod
+    def from_results(cls, results, **kwargs):
+        """Constructor from a (possibly partially played) USAUResults event"""
+        seeds = results.rosters[["Team", "Seed"]].drop_duplicates(subset=["Team"])
+        teams = list(seeds.sort_values("Seed")["Team"].astype(str))
+        played, pool_urls = played_games(results)
+        return cls(played, teams, pool_urls=pool_urls, **kwargs)
+
+    @property
+    def complete(self):
+        return not self.alive.any()
+
+    def layout(self):
+        """The bracket as played, e.g. for :class:`usau.simulate.TournamentSimulator`
+
+        Returns:
+            list: Per bracket position, the (pool, pool finish) of its team,
+                both 0-based, or None for a bye; None unless the bracket
+                has been played out but for (at most) its final
+        """
+        # Teams yet to lose, and the round they have all reached
+        roots = np.flatnonzero(self.alive | (self._reached == self.num_rounds))
+        roots = roots[np.lexsort((self.pool[roots], self.pool_finish[roots]))]
+        if len(roots) not in (1, 2) or len(set(self._reached[roots])) != 1:
+            return None
+        top = self._reached[roots[0]]
+        if len(roots) * 2 ** top != 2 ** self.num_rounds:
+            return None
+
+        def positions(team, r):
+            """Teams by position in the part of the bracket won by team in round r"""
+            if r == 0:
+                return [team]
+            beaten = self._beaten[team, r - 1]
+            return positions(team, r - 1) + (positions(beaten, r - 1) if beaten >= 0
+                                             else [-1] * 2 ** (r - 1))
+
+        return [(int(self.pool[team]), int(self.pool_finish[team])) if team >= 0 else None
+                for root in roots for team in positions(root, top)]
+
+    def frame(self):
+        """pd.DataFrame of each team's pool, pool finish and finishing round"""
+        return pd.DataFrame(OrderedDict([
+            ("Team", self.teams),
+            ("Pool", self.pool),
+            ("Pool Finish", self.pool_finish + 1),
+            ("Finish", np.array(ROUNDS)[self.finish]),
+            ("Alive", self.alive),
+        ]))
+
+
+def reach_table(points=ROUND_POINTS):
+    """Points by (pick, finish): a pick's points if the team reaches it
+
+    The extra last row is of missing picks (code -1), which score nothing.
+    """
+    points = np.asarray(points, dtype=float)
+    table = np.where(np.arange(len(points))[None, :] >= np.arange(len(points))[:, None],
+                     points[:, None], 0.)
+    return np.vstack([table, np.zeros(len(points))])
+
+
+class PickemContest(object):
+    """Many contestants' finishing round picks, across divisions
+
+    Attributes:
+        users (np.ndarray): Contestants
+        teams (pd.MultiIndex): (division, team) of each pick column,
+            grouped by division
+        picks (np.ndarray): int8 (users, teams) codes into :data:`ROUNDS`;
+            -1 where a contestant made no pick
+    """
+
+    def __init__(self, users, teams, picks):
+        self.users = np.asarray(users)
+        self.teams = teams
+        self.picks = picks
+
+    def __repr__(self):
+        return ("PickemContest<{u} entries x {t} teams>"
+                .format(u=len(self.users), t=len(self.teams)))
+
+    def __len__(self):
+        return len(self.users)
+
+    @classmethod
+    def from_frame(cls, df, user="User", division="Division", team="Team", pick="Pick"):
+        """Constructor from one row per pick, the pick a round name or code"""
+        user_codes, users = pd.factorize(df[user])
+        keys = pd.MultiIndex.from_arrays([df[division].astype(str).values,
+                                          df[team].astype(str).values])
+        team_codes, teams = pd.factorize(keys, sort=True)
+        values = df[pick]
+        if not pd.api.types.is_numeric_dtype(values):
+            lookup = dict((name, code) for code, name in enumerate(ROUNDS))
+            unknown = ~values.isin(list(ROUNDS))
+            if unknown.any():
+                raise ValueError("Unknown rounds picked: {rounds}"
+                                 .format(rounds=sorted(set(values[unknown].astype(str)))))
+            values = values.map(lookup)
+        picks = np.full((len(users), len(teams)), -1, dtype=np.int8)
+        picks[user_codes, team_codes] = values.values.astype(np.int8)
+        return cls(np.asarray(users), pd.MultiIndex.from_tuples(list(teams),
+                                                                names=["Division", "Team"]),
+                   picks)
+
+    def outcomes(self, brackets):
+        """Per team column, its finish code and whether it is still alive
+
+        Args:
+            brackets (dict): Division to :class:`Bracket`; teams of unknown
+                divisions, or missing from their bracket, did not make it
+        """
+        finish = np.zeros(len(self.teams), dtype=np.int64)
+        alive = np.zeros(len(self.teams), dtype=bool)
+        divisions = self.teams.get_level_values(0)
+        names = self.teams.get_level_values(1)
+        for division, bracket in brackets.items():
+            mask = np.asarray(divisions == division)
+            positions = pd.Index(bracket.teams).get_indexer(names[mask])
+            if (positions < 0).any():
+                _logger.warning("Picked teams not in the {div} bracket: {teams}".format(
+                    div=division, teams=list(names[mask][positions < 0])))
+            found = np.flatnonzero(mask)[positions >= 0]
+            finish[found] = bracket.finish[positions[positions >= 0]]
+            alive[found] = bracket.alive[positions[positions >= 0]]
+        return finish, alive
+
+    def standings(self, brackets, table=None):
+        """Each contestant's points so far, per division and in total, and
+        the most they can still reach
+
+        Args:
+            brackets (dict): Division to :class:`Bracket`, as of now
+            table (np.ndarray): Points by (pick, finish), with a last row for
+                missing picks; by default :func:`reach_table`
+
+        Returns:
+            pd.DataFrame: Sorted by total points
+        """
+        table = reach_table() if table is None else np.asarray(table, dtype=float)
+        finish, alive = self.outcomes(brackets)
+        # Best points over the finishes an alive team can still reach
+        best = np.maximum.accumulate(table[:, ::-1], axis=1)[:, ::-1]
+        points = table[self.picks, finish[None, :]]
+        possible = np.where(alive[None, :], best[self.picks, finish[None, :]], points)
+
+        divisions, division_codes = np.unique(self.teams.get_level_values(0),
+                                              return_inverse=True)
+        one_hot = np.zeros((len(self.teams), len(divisions)))
+        one_hot[np.arange(len(self.teams)), division_codes] = 1
+        df = pd.DataFrame(points.dot(one_hot), columns=list(divisions))
+        df.insert(0, "User", self.users)
+        df["Total"] = points.sum(axis=1)
+        df["Max"] = possible.sum(axis=1)
+        return df.sort_values(["Total", "Max"], ascending=False).reset_index(drop=True)
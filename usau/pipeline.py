@@ -0,0 +1,142 @@
+"""
+Pipelined downloading of several divisions (e.g. every gender of an event).
+
+Each division is driven from its own coordinator thread, while all of their
+roster and match report scrapes are submitted to one shared executor, and
+downloaded through one shared fetcher. So while one division waits on its
+slowest match report, the others keep the executor busy, and writing one
+division's csvs overlaps with the others' downloads.
+
+Example:
+
+    divisions = [usau.reports.USAUResults.from_event("club", 2019, gender)
+                 for gender in ("men", "mixed", "women")]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        run_pipeline(divisions, lambda results: results.to_csvs(), executor)
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import logging
+import sys
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+_clock = getattr(time, "monotonic", time.time)
+
+
+class Progress(object):
+    """Thread-safe progress of every division, rendered as a single line
+
+    Divisions report through :func:`update`, as set up by
+    :func:`usau.reports.USAUResults.set_progress`.
+
+    Args:
+        stream (file): Where to render; None to only keep counts
+        interval (float): Minimum seconds between renders
+    """
+    STAGES = ("rosters", "matches")
+
+    def __init__(self, stream=sys.stderr, interval=0.5):
+        self.stream = stream
+        self.interval = interval
+        self.counts = OrderedDict()  # division -> stage -> (done, total)
+        self.status = OrderedDict()  # division -> "running", "done" or "failed"
+        self.start = _clock()
+        self._last_render = None
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        with self._lock:
+            self.counts[name] = OrderedDict((stage, (0, None)) for stage in self.STAGES)
+            self.status[name] = "running"
+
+    def update(self, name, stage, done, total):
+        with self._lock:
+            self.counts.setdefault(name, OrderedDict())[stage] = (done, total)
+        self.render()
+
+    def finish(self, name, ok=True):
+        with self._lock:
+            self.status[name] = "done" if ok else "failed"
+        self.render(force=True)
+
+    def line(self):
+        with self._lock:
+            parts = []
+            for name, stages in self.counts.items():
+                if self.status.get(name) != "running":
+                    parts.append("{name} {status}".format(name=name,
+                                                          status=self.status[name]))
+                    continue
+                parts.append(name + " " + " ".join(
+                    "{stage} {done}/{total}".format(stage=stage, done=done,
+                                                    total="?" if total is None else total)
+                    for stage, (done, total) in stages.items()))
+            finished = sum(status != "running" for status in self.status.values())
+            return "{parts} | {n}/{total} divisions, {s:.1f}s".format(
+                parts=" | ".join(parts), n=finished, total=len(self.status),
+                s=_clock() - self.start)
+
+    def render(self, force=False):
+        if self.stream is None:
+            return
+        now = _clock()
+        if (not force and self._last_render is not None and
+                now - self._last_render < self.interval):
+            return
+        self._last_render = now
+        self.stream.write("\r" + self.line())
+        self.stream.flush()
+
+    def close(self):
+        if self.stream is not None:
+            self.render(force=True)
+            self.stream.write("\n")
+
+
+def run_pipeline(divisions, task, executor, progress=None):
+    """Run a task on every division concurrently, sharing an executor
+
+    Args:
+        divisions (list[USAUResults]): Divisions to download
+        task (callable): Called with each division, e.g. writing its csvs;
+            runs in a coordinator thread of its own
+        executor (concurrent.futures.Executor): Executor shared by all the
+            divisions' scrapes; a thread (or adaptive) executor, so that
+            the fetcher set by :func:`usau.reports.set_fetcher` is shared too
+        progress (Progress): Progress display
+
+    Returns:
+        OrderedDict: division name to the exception it failed with, or None
+    """
+    errors = OrderedDict((results._name(), None) for results in divisions)
+
+    def run(results):
+        name = results._name()
+        try:
+            task(results)
+        except Exception as e:
+            _logger.exception("Failed to download {name}".format(name=name))
+            errors[name] = e
+        if progress is not None:
+            progress.finish(name, ok=errors[name] is None)
+
+    for results in divisions:
+        results.executor = executor
+        if progress is not None:
+            progress.add(results._name())
+            results.set_progress(progress.update)
+    threads = [threading.Thread(target=run, args=(results,),
+                                name="pipeline-" + results._name())
+               for results in divisions]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if progress is not None:
+        progress.close()
+    return errors
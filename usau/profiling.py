@@ -0,0 +1,269 @@
+"""
+CPU and memory profiling of the command line scripts.
+
+``--profile PATH`` on ``download_reports.py``, ``top_n_player_stats.py``
+and ``fantasy.py`` runs the script under :mod:`cProfile` and
+:mod:`tracemalloc`, then writes
+
+* ``PATH``, the CPU profile, loadable by ``python -m pstats PATH`` and
+  viewers such as snakeviz;
+* ``PATH.txt``, a summary of the time and retained memory of the package's
+  :data:`HOT_PATHS`, the top functions by cumulative time and the top
+  allocation sites. It is also printed to stderr.
+
+Threads started while profiling, such as those of ``--parallel thread``,
+are profiled too where the interpreter allows a profile per thread, and
+their time is merged into the profile. Work on process pools is not
+profiled.
+
+Example:
+
+    profiler = usau.profiling.start_profiling("fantasy.prof")
+    ...
+    profiler.stop()  # Otherwise the profile is written at exit
+"""
+from __future__ import division, print_function
+
+import atexit
+import cProfile
+from collections import OrderedDict
+import dis
+import importlib
+import io
+import logging
+import pstats
+import sys
+import threading
+
+import pandas as pd
+from six import StringIO
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+_logger = logging.getLogger(__name__)
+
+# Name to "module:attribute path" of the package's expensive steps
+HOT_PATHS = OrderedDict([
+    ("_scrape_match", "usau.reports:USAUResults._scrape_match"),
+    ("_scrape_roster", "usau.reports:USAUResults._scrape_roster"),
+    ("clean_match_report_stats", "usau.reports:USAUResults.clean_match_report_stats"),
+    ("load_from_csvs", "usau.reports:USAUResults.load_from_csvs"),
+    ("compute_fantasy_picks", "usau.fantasy:compute_fantasy_picks"),
+    ("to_markdown", "usau.markdown:to_markdown"),
+    ("pandas_to_markdown", "usau.markdown:pandas_to_markdown"),
+])
+
+_MIB = float(1 << 20)
+
+
+def _code(path):
+    """Code object of a "module:attribute path" function"""
+    module, attrs = path.split(":")
+    obj = importlib.import_module(module)
+    for attr in attrs.split("."):
+        obj = getattr(obj, attr)
+    return getattr(obj, "__func__", obj).__code__
+
+
+def _line_range(code):
+    """First and last source line of a function, including nested ones"""
+    lines = [line for _, line in dis.findlinestarts(code) if line is not None]
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            lines.append(_line_range(const)[1])
+    return code.co_firstlineno, max(lines + [code.co_firstlineno])
+
+
+def hot_path_times(stats, hot_paths=HOT_PATHS):
+    """Calls and seconds of each hot path in a profile
+
+    Args:
+        stats (pstats.Stats): Profile
+        hot_paths (dict): Name to "module:attribute path"
+
+    Returns:
+        pd.DataFrame: per hot path, "Calls", "Own Seconds", "Total Seconds"
+            and "% Time", the share of all profiled time spent within it
+    """
+    total = sum(tt for _, _, tt, _, _ in stats.stats.values()) or 1.
+    rows = []
+    for name, path in hot_paths.items():
+        code = _code(path)
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        _, calls, own, cumulative, _ = stats.stats.get(key, (0, 0, 0., 0., {}))
+        rows.append((name, calls, own, cumulative, 100. * cumulative / total))
+    return pd.DataFrame(rows, columns=["Hot Path", "Calls", "Own Seconds", "Total Seconds",
+                                       "% Time"]).set_index("Hot Path")
+
+
+def hot_path_memory(snapshot, hot_paths=HOT_PATHS):
+    """Bytes allocated within each hot path and still held in a snapshot
+
+    Allocations are attributed to every hot path on their traceback, so
+    nested hot paths both count them.
+
+    Args:
+        snapshot (tracemalloc.Snapshot): Taken with enough frames to reach
+            the hot paths
+        hot_paths (dict): Name to "module:attribute path"
+
+    Returns:
+        pd.Series: retained bytes by hot path
+    """
+    ranges = {}  # filename -> [(first line, last line, hot path)]
+    for i, path in enumerate(hot_paths.values()):
+        code = _code(path)
+        ranges.setdefault(code.co_filename, []).append(_line_range(code) + (i,))
+    retained = [0] * len(hot_paths)
+    for trace in snapshot.traces:
+        within = set(i for frame in trace.traceback
+                     for first, last, i in ranges.get(frame.filename, ())
+                     if first <= frame.lineno <= last)
+        for i in within:
+            retained[i] += trace.size
+    return pd.Series(retained, index=list(hot_paths), name="Retained Bytes")
+
+
+class Profiler(object):
+    """CPU profile and allocation snapshot of a stretch of a program
+
+    Args:
+        path (str): File to write the profile to, with the summary
+            written to path + ".txt"; None to only keep them in memory
+        top (int): Number of functions and allocation sites in the summary
+        frames (int): Traceback depth of allocations; deep enough to reach
+            the hot paths from where pandas and numpy allocate
+        threads (bool): Also profile threads started while profiling
+
+    Attributes:
+        stats (pstats.Stats): Merged profile of all profiled threads
+        snapshot (tracemalloc.Snapshot): Allocations held when stopped
+        peak_bytes (int): Most bytes traced at once
+    """
+
+    def __init__(self, path=None, top=25, frames=32, threads=True):
+        self.path = path
+        self.top = top
+        self.frames = frames
+        self.threads = threads
+        self.stats = None
+        self.snapshot = None
+        self.peak_bytes = None
+        self._lock = threading.Lock()
+        self._profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._running = False
+
+    def _profile_thread(self, frame, event, arg):
+        """Installed by threading.setprofile; profiles the calling thread"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()  # Replaces this hook for the thread
+        except ValueError as exc:  # e.g. one profiler per interpreter
+            sys.setprofile(None)
+            _logger.debug("Not profiling thread: {exc}".format(exc=exc))
+            return
+        with self._lock:
+            self._thread_profiles.append(profile)
+
+    def start(self):
+        """Start profiling, returning self"""
+        if self.threads:
+            threading.setprofile(self._profile_thread)
+        if tracemalloc is not None:
+            tracemalloc.start(self.frames)
+        self._running = True
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        """Stop profiling and write the profile and summary, if not done yet
+
+        Returns:
+            str: the summary
+        """
+        if not self._running:
+            return None
+        self._profile.disable()
+        self._running = False
+        threading.setprofile(None)
+        if tracemalloc is not None:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            self.snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ])
+            tracemalloc.stop()
+
+        self.stats = pstats.Stats(self._profile)
+        with self._lock:
+            for profile in self._thread_profiles:
+                self.stats.add(profile)
+        summary = self.summary()
+        if self.path is not None:
+            self.stats.dump_stats(self.path)
+            with io.open(self.path + ".txt", "w", encoding="utf-8") as fd:
+                fd.write(summary)
+        print(summary, file=sys.stderr)
+        return summary
+
+    def summary(self):
+        """Human-readable top-N report of a stopped profile"""
+        lines = []
+        total = sum(tt for _, _, tt, _, _ in self.stats.stats.values())
+        lines.append("Profiled {s:.3f}s in {n} thread(s)".format(
+            s=total, n=1 + len(self._thread_profiles)))
+        if self.peak_bytes is not None:
+            lines.append("Peak traced memory: {mib:.1f} MiB".format(
+                mib=self.peak_bytes / _MIB))
+
+        hot = hot_path_times(self.stats)
+        if self.snapshot is not None:
+            hot["Retained MiB"] = hot_path_memory(self.snapshot) / _MIB
+        hot = hot[hot["Calls"] > 0]
+        with pd.option_context("display.width", 200, "display.max_columns", 20,
+                               "display.float_format", "{:.3f}".format):
+            lines += ["", "Hot paths:", hot.to_string()]
+
+        stream = StringIO()
+        self.stats.stream = stream
+        self.stats.sort_stats("cumulative").print_stats(self.top)
+        self.stats.stream = sys.stdout
+        lines += ["", "Top {n} functions by cumulative time:".format(n=self.top),
+                  stream.getvalue().strip()]
+
+        if self.snapshot is not None:
+            lines += ["", "Top {n} allocation sites still held:".format(n=self.top)]
+            lines += ["{size:10.1f} KiB {count:8d} blocks  {site}".format(
+                size=stat.size / 1024., count=stat.count, site=stat.traceback[0])
+                for stat in self.snapshot.statistics("lineno")[:self.top]]
+        return "\n".join(lines) + "\n"
+
+
+def start_profiling(path, **kwargs):
+    """Start a :class:`Profiler` which is stopped at exit, unless path is None
+
+    Args:
+        path (str): As for :class:`Profiler`, e.g. a --profile option
+
+    Returns:
+        Profiler: or None
+    """
+    if path is None:
+        return None
+    profiler = Profiler(path, **kwargs).start()
+    atexit.register(profiler.stop)
+    _logger.info("Profiling to {path}".format(path=path))
+    return profiler
+
+
+def add_profile_argument(parser):
+    """Add the --profile option to a command line parser"""
+    parser.add_argument("--profile", metavar="PATH",
+                        help="Profile CPU time and memory, writing a profile loadable "
+                             "by pstats or snakeviz to PATH and a summary to PATH.txt")
@@ -0,0 +1,298 @@
+"""
+Fit team ratings from match results via least squares on point margins.
+
+Each game contributes one equation ``rating[team] - rating[opponent] ~ margin``
+to a sparse team x game system. Only its normal equations are stored, which
+for this system is a weighted graph Laplacian over teams, so that results can be
+folded in incrementally and re-solved warm-started from the previous fit.
+
+Example:
+
+    ratings = TeamRatings()
+    for report in reports:  # e.g. every USAUResults in usau/data
+        ratings.add_event(report.load_from_csvs())
+    ratings.ratings.head()
+    ratings.predict_margin("Revolver", "Ring of Fire", division="club_men")
+"""
+from __future__ import division, print_function
+
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.linalg
+
+from usau.urls import game_ids
+
+_logger = logging.getLogger(__name__)
+
+
+def usau_score_differential(winner_score, loser_score):
+    """USAU ranking algorithm's rating differential for a single game
+
+    A one-point win is worth 125 rating points, rising along a sine curve to
+    600 when the loser scores no more than half of the winner's points.
+    Inputs may be scalars or numpy arrays.
+    """
+    winner_score = np.asarray(winner_score, dtype=float)
+    loser_score = np.asarray(loser_score, dtype=float)
+    ratio = loser_score / np.maximum(winner_score - 1, 1)
+    x = np.clip(2 * (1 - ratio), 0, 1)
+    diff = 125 + 475 * np.sin(x * 0.4 * math.pi) / math.sin(0.4 * math.pi)
+    return np.where(winner_score > loser_score, diff, 0.)
+
+
+class TeamRatings(object):
+    """Least-squares team strengths over any number of events
+
+    Args:
+        regularization (float): Ridge penalty pulling ratings towards zero;
+            keeps the system well-posed for teams in disconnected components.
+        method (str): "points" fits raw point margins, so predictions are in
+            points; "usau" fits :func:`usau_score_differential` instead.
+        margin_cap (int | None): Clip absolute point margins, to limit the
+            influence of blowouts under the "points" method.
+    """
+    _METHODS = ("points", "usau")
+
+    def __init__(self, regularization=0.01, method="points", margin_cap=None):
+        if method not in self._METHODS:
+            raise ValueError("Unknown rating method {method}, choices: {choices}"
+                             .format(method=method, choices=self._METHODS))
+        self.regularization = regularization
+        self.method = method
+        self.margin_cap = margin_cap
+
+        self._team_index = {}  # (division, team) -> row of normal equations
+        self._teams = []
+        self._games = []  # DataFrame chunks of one row per game
+        self._game_teams = []  # team ids of both sides of each game
+        self._seen = set()  # (event, game id) keys already folded in
+        # Normal equations accumulated as COO triplets, summed on solve
+        self._rows = []
+        self._cols = []
+        self._vals = []
+        self._rhs = np.zeros(0)
+        self._solution = np.zeros(0)
+        self._dirty = False
+
+    def __repr__(self):
+        return ("TeamRatings<{n} teams, {g} games>"
+                .format(n=len(self._teams), g=len(self._seen)))
+
+    def _team_ids(self, divisions, teams):
+        ids = np.empty(len(teams), dtype=np.int64)
+        for i, key in enumerate(zip(divisions, teams)):
+            index = self._team_index.get(key)
+            if index is None:
+                index = self._team_index[key] = len(self._teams)
+                self._teams.append(key)
+            ids[i] = index
+        if len(self._teams) > len(self._rhs):
+            self._rhs = np.concatenate(
+                [self._rhs, np.zeros(len(self._teams) - len(self._rhs))])
+        return ids
+
+    def _margins(self, score, opp_score):
+        if self.method == "usau":
+            return (usau_score_differential(score, opp_score) -
+                    usau_score_differential(opp_score, score))
+        margin = score - opp_score
+        if self.margin_cap is not None:
+            margin = np.clip(margin, -self.margin_cap, self.margin_cap)
+        return margin
+
+    def add_results(self, match_results, event=None, division=None):
+        """Fold a match_results table into the rating system
+
+        Games already added (by event and canonical game id) are skipped, so
+        the same event can be re-added as results arrive during play, even if
+        its match report urls are encoded differently.
+
+        Args:
+            match_results (pd.DataFrame): As in :attr:`USAUResults.match_results`,
+                with one row per team per game.
+            event (str): Event label; defaults to the frame's "event" column.
+            division (str): Teams are only comparable within a division
+                (e.g. "club_men"); defaults to the frame's "division" column.
+
+        Returns:
+            TeamRatings: self, for chaining
+        """
+        games = match_results.dropna(subset=["Score", "Opp Score"])
+        games = games.assign(game_id=game_ids(games["url"].values))
+        # Every game is listed once from each team's perspective
+        games = games.drop_duplicates(subset=[c for c in ("event", "game_id")
+                                              if c in games.columns])
+        events = (games["event"].astype(str).values if event is None
+                  else np.repeat(event, len(games)))
+        divisions = (games["division"].astype(str).values if division is None
+                     else np.repeat(division, len(games)))
+
+        new = np.array([(evt, game) not in self._seen
+                        for evt, game in zip(events, games["game_id"].values)],
+                       dtype=bool)
+        if not new.any():
+            return self
+        games, events, divisions = games[new], events[new], divisions[new]
+        self._seen.update(zip(events, games["game_id"].values))
+
+        home = self._team_ids(divisions, games["Team"].values)
+        away = self._team_ids(divisions, games["Opponent"].values)
+        margin = self._margins(games["Score"].values.astype(float),
+                               games["Opp Score"].values.astype(float))
+
+        # Row (e_home - e_away) of the design matrix contributes
+        # its outer product to the normal equations.
+        self._rows += [home, away, home, away]
+        self._cols += [home, away, away, home]
+        ones = np.ones(len(home))
+        self._vals += [ones, ones, -ones, -ones]
+        np.add.at(self._rhs, home, margin)
+        np.add.at(self._rhs, away, -margin)
+        self._game_teams += [home, away]
+
+        chunk = pd.DataFrame({
+            "event": events,
+            "division": divisions,
+            "url": games["url"].values,
+            "Team": games["Team"].values,
+            "Opponent": games["Opponent"].values,
+            "Score": games["Score"].values,
+            "Opp Score": games["Opp Score"].values,
+            "Seed": (games["Seed"].values if "Seed" in games.columns
+                     else np.nan),
+            "Opp Seed": (games["Opp Seed"].values if "Opp Seed" in games.columns
+                         else np.nan),
+        })
+        self._games.append(chunk)
+        self._dirty = True
+        return self
+
+    def add_event(self, results):
+        """Fold in a :class:`usau.reports.USAUResults` event"""
+        return self.add_results(
+            results.match_results, event=results._name(),
+            division="{level}_{gender}".format(level=results.event_info["level"],
+                                               gender=results.gender))
+
+    @classmethod
+    def from_results(cls, results_iter, **kwargs):
+        """Constructor from an iterable of loaded USAUResults"""
+        ratings = cls(**kwargs)
+        for results in results_iter:
+            ratings.add_event(results)
+        return ratings
+
+    @classmethod
+    def from_archive(cls, archive, **kwargs):
+        """Constructor from all events of a :class:`usau.archive.Archive`"""
+        return cls(**kwargs).add_results(archive.match_results)
+
+    def fit(self):
+        """Solve the normal equations, warm-started from the previous fit"""
+        n = len(self._teams)
+        if not self._dirty:
+            return self
+        rows = np.concatenate(self._rows)
+        cols = np.concatenate(self._cols)
+        vals = np.concatenate(self._vals)
+        # Compact triplets so that memory stays proportional to team pairs
+        normal = scipy.sparse.coo_matrix((vals, (rows, cols)), shape=(n, n)).tocsr()
+        normal.sum_duplicates()
+        coo = normal.tocoo()
+        self._rows, self._cols, self._vals = [coo.row], [coo.col], [coo.data]
+
+        system = normal + self.regularization * scipy.sparse.identity(n, format="csr")
+        x0 = np.zeros(n)
+        x0[:len(self._solution)] = self._solution
+        solution, info = scipy.sparse.linalg.cg(system, self._rhs, x0=x0)
+        if info != 0:
+            _logger.warning("Conjugate gradient did not converge ({info}), "
+                            "falling back to a direct solve".format(info=info))
+            solution = scipy.sparse.linalg.spsolve(system.tocsc(), self._rhs)
+        self._solution = solution
+        self._dirty = False
+        return self
+
+    @property
+    def games(self):
+        """Returns pd.DataFrame of one row per game folded into the ratings"""
+        if not self._games:
+            return pd.DataFrame(columns=["event", "division", "url", "Team",
+                                         "Opponent", "Score", "Opp Score",
+                                         "Seed", "Opp Seed"])
+        if len(self._games) > 1:
+            self._games = [pd.concat(self._games, ignore_index=True)]
+        return self._games[0]
+
+    @property
+    def ratings(self):
+        """Returns pd.DataFrame of each team's rating, sorted descending"""
+        self.fit()
+        games_played = np.bincount(
+            np.concatenate(self._game_teams or [np.zeros(0, dtype=np.int64)]),
+            minlength=len(self._teams))
+        df = pd.DataFrame({
+            "Division": [division for division, _ in self._teams],
+            "Team": [team for _, team in self._teams],
+            "Rating": self._solution,
+            "Games Played": games_played,
+        })
+        return df.sort_values("Rating", ascending=False).reset_index(drop=True)
+
+    def rating(self, team, division=None):
+        """Rating of a single team, or NaN if it has not played"""
+        self.fit()
+        index = self._lookup(team, division)
+        return np.nan if index is None else self._solution[index]
+
+    def _lookup(self, team, division):
+        if division is not None:
+            return self._team_index.get((division, team))
+        matches = [i for (_, name), i in self._team_index.items() if name == team]
+        if len(matches) > 1:
+            raise ValueError("Team {team} is ambiguous across divisions; "
+                             "pass division=".format(team=team))
+        return matches[0] if matches else None
+
+    def predict_margin(self, team, opponent, division=None):
+        """Predicted point margin (or USAU differential) of team over opponent"""
+        return self.rating(team, division) - self.rating(opponent, division)
+
+    def predict(self, match_results, division):
+        """Adjoin ratings and predicted margins to a match_results table
+
+        Returns:
+            pd.DataFrame: Copy of match_results with "Rating", "Opp Rating"
+                and "Predicted Margin" columns
+        """
+        self.fit()
+        def lookup(teams):
+            return np.array([self._solution[self._team_index[(division, t)]]
+                             if (division, t) in self._team_index else np.nan
+                             for t in teams])
+        df = match_results.copy()
+        df["Rating"] = lookup(df["Team"].values)
+        df["Opp Rating"] = lookup(df["Opponent"].values)
+        df["Predicted Margin"] = df["Rating"] - df["Opp Rating"]
+        return df
+
+    def event_ratings(self, event):
+        """Returns pd.DataFrame of ratings for the teams playing in an event"""
+        games = self.games[self.games["event"] == event]
+        if games.empty:
+            raise ValueError("Unknown event: {event}".format(event=event))
+        teams = pd.concat([
+            games[["division", "Team", "Seed"]],
+            games[["division", "Opponent", "Opp Seed"]]
+                 .rename(columns={"Opponent": "Team", "Opp Seed": "Seed"}),
+        ]).drop_duplicates(subset=["division", "Team"])
+        ratings = self.ratings.rename(columns={"Division": "division"})
+        df = teams.merge(ratings, on=["division", "Team"], how="left")
+        df = df.rename(columns={"division": "Division"})
+        df = df.sort_values("Rating", ascending=False).reset_index(drop=True)
+        df["Rank"] = np.arange(1, len(df) + 1)
+        return df
@@ -0,0 +1,348 @@
+"""
+Registry of USAU events, keyed by (level, event alias, year, gender).
+
+The registry is seeded from the hand-maintained table of
+:attr:`usau.reports.USAUResults._EVENT_TO_URL`, whose year ranges are
+expanded once into keys, so that :func:`USAUResults.from_event` is a dict
+lookup. Further events (regionals, sectionals, new url patterns) are found by
+a :class:`Crawler` over the site's event listing pages, and cached as json.
+
+Pages fetched by the crawler can be recorded to a directory and replayed
+offline, e.g. to rebuild the registry in tests or without network access.
+
+Example:
+
+    source = PageSource(record_dir="~/usau_pages")
+    registry = Crawler(source).crawl()
+    registry.save()  # Picked up by USAUResults.from_event from now on
+    usau.reports.USAUResults.from_event("club", 2019, "men",
+                                        "northwest regional championships")
+"""
+from __future__ import division, print_function
+
+import argparse
+from collections import OrderedDict
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+
+from bs4 import BeautifulSoup
+import requests
+import six
+from six.moves.urllib.parse import urljoin, urlparse
+
+_logger = logging.getLogger(__name__)
+
+BASE_URL = "http://play.usaultimate.org"
+# Listing of past and upcoming tournaments, paged
+LISTING_URL = BASE_URL + "/events/tournament/?ViewAll=true"
+
+GENDERS = ("men", "mixed", "women")
+
+_EVENT_RE = re.compile(r"^/events/([^/?#]+)/?$")
+_SCHEDULE_RE = re.compile(r"^/events/([^/?#]+)/schedule/([^/?#]+)/([^/?#]+)/?$")
+
+
+def default_cache_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "data", "event_registry.json")
+
+
+def normalize_alias(event):
+    """Event alias as compared in lookups, e.g. "TCT-Pro" -> "tct pro" """
+    return " ".join(event.lower().replace('-', ' ').replace('_', ' ').split())
+
+
+def _slug_alias(slug, year):
+    """Alias derived from an event's url slug, e.g.
+    "Northwest-Regional-Championships-2019" -> "northwest regional championships"
+    """
+    alias = slug.replace(str(year), "")
+    alias = re.sub(r"^(USA-Ultimate-|USAU-)", "", alias.strip("-"), flags=re.I)
+    return normalize_alias(alias)
+
+
+def parse_schedule_url(url):
+    """Event slug, gender and competition of a schedule page url, e.g.
+    ".../events/TCT-Pro-Championships-2019/schedule/Men/Club-Men"
+
+    Returns:
+        (str, str, str) or None if not a schedule url
+    """
+    match = _SCHEDULE_RE.match(urlparse(url).path)
+    if match is None:
+        return None
+    slug, gender, division = match.groups()
+    competition = division.split("-")[0] if "-" in division else division[:-len(gender)]
+    return slug, gender.lower(), competition
+
+
+class EventRegistry(object):
+    """Event metadata dicts (as in USAUResults.event_info) by lookup key
+
+    Keys are (level, alias, year, gender); a gender of None matches any
+    gender, as for the static table, whose pages follow a common pattern.
+    """
+
+    def __init__(self):
+        self._events = OrderedDict()
+        self._levels = set()
+        # (level, alias) -> (last expanded year, event_info) of events with
+        # no end year, matched for any later year
+        self._open_ended = {}
+
+    def __len__(self):
+        return len(self._events)
+
+    def __contains__(self, key):
+        return key in self._events
+
+    def __repr__(self):
+        return "EventRegistry<{n} keys>".format(n=len(self))
+
+    @property
+    def levels(self):
+        return sorted(self._levels)
+
+    def add(self, event_info, years, genders=(None,)):
+        """Register an event under each of its aliases, years and genders"""
+        for alias in event_info["event"]:
+            for year in years:
+                for gender in genders:
+                    key = (event_info["level"], normalize_alias(alias), int(year), gender)
+                    self._events[key] = event_info
+        self._levels.add(event_info["level"])
+        return self
+
+    @classmethod
+    def from_table(cls, table, last_year=None):
+        """Registry of a static table of event_info dicts, as in
+        USAUResults._EVENT_TO_URL; open-ended year ranges run to last_year,
+        by default next year"""
+        if last_year is None:
+            last_year = datetime.date.today().year + 1
+        registry = cls()
+        # Earlier rows take precedence, as when the table was scanned in order
+        for event_info in reversed(table):
+            assert isinstance(event_info["event"], list)
+            start_year = event_info.get("start_year", 2000)
+            end_year = event_info.get("end_year", last_year)
+            registry.add(event_info, range(start_year, end_year + 1))
+            if "end_year" not in event_info:
+                for alias in event_info["event"]:
+                    registry._open_ended[(event_info["level"], normalize_alias(alias))] = \
+                        (last_year, event_info)
+        return registry
+
+    def lookup(self, level, event, year, gender):
+        """event_info of an event, or None"""
+        event = normalize_alias(event)
+        key = (level.lower(), event, int(year), gender.lower())
+        event_info = self._events.get(key, self._events.get(key[:3] + (None,)))
+        if event_info is None and key[:2] in self._open_ended:
+            last_year, open_ended = self._open_ended[key[:2]]
+            if key[2] > last_year:
+                return open_ended
+        return event_info
+
+    def update(self, other):
+        self._events.update(other._events)
+        self._levels.update(other._levels)
+        self._open_ended.update(other._open_ended)
+        return self
+
+    def events(self):
+        """Distinct registered events, with their keys"""
+        keys = OrderedDict()
+        for key, event_info in self._events.items():
+            keys.setdefault(id(event_info), (event_info, []))[1].append(key)
+        return list(keys.values())
+
+    def save(self, path=None):
+        """Write the registry to a json cache"""
+        path = os.path.expanduser(path or default_cache_path())
+        records = [OrderedDict([("event_info", event_info),
+                                ("keys", [list(key) for key in keys])])
+                   for event_info, keys in self.events()]
+        with io.open(path, "w", encoding="utf-8") as fd:
+            fd.write(six.text_type(json.dumps({"events": records}, indent=1,
+                                             sort_keys=True)))
+        _logger.info("Saved {n} events to {path}".format(n=len(records), path=path))
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        """Registry from a json cache"""
+        path = os.path.expanduser(path or default_cache_path())
+        with io.open(path, encoding="utf-8") as fd:
+            records = json.load(fd)["events"]
+        registry = cls()
+        for record in records:
+            for level, alias, year, gender in record["keys"]:
+                registry._events[(level, alias, year, gender)] = record["event_info"]
+                registry._levels.add(level)
+        return registry
+
+
+class PageSource(object):
+    """Fetches pages, optionally recording them to or replaying them from a
+    directory
+
+    Args:
+        fetcher (usau.throttle.Fetcher): Rate-limited fetcher; by default
+            pages are fetched with requests
+        record_dir (str): Directory of recorded pages, one file per url
+        replay (bool): Only read recorded pages, never the network
+    """
+
+    def __init__(self, fetcher=None, record_dir=None, replay=False):
+        if replay and record_dir is None:
+            raise ValueError("Replaying pages requires a record_dir")
+        self.fetcher = fetcher
+        self.record_dir = record_dir and os.path.expanduser(record_dir)
+        self.replay = replay
+        if self.record_dir and not os.path.isdir(self.record_dir):
+            os.makedirs(self.record_dir)
+
+    def _path(self, url):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.record_dir, digest + ".html")
+
+    def get(self, url):
+        path = self.record_dir and self._path(url)
+        if path and os.path.exists(path):
+            with io.open(path, encoding="utf-8") as fd:
+                return fd.read()
+        if self.replay:
+            raise IOError("No recorded page for {url}".format(url=url))
+        _logger.info("Downloading from URL: {url}".format(url=url))
+        if self.fetcher is not None:
+            text = self.fetcher.fetch(url)
+        else:
+            response = requests.get(url)
+            response.raise_for_status()
+            text = response.text
+        if path:
+            with io.open(path, "w", encoding="utf-8") as fd:
+                fd.write(text)
+        return text
+
+
+class Crawler(object):
+    """Discovers events from the site's event listing pages
+
+    Listing pages are followed through their "Next" links; each event page
+    linked from them is fetched once for its schedule links, which give the
+    genders and competition (level) of the event.
+
+    Args:
+        source (PageSource): Where pages come from
+        known (EventRegistry): Registry whose aliases are reused for events
+            it already knows, e.g. "nats" for the national championships
+    """
+
+    def __init__(self, source=None, known=None):
+        self.source = source or PageSource()
+        self.visited = set()
+        # (level, url slug) -> aliases of the known events
+        self._known_slugs = {}
+        for (level, _, year, _), event_info in (known._events.items() if known else ()):
+            self._known_slugs.setdefault((level, event_info["url"].format(y=year)),
+                                         list(event_info["event"]))
+
+    def _soup(self, url):
+        self.visited.add(url)
+        return BeautifulSoup(self.source.get(url), "html.parser")
+
+    @staticmethod
+    def _links(soup, base):
+        for anchor in soup.find_all("a", href=True):
+            yield urljoin(base, anchor["href"]), anchor.get_text(strip=True)
+
+    def _level(self, slug, competition):
+        competition = competition.lower()
+        if competition == "college":
+            return "d3college" if re.search(r"D-?III", slug, re.I) else "d1college"
+        return competition
+
+    def _event_info(self, url, slug, gender, competition):
+        match = re.search(r"\d{4}", slug)
+        if match is None:
+            _logger.warning("No year in event {slug}, skipping".format(slug=slug))
+            return None, None
+        year = int(match.group(0))
+        level = self._level(slug, competition)
+        aliases = self._known_slugs.get((level, slug), [_slug_alias(slug, year)])
+        return {"level": level, "event": aliases, "url": slug, "full_url": url,
+                "start_year": year, "end_year": year}, year
+
+    def crawl(self, listing_url=LISTING_URL, max_pages=None, registry=None):
+        """Crawl listing pages into a registry
+
+        Args:
+            max_pages (int): Stop after this many listing pages
+            registry (EventRegistry): Add to this registry instead of a new one
+
+        Returns:
+            EventRegistry
+        """
+        registry = registry if registry is not None else EventRegistry()
+        listings, event_pages, pages = [listing_url], OrderedDict(), 0
+        while listings and (max_pages is None or pages < max_pages):
+            url = listings.pop(0)
+            if url in self.visited:
+                continue
+            soup, pages = self._soup(url), pages + 1
+            for link, text in self._links(soup, url):
+                path = urlparse(link).path
+                if text.lower() in ("next", "next >", ">", "\xbb") and link not in self.visited:
+                    listings.append(link)
+                elif _EVENT_RE.match(path) and path != urlparse(listing_url).path:
+                    event_pages.setdefault(link, None)
+                elif _SCHEDULE_RE.match(path):
+                    self._add_schedule(registry, link)
+        for url in event_pages:
+            if url in self.visited:
+                continue
+            try:
+                soup = self._soup(url)
+            except (IOError, requests.RequestException) as e:
+                _logger.warning("Skipping event page {url}: {e}".format(url=url, e=e))
+                continue
+            for link, _ in self._links(soup, url):
+                if _SCHEDULE_RE.match(urlparse(link).path):
+                    self._add_schedule(registry, link)
+        _logger.info("Crawled {n} pages into {registry}"
+                     .format(n=len(self.visited), registry=registry))
+        return registry
+
+    def _add_schedule(self, registry, url):
+        slug, gender, competition = parse_schedule_url(url)
+        if gender not in GENDERS:
+            return
+        event_info, year = self._event_info(url, slug, gender, competition)
+        if event_info is not None:
+            registry.add(event_info, [year], [gender])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discover USAU events and cache them")
+    parser.add_argument("--listing_url", default=LISTING_URL)
+    parser.add_argument("--max_pages", type=int)
+    parser.add_argument("--record_dir", help="Directory to record fetched pages to")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only read pages recorded in --record_dir")
+    parser.add_argument("--cache", help="Registry json to write")
+    parser.add_argument("--log_level", default="INFO",
+                        help="Python logging verbosity level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    import usau.reports
+    source = PageSource(record_dir=args.record_dir, replay=args.replay)
+    known = EventRegistry.from_table(usau.reports.USAUResults._EVENT_TO_URL)
+    Crawler(source, known).crawl(args.listing_url, max_pages=args.max_pages).save(args.cache)
@@ -0,0 +1,273 @@
+"""
+Batch repair of score progressions.
+
+Match reports list each game's score after every point, but data entry is
+uneven: cells are left blank, points are entered and then corrected, the
+final point is omitted, or the home and away columns are swapped relative to
+the final score. :func:`repair_progressions` takes the progressions of many
+games concatenated into one long array and repairs them all at once:
+
+- blank cells take the score of the previous point;
+- a row whose score is above or below those of the points either side of it,
+  i.e. a mistyped score or a point entered and then corrected, is dropped;
+- any score that still later goes down is lowered to the later score, and
+  states repeating the previous point's are dropped;
+- a progression that only fits the final score with the home and away
+  columns swapped is swapped;
+- a progression one point short of the final score gets the final point.
+
+Each game gets a code of :data:`REPAIRS` bit flags, with :data:`MISMATCH`
+for progressions which still do not end at the final score, e.g. because
+many points are missing, and :data:`MANY_CORRECTIONS` for progressions with
+more than one row dropped or lowered, whose repair is more of a guess. Scraped progressions are repaired by
+:func:`usau.reports.USAUResults._scrape_match`; stored ones are re-repaired
+with :func:`repair_archive`, or as a script:
+
+    python -m usau.repair --write
+"""
+from __future__ import division, print_function
+
+import argparse
+from collections import OrderedDict
+import logging
+
+import numpy as np
+import pandas as pd
+
+_logger = logging.getLogger(__name__)
+
+BLANK_CELLS = 1
+NON_MONOTONE = 2
+SWAPPED = 4
+MISSING_FINAL = 8
+MISMATCH = 16
+MANY_CORRECTIONS = 32
+
+REPAIRS = OrderedDict([
+    (BLANK_CELLS, "blank cells"),
+    (NON_MONOTONE, "non-monotone"),
+    (SWAPPED, "swapped home/away"),
+    (MISSING_FINAL, "missing final point"),
+    (MISMATCH, "mismatched final score"),
+    (MANY_CORRECTIONS, "several rows corrected"),
+])
+
+
+def describe(code):
+    """Names of the repairs of a code, e.g. "non-monotone, missing final point" """
+    return ", ".join(name for flag, name in REPAIRS.items() if code & flag) or "none"
+
+
+def _flagged(ids, mask, num_games):
+    """Per game, whether any of its rows is masked"""
+    return np.bincount(ids[mask], minlength=num_games) > 0
+
+
+def _forward_fill(values, first):
+    """Fill NaNs from the previous row of the same game, then with 0"""
+    rows = np.arange(len(values))
+    source = np.maximum.accumulate(np.where(~np.isnan(values) | first, rows, 0))
+    return np.nan_to_num(values[source])
+
+
+def _outliers(values, first, last):
+    """Rows of a game above, or below, both the previous and the next row"""
+    prev = np.r_[values[:1], values[:-1]]
+    following = np.r_[values[1:], values[-1:]]
+    return ~first & ~last & (((values > prev) & (values > following)) |
+                             ((values < prev) & (values < following)))
+
+
+def _suffix_min(values, ids):
+    """Per row, the least value of it and the later rows of its game"""
+    if not len(values):
+        return values
+    # Offsetting each game above the ones before it keeps the running
+    # minimum, taken from the back, from crossing games
+    offset = ids * (values.max() - min(values.min(), 0) + 1)
+    return np.minimum.accumulate((values + offset)[::-1])[::-1] - offset
+
+
+def repair_progressions(home, away, starts, home_final, away_final):
+    """Repair the score progressions of many games at once
+
+    Args:
+        home, away (np.ndarray): Scores after each point of every game,
+            concatenated, starting from each game's 0-0 state; NaN where
+            a cell was blank
+        starts (np.ndarray): Position of each game's first row
+        home_final, away_final (np.ndarray): Final score of each game
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+            repaired home and away scores, the row of the input each
+            repaired row came from (-1 for added final points), the
+            position of each game's first repaired row, and the repair
+            code of each game
+    """
+    home = np.asarray(home, dtype=np.float64)
+    away = np.asarray(away, dtype=np.float64)
+    home_final = np.asarray(home_final, dtype=np.int64)
+    away_final = np.asarray(away_final, dtype=np.int64)
+    num_games = len(starts)
+    ids = np.repeat(np.arange(num_games), np.diff(np.r_[starts, len(home)]).astype(np.int64))
+    codes = np.zeros(num_games, dtype=np.int8)
+
+    # Rows blank in both columns are dropped, other blanks filled
+    blank = np.isnan(home) | np.isnan(away)
+    rows = np.flatnonzero(~(np.isnan(home) & np.isnan(away)))
+    home, away, ids = home[rows], away[rows], ids[rows]
+    first = np.r_[True, ids[1:] != ids[:-1]] if len(ids) else np.zeros(0, dtype=bool)
+    codes[_flagged(ids, blank[rows] & ~first, num_games)] |= BLANK_CELLS
+    home = _forward_fill(home, first).astype(np.int64)
+    away = _forward_fill(away, first).astype(np.int64)
+
+    # A single mistyped row sticks out from the points either side of it
+    last = np.r_[first[1:], True] if len(ids) else first
+    outlier = _outliers(home, first, last) | _outliers(away, first, last)
+    # Of two adjacent outliers, the later is taken to correct the earlier
+    after_outlier = np.zeros_like(outlier)
+    after_outlier[1:] = outlier[:-1]
+    outlier &= ~after_outlier
+    corrections = np.bincount(ids[outlier], minlength=num_games)
+    home, away, ids, rows, first = (home[~outlier], away[~outlier], ids[~outlier],
+                                    rows[~outlier], first[~outlier])
+
+    # Later points are taken to correct any earlier ones still above them
+    fixed_home, fixed_away = _suffix_min(home, ids), _suffix_min(away, ids)
+    lowered = (fixed_home != home) | (fixed_away != away)
+    corrections += np.bincount(ids[lowered], minlength=num_games)
+    home, away = fixed_home, fixed_away
+    repeated = ~first & (home == np.r_[-1, home[:-1]]) & (away == np.r_[-1, away[:-1]])
+    codes[(corrections > 0) | _flagged(ids, repeated, num_games)] |= NON_MONOTONE
+    codes[corrections > 1] |= MANY_CORRECTIONS
+    home, away, ids, rows = home[~repeated], away[~repeated], ids[~repeated], rows[~repeated]
+
+    lengths = np.bincount(ids, minlength=num_games)
+    ends = np.cumsum(lengths)
+    last = np.maximum(ends - 1, 0)
+    has_rows = lengths > 0
+    last_home = np.where(has_rows, home[last] if len(home) else 0, 0)
+    last_away = np.where(has_rows, away[last] if len(away) else 0, 0)
+
+    fits = (last_home <= home_final) & (last_away <= away_final)
+    swapped = ~fits & (last_home <= away_final) & (last_away <= home_final)
+    codes[swapped] |= SWAPPED
+    swap_rows = swapped[ids]
+    home, away = np.where(swap_rows, away, home), np.where(swap_rows, home, away)
+    last_home, last_away = (np.where(swapped, last_away, last_home),
+                            np.where(swapped, last_home, last_away))
+
+    missing = ((last_home <= home_final) & (last_away <= away_final) &
+               (last_home + last_away == home_final + away_final - 1))
+    codes[missing] |= MISSING_FINAL
+    home = np.insert(home, ends[missing], home_final[missing])
+    away = np.insert(away, ends[missing], away_final[missing])
+    rows = np.insert(rows, ends[missing], -1)
+    lengths = lengths + missing
+    last_home = np.where(missing, home_final, last_home)
+    last_away = np.where(missing, away_final, last_away)
+
+    codes[(last_home != home_final) | (last_away != away_final)] |= MISMATCH
+    starts = np.r_[0, np.cumsum(lengths)[:-1]].astype(np.int64)
+    return home, away, rows, starts, codes
+
+
+def _game_starts(scores):
+    """Positions of the first rows of each game; games are contiguous runs
+    of rows with the same url, and event if there is one"""
+    starts = np.zeros(len(scores), dtype=bool)
+    for col in ("event", "url"):
+        if col in scores.columns:
+            values = scores[col].astype(str).values
+            starts[1:] |= values[1:] != values[:-1]
+    if len(scores):
+        starts[0] = True
+    return np.flatnonzero(starts)
+
+
+def repair_scores(scores):
+    """Repair a table of score progressions, as scraped or stored
+
+    Args:
+        scores (pd.DataFrame): Progressions in the layout of
+            USAUResults.score_progressions, each game's rows contiguous;
+            scores may be blank, or text as scraped
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): the repaired progressions, indexed by
+            point within each game, and per game its url (and event) and
+            "repair" code
+    """
+    starts = _game_starts(scores)
+    home, away, rows, new_starts, codes = repair_progressions(
+        pd.to_numeric(scores["home_score"], errors="coerce").values,
+        pd.to_numeric(scores["away_score"], errors="coerce").values,
+        starts,
+        scores["home_final_score"].values[starts],
+        scores["away_final_score"].values[starts])
+
+    # Other columns are constant per game
+    lengths = np.diff(np.r_[new_starts, len(home)]).astype(np.int64)
+    repaired = scores.iloc[np.repeat(starts, lengths)].copy()
+    for col, values in (("home_score", home), ("away_score", away)):
+        dtype = scores[col].dtype
+        repaired[col] = (values.astype(dtype) if pd.api.types.is_integer_dtype(dtype)
+                         else values)
+    repaired.index = np.arange(len(home)) - np.repeat(new_starts, lengths)
+
+    keys = [col for col in ("event", "url") if col in scores.columns]
+    repairs = scores.iloc[starts][keys].reset_index(drop=True)
+    repairs["repair"] = codes
+    return repaired, repairs
+
+
+def repair_archive(archive):
+    """Re-repair the score progressions of a loaded archive, in place
+
+    Args:
+        archive (usau.archive.Archive): With the scores table
+
+    Returns:
+        pd.DataFrame: per game, its event, url and "repair" code
+    """
+    scores, repairs = repair_scores(archive.scores)
+    archive.tables["scores"] = scores.reset_index(drop=True)
+    return repairs
+
+
+def write_archive_scores(archive):
+    """Overwrite each event's scores csv with its archive rows"""
+    from usau.archive import KEYS
+
+    scores = archive.scores
+    events = scores["event"].astype(str).values
+    files = archive.files[archive.files["table"] == "scores"]
+    for event, path in zip(files["event"], files["path"]):
+        df = scores[events == event].drop(list(KEYS), axis=1)
+        starts = _game_starts(df)
+        lengths = np.diff(np.r_[starts, len(df)]).astype(np.int64)
+        df.index = np.arange(len(df)) - np.repeat(starts, lengths)
+        df.to_csv(path, encoding="utf-8")
+        _logger.info("Wrote {n} score rows to {path}".format(n=len(df), path=path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-repair the score progressions of stored events")
+    parser.add_argument("--data_dir", help="Directory of csvs; defaults to usau/data")
+    parser.add_argument("--write", action="store_true",
+                        help="Overwrite the scores csvs with the repaired progressions")
+    parser.add_argument("--log_level", default="INFO",
+                        help="Python logging verbosity level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    from usau.archive import load_archive
+    # Duplicated games are kept, to write every stored row back
+    stored = load_archive(args.data_dir, tables=["scores"], dedupe=False)
+    repairs = repair_archive(stored)
+    print(repairs["repair"].map(describe).value_counts().to_string())
+    if args.write:
+        write_archive_scores(stored)
+        print("Rewrote scores of {n} events".format(n=len(stored.events)))
@@ -5,25 +5,64 @@ Load and clean player/team tournament data from play.usaultimate.org.
 from __future__ import print_function
 
 from collections import OrderedDict
+import datetime
+import functools
 import logging
 import os
 import re
-import sys
 
 from bs4 import BeautifulSoup
 import pandas as pd
 import requests
-from six import string_types  # py2/3 compat
+from six import StringIO, string_types  # py2/3 compat
+
+from usau import (attributes, clean as batch_clean, registry, repair, schema, snapshot,
+                  stream, throttle)
+from usau.urls import GameIndex
 
 _logger = logging.getLogger(__name__)
 
+# Optional usau.throttle.Fetcher through which pages are downloaded
+_fetcher = None
+def set_fetcher(fetcher):
+    """Route page downloads through a (rate-limited) fetcher, or None"""
+    global _fetcher
+    _fetcher = fetcher
+
+
+# usau.registry.EventRegistry used by USAUResults.from_event; built on first use
+_registry = None
+def set_registry(event_registry):
+    """Resolve events through a registry, or None to rebuild the default of
+    the static event table and the cached crawled events"""
+    global _registry
+    _registry = event_registry
+
+
+def event_registry():
+    """The registry used by USAUResults.from_event"""
+    global _registry
+    if _registry is None:
+        _registry = registry.EventRegistry.from_table(USAUResults._EVENT_TO_URL)
+        if os.path.exists(registry.default_cache_path()):
+            _registry.update(registry.EventRegistry.load())
+    return _registry
+
+
+# Table name to the USAUResults property that loads it
+_TABLE_PROPERTIES = {"rosters": "rosters",
+                     "match_reports": "match_reports",
+                     "match_results": "match_results",
+                     "scores": "score_progressions"}
+
 _table_cache = {}
 def memoize_read_html(url, match, header):
     """Memoized wrapper around pandas.read_html"""
     global _table_cache
     key = (url, match, header)
     if key not in _table_cache:
-        _table_cache[key] = pd.read_html(url, match=match, header=header)
+        source = url if _fetcher is None else StringIO(_fetcher.fetch(url))
+        _table_cache[key] = pd.read_html(source, match=match, header=header)
     return _table_cache[key]
 
 
@@ -42,13 +81,65 @@ class PickleSoup(object):
         self.text = soup.text
 
 
+class _BaseTable(object):
+    """Base table attribute of USAUResults; assigning it invalidates the
+    derived views computed from the table"""
+
+    def __init__(self, table):
+        self.table = table
+        self.key = "_{table}_table".format(table=table)
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.__dict__.get(self.key)
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.key] = value
+        obj._table_versions[self.table] = obj._table_versions.get(self.table, 0) + 1
+
+
+def _team_results(results):
+    matches = results.match_results.assign(
+        is_win=lambda df: df["Score"] > df["Opp Score"])
+    # observed: team names are categoricals shared across events
+    gb = matches.groupby("Team", observed=True)
+    return pd.DataFrame(OrderedDict([("Games Played", gb["Score"].count()),
+                                     ("Games Won", gb["is_win"].sum()),
+                                     ("Points Scored", gb["Score"].sum()),
+                                     ("Points Lost", gb["Opp Score"].sum()),
+                                     ("Ds", gb["Ds"].sum()),
+                                     ("Ts", gb["Ts"].sum()),
+                                     ]))
+
+
+def _missing_tallies(results):
+    matches = results.match_results
+    return matches[(matches.Gs < matches.Score) |
+                   (matches.As < matches.Score)]
+
+
 class USAUResults(object):
     """Container and helpers for accessing player statistics on USAU website"""
     BASE_URL = "http://play.usaultimate.org"
 
+    # Base tables, keyed by their names in usau.schema.SCHEMAS
+    roster_dfs = _BaseTable("rosters")
+    match_report_dfs = _BaseTable("match_reports")
+    match_result_dfs = _BaseTable("match_results")
+    score_progression_dfs = _BaseTable("scores")
+
+    # View name -> (function of a USAUResults, names of the tables it reads)
+    _VIEWS = OrderedDict([
+        ("team_results", (_team_results, ("match_results",))),
+        ("missing_tallies", (_missing_tallies, ("match_results",))),
+    ])
+
     def __init__(self, event_info, gender, year,
                  executor=None):
         assert gender in self.__class__._GENDERS
+        self._table_versions = {}  # table -> number of assignments
+        self._views = {}  # view name -> (table versions, function, result)
         self.event_info = event_info
         self.gender = gender
         self.year = year
@@ -74,7 +165,19 @@ class USAUResults(object):
         self.match_result_dfs = None
         self.score_progression_dfs = None
         self.data_dir = None
+        # Cast tables to the compact dtypes of usau.schema, e.g. categorical
+        # team names; opt-in, see load_from_csvs
+        self.compact = False
         self.executor = executor
+        # Resolved while scraping: (href, text) of each team roster link,
+        # and the unique match report urls
+        self.team_links = None
+        self.match_urls = None
+        self._game_index = None
+        self._stream = None  # usau.stream.StreamSink, in streaming mode
+        self._progress = None  # callback(name, stage, done, total)
+        # Where the loaded tables came from, e.g. csvs or a scrape
+        self.provenance = {}
 
     def __str__(self):
         # TODO:
@@ -94,14 +197,96 @@ class USAUResults(object):
                         ))
         return name
 
-    def set_executor(self, mode, max_workers=4):
-        if mode == "thread":
+    def set_executor(self, mode, max_workers=4, adaptive=False):
+        """Scrape rosters and match reports concurrently
+
+        Args:
+            mode (str): "thread" or "process"
+            max_workers (int): Number of workers; with ``adaptive``, the
+                initial number of concurrent requests
+            adaptive (bool): Adjust concurrency to the server's latency and
+                throttling, rate limit requests, and retry failed pages at
+                the end; see :mod:`usau.throttle`. Only for threads.
+        """
+        if adaptive:
+            if mode != "thread":
+                raise ValueError("Adaptive concurrency requires mode='thread'")
+            if not isinstance(_fetcher, throttle.Fetcher):
+                set_fetcher(throttle.Fetcher(throttle.AdaptiveLimiter(
+                    initial=max_workers, maximum=4 * max_workers)))
+            self.executor = throttle.AdaptiveExecutor(_fetcher)
+        elif mode == "thread":
             from concurrent.futures import ThreadPoolExecutor
             self.executor = ThreadPoolExecutor(max_workers=max_workers)
         elif mode == "process":
             from concurrent.futures import ProcessPoolExecutor
             self.executor = ProcessPoolExecutor(max_workers=max_workers)
 
+    def set_progress(self, callback):
+        """Report scraping progress, e.g. to a :class:`usau.pipeline.Progress`
+
+        Args:
+            callback (callable): Called with the event name, the stage
+                ("rosters" or "matches") and the number of pages done and
+                to do, as each scraped page arrives; or None
+        """
+        self._progress = callback
+
+    def _report_progress(self, stage, done, total):
+        if self._progress is not None:
+            self._progress(self._name(), stage, done, total)
+
+    def set_stream(self, path=None, data_dir=None, resume=True, **kwargs):
+        """Stream scraped rosters and match reports to an NDJSON file
+
+        Each scrape is appended to the stream as soon as it finishes, instead
+        of being held in memory, and the tables are compacted from the stream
+        once scraping is done. See :mod:`usau.stream`.
+
+        Args:
+            path (str): Stream file; defaults to {data_dir}/{name}.ndjson
+            resume (bool): Keep records of an existing stream (e.g. from a
+                crashed run) and skip scraping them again; otherwise start over
+            kwargs: Flush settings of :class:`usau.stream.StreamSink`
+        """
+        if path is None:
+            data_dir = data_dir or self.data_dir or os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), "data")
+            path = os.path.join(os.path.expanduser(data_dir), self._name() + ".ndjson")
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        header = {"name": self._name(), "event_info": self.event_info,
+                  "gender": self.gender, "year": int(self.year),
+                  "url": self.event_url}
+        self._stream = stream.StreamSink(path, header=header, **kwargs)
+        return self
+
+    def _load_stream(self, tables):
+        """Assign base tables compacted from the stream"""
+        self._stream.flush()
+        compacted = stream.compact(self._stream.path, tables=tables,
+                                   compact_dtypes=self.compact)
+        for table, attr in snapshot.TABLES:
+            if table in tables:
+                setattr(self, attr, compacted.get(table))
+        self.provenance = {"source": "stream", "path": self._stream.path,
+                           "url": self.event_url,
+                           "scraped": datetime.datetime.utcnow().isoformat() + "Z"}
+
+    def finalize_stream(self):
+        """Compact the stream into the tables, and mark it finished
+
+        Returns:
+            str: path of the stream file
+        """
+        if self._stream is None:
+            raise ValueError("No stream to finalize; see set_stream")
+        self.rosters
+        self.match_reports
+        self._stream.close(end=True)
+        path, self._stream = self._stream.path, None
+        return path
+
     def to_csvs(self, data_dir=None, encoding='utf-8'):
         """Write data to given directory in the form of csv files"""
         if data_dir is None:
@@ -113,7 +298,9 @@ class USAUResults(object):
         base_path = os.path.join(os.path.expanduser(data_dir),
                                  self._name())
 
-        self.rosters.to_csv(
+        # Parsed attributes are derived on load, see usau.attributes
+        self.rosters.drop(list(attributes.ATTRIBUTE_COLUMNS), axis=1,
+                          errors="ignore").to_csv(
             base_path + "_rosters.csv", encoding=encoding)
         self.match_reports.to_csv(
             base_path + "_match_reports.csv", encoding=encoding)
@@ -124,25 +311,55 @@ class USAUResults(object):
 
         print("Finished writing CSVs to {data_dir}".format(data_dir=data_dir))
 
-    def load_from_csvs(self, data_dir=None, mandatory=True, write=True):
-        """Load data from offline csv files"""
+    def _concat(self, frames, table):
+        """Concatenate tables of one kind, in the compact dtypes of
+        :mod:`usau.schema` if :attr:`compact`"""
+        if self.compact:
+            return schema.concat_tables(frames, table)
+        return pd.concat([frame for frame in frames if frame is not None])
+
+    def load_from_csvs(self, data_dir=None, mandatory=True, write=True,
+                       compact=False):
+        """Load data from offline csv files
+
+        Args:
+            compact (bool): Cast columns to the compact dtypes of
+                :mod:`usau.schema`, e.g. categorical team names and urls,
+                also when later scraped tables are concatenated
+        """
+        self.compact = compact
         if data_dir is None:
             data_dir = os.path.join(os.path.dirname(
                 os.path.abspath(__file__)), "data")
         assert isinstance(data_dir, string_types)
         base_path = os.path.join(os.path.expanduser(data_dir),
                                  self._name())
+        legacy_path = os.path.join(os.path.expanduser(data_dir),
+                                   self._legacy_name())
+        if (not os.path.exists(base_path + "_rosters.csv") and
+                os.path.exists(legacy_path + schema._LEGACY_SUFFIXES["rosters"])):
+            return self._load_legacy_csvs(legacy_path, data_dir, compact=compact)
 
         try:
-            self.roster_dfs = pd.read_csv(
+            self.roster_dfs = schema.read_table(
                 base_path + "_rosters.csv")
-            self.match_report_dfs = pd.read_csv(
+            self.match_report_dfs = schema.read_table(
                 base_path + "_match_reports.csv")
-            self.match_result_dfs = pd.read_csv(
+            self.match_result_dfs = schema.read_table(
                 base_path + "_match_results.csv")
-            self.score_progression_dfs = pd.read_csv(
+            self.score_progression_dfs = schema.read_table(
                 base_path + "_scores.csv")
+            if compact:
+                schema.apply_schema(self.roster_dfs, "rosters")
+                schema.apply_schema(self.match_report_dfs, "match_reports")
+                schema.apply_schema(self.match_result_dfs, "match_results")
+                schema.apply_schema(self.score_progression_dfs, "scores")
+            attributes.normalize_rosters(self.roster_dfs)
             self.data_dir = data_dir
+            self._game_index = None
+            self.provenance = {"source": "csv",
+                               "path": os.path.abspath(base_path),
+                               "loaded": datetime.datetime.utcnow().isoformat() + "Z"}
         except IOError:
             print("Unable to open downloaded CSVs at {path}"
                   .format(path=base_path))
@@ -152,12 +369,75 @@ class USAUResults(object):
             raise
         return self
 
+    def _legacy_name(self):
+        """Prefix of csvs written before _name() was adopted"""
+        return "{event}-{gender}".format(event=self.event_full,
+                                         gender=self.gender.capitalize())
+
+    def _load_legacy_csvs(self, legacy_path, data_dir, compact=False):
+        """Load csvs in the legacy naming, which have no score progressions"""
+        for table, attr in snapshot.TABLES:
+            path = legacy_path + schema._LEGACY_SUFFIXES[table]
+            df = schema.read_table(path) if os.path.exists(path) else None
+            if compact and df is not None:
+                schema.apply_schema(df, table)
+            if table == "rosters":
+                attributes.normalize_rosters(df)
+            setattr(self, attr, df)
+        self.data_dir = data_dir
+        self._game_index = None
+        self.provenance = {"source": "csv",
+                           "path": os.path.abspath(legacy_path),
+                           "loaded": datetime.datetime.utcnow().isoformat() + "Z"}
+        return self
+
     @classmethod
     def from_csvs(cls, data_dir=None, *args, **kwargs):
         """Constructor from offline csv data"""
         return (cls.from_event(*args, **kwargs)
                    .load_from_csvs(data_dir=data_dir))
 
+    def to_snapshot(self, path=None, data_dir=None):
+        """Write tables, links and provenance to a binary snapshot file
+
+        See :mod:`usau.snapshot`. By default the snapshot is written next
+        to the csvs, as {data_dir}/{name}.usnap.
+
+        Returns:
+            str: path of the snapshot
+        """
+        # Make sure every table has been loaded or scraped
+        _ = self.rosters, self.match_reports
+        if path is None:
+            path = snapshot.default_path(self, data_dir=data_dir)
+        return snapshot.write_snapshot(self, path)
+
+    def load_snapshot(self, path=None, data_dir=None):
+        """Load tables, links and provenance from a snapshot file
+
+        Numeric and categorical columns are memory-mapped rather than read.
+        """
+        if path is None:
+            path = snapshot.default_path(self, data_dir=data_dir)
+        header, frames = snapshot.read_snapshot(path)
+        for table, attr in snapshot.TABLES:
+            setattr(self, attr, frames.get(table))
+        self.team_links = header["links"]["teams"]
+        self.match_urls = header["links"]["matches"]
+        self._game_index = None
+        self.provenance = dict(header["provenance"], snapshot=os.path.abspath(path))
+        self.data_dir = os.path.dirname(os.path.abspath(path))
+        return self
+
+    @classmethod
+    def from_snapshot(cls, path, **kwargs):
+        """Constructor from a snapshot file, which records the event itself"""
+        header, _ = snapshot.read_header(path)
+        event = header["event"]
+        return (cls(event["event_info"], gender=event["gender"],
+                    year=event["year"], **kwargs)
+                .load_snapshot(path))
+
     @property
     def event_soup(self):
         """BeautifulSoup-parsed HTML from tournament schedule page"""
@@ -166,22 +446,31 @@ class USAUResults(object):
             _logger.info("Downloading from URL: {url}".format(
                 url=self.event_url))
             # page = urllib.urlopen(self.event_url).read().decode('utf-8')
-            request = requests.get(self.event_url)
+            request = (requests.get(self.event_url) if _fetcher is None
+                       else _fetcher.get(self.event_url))
             self.event_page_soup = BeautifulSoup(request.text, "html.parser")
         return self.event_page_soup
 
     @classmethod
-    def _scrape_roster(cls, team_link, verbose=True):
-        """Read overall roster statistics from given URL"""
+    def _scrape_roster(cls, team_link, verbose=True, clean=True):
+        """Read overall roster statistics from given URL
+
+        Args:
+            clean (bool): Split the team name and seed; otherwise "Team" is
+                the raw link text, see :func:`usau.clean.clean_rosters`
+        """
         url = team_link.attrs["href"]
         team = team_link.text
         if verbose:
-            print("Reading roster from url: {url}".format(url=url))
-        name, seed = cls.split_team_seed(team)
+            _logger.info("Reading roster from url: {url}".format(url=url))
         # Match tables containing 'Position', i.e. cutter/handler
         try:
             roster_table = cls.get_html_tables(url, match="Position", header=0)[0]
             roster_table["url"] = url
+            if not clean:
+                roster_table["Team"] = team
+                return roster_table
+            name, seed = cls.split_team_seed(team)
             roster_table["Team"] = name
             roster_table["Seed"] = seed
             if "Name" not in roster_table.columns:
@@ -209,20 +498,43 @@ class USAUResults(object):
                                        attrs={"href": re.compile("EventTeamId")})
         # NOTE: beautifulsoup objects are not pickle-able
         team_links = [PickleSoup(l) for l in team_links]
+        self.team_links = [(l.attrs["href"], l.text) for l in team_links]
+
+        if self._stream is not None:  # Resume after rosters already streamed
+            streamed = self._stream.keys("rosters")
+            team_links = [l for l in team_links if l.attrs["href"] not in streamed]
 
         _logger.info("For {event} reading {n} rosters"
                      .format(event=self, n=len(team_links)))
-        if self.executor is None:  # Run serially
-            rosters = [self._scrape_roster(link) for link in team_links]
+        # Streamed rosters are cleaned as they arrive, others in one batch
+        scrape = functools.partial(self.__class__._scrape_roster,
+                                   clean=self._stream is not None)
+        if isinstance(self.executor, throttle.AdaptiveExecutor):
+            # Roster pages are never empty, so None is a failed download
+            scrape = throttle.retry_none(scrape)
+        scraped = {}  # position in team_links -> roster
+        self._report_progress("rosters", 0, len(team_links))
+        for done, (i, roster) in enumerate(self._scrapes(scrape, team_links)):
+            self._report_progress("rosters", done + 1, len(team_links))
+            if roster is None:
+                continue
+            if self._stream is not None:
+                self._stream.write(team_links[i].attrs["href"], rosters=roster)
+            else:
+                scraped[i] = roster
+        if self._stream is not None:
+            self._load_stream(["rosters"])
         else:
-            rosters = list(self.executor.map(self.__class__._scrape_roster,
-                                             team_links,
-                                             chunksize=5))
-        self.roster_dfs = pd.concat(rosters)
+            self.roster_dfs = self._concat(
+                [batch_clean.clean_rosters([scraped[i] for i in sorted(scraped)])],
+                "rosters")
+            self.provenance = {"source": "scrape", "url": self.event_url,
+                               "scraped": datetime.datetime.utcnow().isoformat() + "Z"}
 
         # idempotent
-        self.roster_dfs["Name"] = self.roster_dfs["Name"].apply(title_name)
+        self.roster_dfs["Name"] = batch_clean.title_names(self.roster_dfs["Name"])
         self.roster_dfs["UpperName"] = self.roster_dfs["Name"].str.upper()
+        attributes.normalize_rosters(self.roster_dfs)
         return self.roster_dfs
 
     @classmethod
@@ -275,8 +587,19 @@ class USAUResults(object):
         return table
 
     @classmethod
-    def _scrape_match(cls, url, verbose=True):
-        print("Reading match report from url: {url}".format(url=url))
+    def _scrape_match(cls, url, verbose=True, clean=True):
+        """Scrape the score progression and player statistics of a game
+
+        Args:
+            clean (bool): Clean the player statistics tables; otherwise they
+                are returned as scraped, with the game's metadata attached,
+                see :func:`usau.clean.clean_match_reports`
+
+        Returns:
+            (pd.DataFrame, pd.DataFrame, pd.DataFrame): match results,
+                match report and score progression; None for empty reports
+        """
+        _logger.info("Reading match report from url: {url}".format(url=url))
         # Score-line, i.e. 1-0 1-1 1-2 1-3 2-3
         scores = cls.get_html_tables(url, match="Total:")[0].T
         assert len(scores.columns) == 2
@@ -295,24 +618,10 @@ class USAUResults(object):
         home_total_score = cls.split_total_score(home_total_score)
         away_total_score = cls.split_total_score(away_total_score)
 
-        # Cleanup score progressions
+        # The header row of team names is the 0-0 state, and the last
+        # row the totals
         scores.iloc[0] = 0
-        scores = scores[:-1].dropna(how='all').fillna(0).astype(int)
-        if scores.iloc[-1].sum() < home_total_score + away_total_score:
-            if scores.iloc[-1].sum() == home_total_score + away_total_score - 1:
-                # Some data entry omits the final point
-                # TODO: do full consistency check for these?
-                scores = scores.append({0: home_total_score,
-                                        1: away_total_score}, ignore_index=True)
-            else:
-                error_message = ("In {url} score progression is not complete: "
-                                 "final scores {score} mismatch {home}-{away}"
-                                 .format(url=url,
-                                         home=home_total_score,
-                                         away=away_total_score,
-                                         score=scores.iloc[-1].values))
-                _logger.warn(error_message)
-                print(error_message, file=sys.stderr)
+        scores = scores[:-1]
 
         # To get the point winners, with 1 for score:
         # scores.diff()[1:].astype(int)
@@ -329,13 +638,28 @@ class USAUResults(object):
         # the final scores!
         scores["home_final_score"] = home_total_score
         scores["away_final_score"] = away_total_score
+        # Blank cells, corrected points, swapped columns and a missing
+        # final point are repaired; see usau.repair
+        scores, repairs = repair.repair_scores(scores)
+        if repairs["repair"].iloc[0] & repair.MISMATCH:
+            _logger.warning("In {url} score progression is not complete: final "
+                            "scores {score} mismatch {home}-{away}".format(
+                                url=url, home=home_total_score, away=away_total_score,
+                                score=scores.iloc[-1][["home_score", "away_score"]].values))
+        if repairs["repair"].iloc[0] & repair.MANY_CORRECTIONS:
+            _logger.warning("In {url} several rows of the score progression "
+                            "were corrected".format(url=url))
 
         # "Players" search string may also pick up sidebar, unfortunately
         # Since the G D A T is in a <tr>, need to give header= explicitly.
         home_roster, away_roster = cls.get_html_tables(
             url, match="Players", header=0)[0:2]
-        home_roster = cls.clean_match_report_stats(home_roster)
-        away_roster = cls.clean_match_report_stats(away_roster)
+        if clean:
+            home_roster = cls.clean_match_report_stats(home_roster)
+            away_roster = cls.clean_match_report_stats(away_roster)
+            goals, assists, ds, turns = "Goals", "Assists", "Ds", "Turns"
+        else:
+            goals, assists, ds, turns = batch_clean.MATCH_REPORT_ALIASES
 
         # Attach metadata for context with the players statistics
         # This can be determined by joining with the match_results table also,
@@ -364,10 +688,10 @@ class USAUResults(object):
             "Opp Score": away_total_score,
             "Seed": home_seed,
             "Opp Seed": away_seed,
-            "Gs": sum(home_roster.Goals),
-            "As": sum(home_roster.Assists),
-            "Ds": sum(home_roster.Ds),
-            "Ts": sum(home_roster.Turns),
+            "Gs": sum(home_roster[goals]),
+            "As": sum(home_roster[assists]),
+            "Ds": sum(home_roster[ds]),
+            "Ts": sum(home_roster[turns]),
         }, {
             "url": url,
             "Team": away_name,
@@ -376,10 +700,10 @@ class USAUResults(object):
             "Opp Score": home_total_score,
             "Seed": away_seed,
             "Opp Seed": home_seed,
-            "Gs": sum(away_roster.Goals),
-            "As": sum(away_roster.Assists),
-            "Ds": sum(away_roster.Ds),
-            "Ts": sum(away_roster.Turns),
+            "Gs": sum(away_roster[goals]),
+            "As": sum(away_roster[assists]),
+            "Ds": sum(away_roster[ds]),
+            "Ts": sum(away_roster[turns]),
         }])
         return (match_results,
                 pd.concat([home_roster, away_roster]),
@@ -397,36 +721,137 @@ class USAUResults(object):
         if self.match_report_dfs is not None:
             return self.match_report_dfs
 
+        self._game_index = GameIndex(self._stream.keys("match_results")
+                                     if self._stream is not None else ())
+        match_results, match_reports, score_progressions = \
+            self._scrape_matches(self._match_links())
+        if self._stream is not None:
+            self._load_stream(["match_reports", "match_results", "scores"])
+            return self.match_report_dfs
+        self.match_report_dfs = self._concat(match_reports, "match_reports")
+        self.match_result_dfs = self._concat(match_results, "match_results")
+        self.score_progression_dfs = self._concat(score_progressions, "scores")
+        return self.match_report_dfs
+
+    @property
+    def game_index(self):
+        """GameIndex of the games loaded so far, by canonical game id"""
+        if self._game_index is None:
+            self._game_index = (GameIndex() if self.match_result_dfs is None
+                                else GameIndex.from_frame(self.match_result_dfs))
+        return self._game_index
+
+    def _scrapes(self, scrape, items):
+        """(position, result) of scrape over items, in the order each
+        finishes on the executor, so that no slow page holds back the others
+
+        Returns:
+            iterator
+        """
+        if self.executor is None:  # Run serially
+            return enumerate(scrape(item) for item in items)
+        if isinstance(self.executor, throttle.AdaptiveExecutor):
+            return self.executor.completed(scrape, items)
+        from concurrent.futures import as_completed
+        futures = dict((self.executor.submit(scrape, item), i)
+                       for i, item in enumerate(items))
+        return ((futures[future], future.result()) for future in as_completed(futures))
+
+    def _match_links(self):
+        """Match report urls linked from the event page, in page order"""
         match_links = self.event_soup.findAll(
             "a", attrs={"href": re.compile("EventGameId")})
+        return [link.attrs["href"] for link in match_links]
+
+    def pool_game_urls(self):
+        """Match report urls linked from the pool play sections of the event
+        page, telling pool games from bracket games between pool mates
+
+        Returns:
+            set: or None if the event page has not been downloaded, e.g. for
+                events loaded from csvs, or lists no pool games
+        """
+        if self.event_page_soup is None:
+            return None
+        urls = set(link.attrs["href"]
+                   for pool in self.event_page_soup.findAll("div", attrs={"class": "pool"})
+                   for link in pool.findAll("a", attrs={"href": re.compile("EventGameId")}))
+        return urls or None
 
-        # NOTE: sometimes scraper can pick up duplicate URLs, so make sure
-        # to unique-ify the URL set.
-        urls = set([link.attrs["href"] for link in match_links])
+    def _scrape_matches(self, urls):
+        """Scrape match reports of games not yet in the game index
+
+        Returns:
+            (list, list, list): per scraped game, match results,
+                match reports and score progressions; empty when streaming
+        """
+        # NOTE: the scraper can pick up the same game under duplicate or
+        # differently encoded URLs, so unique-ify by canonical game id.
+        urls = self.game_index.new_urls(urls)
         _logger.info("For {event} reading {n} reports"
                      .format(event=self, n=len(urls)))
-        if self.executor is None:
-            scrapes = [self._scrape_match(url) for url in urls]
-        else:
-            scrapes = self.executor.map(self.__class__._scrape_match,
-                                        urls,
-                                        chunksize=5)
+        # Streamed reports are cleaned as they arrive, others in one batch
+        scrape = functools.partial(self.__class__._scrape_match,
+                                   clean=self._stream is not None)
+        # Position in urls -> scraped tables, or None once streamed
+        scraped_games = {}
+        self._report_progress("matches", 0, len(urls))
+        for done, (i, scraped) in enumerate(self._scrapes(scrape, urls)):
+            self._report_progress("matches", done + 1, len(urls))
+            if scraped is None:
+                continue
+            if self._stream is not None:
+                match_result, match_report, score_progression = scraped
+                self._stream.write(urls[i], match_results=match_result,
+                                   match_reports=match_report,
+                                   scores=score_progression)
+                scraped = None
+            scraped_games[i] = scraped
 
         match_results = []  # Scores, broken down by player contributions
         match_reports = []  # Just the final scores
         score_progressions = []
-        for scraped in scrapes:
-            if scraped is None:
+        # Games are indexed in the order of the event page, however they finished
+        for i in sorted(scraped_games):
+            self.game_index.add(urls[i])
+            if scraped_games[i] is None:
                 continue
-            match_result, match_report, score_progression = scraped
+            match_result, match_report, score_progression = scraped_games[i]
             match_results.append(match_result)
             match_reports.append(match_report)
             score_progressions.append(score_progression)
+        self.match_urls = list(self.game_index)
+        if match_reports:
+            match_reports = [batch_clean.clean_match_reports(match_reports)]
+        return match_results, match_reports, score_progressions
 
-        self.match_report_dfs = pd.concat(match_reports)
-        self.match_result_dfs = pd.concat(match_results)
-        self.score_progression_dfs = pd.concat(score_progressions)
-        return self.match_report_dfs
+    def refresh_match_reports(self):
+        """Scrape only games not loaded yet, e.g. as a live event progresses
+
+        The event page is re-downloaded, and games already in
+        :attr:`game_index` (under any encoding of their url) are skipped.
+
+        Returns:
+            int: number of newly added games
+        """
+        if self.match_report_dfs is None:
+            self.match_reports
+            return len(self.game_index)
+        self.event_page_soup = None
+        num_games = len(self.game_index)
+        match_results, match_reports, score_progressions = \
+            self._scrape_matches(self._match_links())
+        if self._stream is not None and len(self.game_index) > num_games:
+            self._load_stream(["match_reports", "match_results", "scores"])
+        if not match_results:
+            return len(self.game_index) - num_games
+        self.match_report_dfs = self._concat(
+            [self.match_report_dfs] + match_reports, "match_reports")
+        self.match_result_dfs = self._concat(
+            [self.match_result_dfs] + match_results, "match_results")
+        self.score_progression_dfs = self._concat(
+            [self.score_progression_dfs] + score_progressions, "scores")
+        return len(match_results)
 
     @property
     def match_results(self):
@@ -443,23 +868,45 @@ class USAUResults(object):
     @property
     def missing_tallies(self):
         """Returns pd.DataFrame of matches where goals/assists do not match final result"""
-        results = self.match_results
-        return results[(results.Gs < results.Score) |
-                       (results.As < results.Score)]
+        return self.view("missing_tallies")
 
     @property
     def team_results(self):
         """Returns pd.DataFrame of teams to games played, won, etc"""
-        matches = self.match_results
-        matches["is_win"] = matches["Score"] > matches["Opp Score"]
-        gb = matches.groupby("Team")
-        return pd.DataFrame(OrderedDict([("Games Played", gb["Score"].count()),
-                                         ("Games Won", gb["is_win"].sum()),
-                                         ("Points Scored", gb["Score"].sum()),
-                                         ("Points Lost", gb["Opp Score"].sum()),
-                                         ("Ds", gb["Ds"].sum()),
-                                         ("Ts", gb["Ts"].sum()),
-                                         ]))
+        return self.view("team_results")
+
+    @classmethod
+    def register_view(cls, name, fn, tables=("rosters", "match_reports",
+                                             "match_results", "scores")):
+        """Register a derived view, available on all events via :func:`view`
+
+        Args:
+            name (str): View name; re-registering a name replaces the view
+            fn (callable): Computes the view from a USAUResults. It must not
+                modify the base tables.
+            tables (list[str]): Base tables the view reads (as in
+                usau.schema.SCHEMAS), so it's only recomputed when these change
+        """
+        cls._VIEWS[name] = (fn, tuple(tables))
+
+    def view(self, name):
+        """Derived view, computed once per version of the tables it reads
+
+        The result is shared between callers, so copy it before modifying.
+        """
+        fn, tables = self._VIEWS[name]
+        # Load the tables first, which may themselves be assigned
+        for table in tables:
+            getattr(self, _TABLE_PROPERTIES[table])
+        versions = tuple(self._table_versions.get(table, 0) for table in tables)
+        cached = self._views.get(name)
+        if cached is None or cached[0] != versions or cached[1] is not fn:
+            cached = self._views[name] = (versions, fn, fn(self))
+        return cached[2]
+
+    def invalidate_views(self):
+        """Drop all derived views, e.g. after modifying a base table in place"""
+        self._views.clear()
 
     @classmethod
     def get_html_tables(cls, url, match, header=None):
@@ -508,6 +955,9 @@ class USAUResults(object):
                    **kwargs):
         """Load competition results from human-readable string inputs
 
+        Events are resolved through :func:`event_registry`, so events found
+        by the :mod:`usau.registry` crawler are also available.
+
         Args:
             level (str): One of "club", "d1college", "d3college"
             year (int | str): 20xx
@@ -520,28 +970,15 @@ class USAUResults(object):
         if gender not in cls._GENDERS:
             raise ValueError("Unknown gender input: {gender}"
                              .format(gender=gender))
-        if level.lower() not in cls._NATIONALS_LEVELS:
+        events = event_registry()
+        if level not in events.levels:
             raise ValueError("Unknown competition level: {level}; "
                              "expected one of {choices}"
                              .format(level=level,
-                                     choices=cls._NATIONALS_LEVELS))
-
-        event_info_found = None
-        for event_info in cls._EVENT_TO_URL:
-            assert isinstance(event_info["event"], list)
-            start_year = event_info.get("start_year", None)
-            end_year = event_info.get("end_year", None)
-            if start_year is not None and year < start_year:
-                continue
-            if end_year is not None and year > end_year:
-                continue
-
-            if (level == event_info["level"] and
-                    event in event_info["event"]):
-                event_info_found = event_info
-                break
+                                     choices=events.levels))
 
-        if event_info_found is None:
+        event_info = events.lookup(level, event, year, gender)
+        if event_info is None:
             raise ValueError("Unable to find USAU event for filter: "
                              "level {level} year {year} event {event}"
                              .format(level=level, year=year, event=event))
@@ -0,0 +1,247 @@
+"""
+Compact column dtypes for the rosters, match reports, match results and
+score progression tables.
+
+Low-cardinality strings such as team names, urls and positions are stored
+as categoricals, and per-game statistics, scores and seeds as small integers.
+Categories are drawn from a process-wide, append-only registry per domain
+(e.g. every team-name column shares the "team" domain), so that tables of
+different events and years share identical categorical dtypes and can be
+concatenated without falling back to object columns.
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class Category(object):
+    """Marker for a categorical column whose categories come from a domain"""
+
+    def __init__(self, domain):
+        self.domain = domain
+
+    def __repr__(self):
+        return "Category({domain!r})".format(domain=self.domain)
+
+
+TEAM = Category("team")
+URL = Category("url")
+
+# Table name (as in the csv file suffixes written by USAUResults.to_csvs)
+# to column dtypes. Columns absent from a table are skipped.
+SCHEMAS = {
+    "rosters": OrderedDict([
+        ("No.", np.int16),
+        ("Position", Category("position")),
+        ("Year", Category("year")),
+        ("Height", Category("height")),
+        ("Goals", np.int16),
+        ("Points", np.int16),
+        ("Assists", np.int16),
+        ("Ds", np.int16),
+        ("Turns", np.int16),
+        ("url", URL),
+        ("Team", TEAM),
+        ("Seed", np.int8),
+    ]),
+    "match_reports": OrderedDict([
+        ("No.", np.int16),
+        ("Gs", np.int8),
+        ("Goals", np.int8),
+        ("As", np.int8),
+        ("Assists", np.int8),
+        ("Ds", np.int8),
+        ("Ts", np.int8),
+        ("Turns", np.int8),
+        ("url", URL),
+        ("Team", TEAM),
+        ("Seed", np.int8),
+        ("Score", np.int8),
+        ("Opp Team", TEAM),
+        ("Opp Seed", np.int8),
+        ("Opp Score", np.int8),
+    ]),
+    "match_results": OrderedDict([
+        ("As", np.int16),
+        ("Ds", np.int16),
+        ("Gs", np.int16),
+        ("Ts", np.int16),
+        ("Opp Score", np.int8),
+        ("Opp Seed", np.int8),
+        ("Opponent", TEAM),
+        ("Score", np.int8),
+        ("Seed", np.int8),
+        ("Team", TEAM),
+        ("url", URL),
+    ]),
+    "scores": OrderedDict([
+        ("home_score", np.int8),
+        ("away_score", np.int8),
+        ("url", URL),
+        ("home_team", TEAM),
+        ("away_team", TEAM),
+        ("home_seed", np.int8),
+        ("away_seed", np.int8),
+        ("home_final_score", np.int8),
+        ("away_final_score", np.int8),
+    ]),
+}
+
+
+class CategoryRegistry(object):
+    """Append-only category lists per domain
+
+    Because categories are only ever appended, a column cast with an older
+    dtype of a domain keeps valid codes under any newer one.
+    """
+
+    def __init__(self):
+        self._categories = {}  # domain -> list of values
+        self._indexes = {}  # domain -> value -> code
+        self._dtypes = {}  # domain -> CategoricalDtype of current categories
+        self._lock = threading.Lock()
+
+    def register(self, values, domain):
+        """Add any new (non-null) values to a domain's categories"""
+        if isinstance(values, pd.Series) and hasattr(values, "cat"):
+            values = values.cat.categories
+        values = pd.unique(pd.Series(values).dropna().astype(str).values)
+        with self._lock:
+            categories = self._categories.setdefault(domain, [])
+            index = self._indexes.setdefault(domain, {})
+            new = [v for v in values if v not in index]
+            for value in new:
+                index[value] = len(categories)
+                categories.append(value)
+            if new or domain not in self._dtypes:
+                self._dtypes[domain] = pd.CategoricalDtype(list(categories))
+        return self._dtypes[domain]
+
+    def dtype(self, domain):
+        """Current CategoricalDtype of a domain"""
+        return self._dtypes.get(domain) or self.register([], domain)
+
+    def categorical(self, series, domain):
+        """Cast a series to the domain's current categorical dtype"""
+        self.register(series, domain)
+        dtype = self.dtype(domain)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            if series.dtype == dtype:
+                return series
+            return series.cat.set_categories(dtype.categories)
+        return series.astype(object).where(series.isnull(), series.astype(str)) \
+                     .astype(dtype)
+
+
+registry = CategoryRegistry()
+
+
+def read_table(path):
+    """Read a table csv as written by USAUResults.to_csvs, whose first
+    column is the frame's index, e.g. the point within each game of the
+    score progressions"""
+    return pd.read_csv(path, index_col=0)
+
+
+def _downcast(series, dtype):
+    """Cast to a small integer dtype, if the values allow it
+
+    Columns with missing values are stored as float32 instead, and values
+    out of the dtype's range are left in their wider dtype.
+    """
+    if series.dtype == dtype:
+        return series
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isnull().any():
+        if series.isnull().sum() < values.isnull().sum():
+            return series  # Unparseable strings; leave as is
+        return values.astype(np.float32)
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max or
+                        (values != values.round()).any()):
+        return values
+    return values.astype(dtype)
+
+
+def apply_schema(df, table, registry=registry):
+    """Cast a table's columns to their compact dtypes, in place
+
+    Args:
+        df (pd.DataFrame): One of the rosters, match_reports, match_results
+            or scores tables
+        table (str): Key of :data:`SCHEMAS`
+
+    Returns:
+        pd.DataFrame: df, for chaining
+    """
+    for col, dtype in SCHEMAS[table].items():
+        if col not in df.columns:
+            continue
+        if isinstance(dtype, Category):
+            df[col] = registry.categorical(df[col], dtype.domain)
+        else:
+            df[col] = _downcast(df[col], dtype)
+    return df
+
+
+def concat_tables(frames, table, registry=registry, **kwargs):
+    """Concatenate tables of one kind, e.g. of several events
+
+    Categories of all frames are registered before any are cast, so that
+    every frame ends up with the same categorical dtypes and pd.concat
+    keeps the columns categorical.
+    """
+    frames = [frame for frame in frames if frame is not None]
+    for frame in frames:
+        for col, dtype in SCHEMAS[table].items():
+            if isinstance(dtype, Category) and col in frame.columns:
+                registry.register(frame[col], dtype.domain)
+    frames = [apply_schema(frame, table, registry=registry) for frame in frames]
+    return apply_schema(pd.concat(frames, **kwargs), table, registry=registry)
+
+
+# Files written before USAUResults._name() was adopted
+_LEGACY_SUFFIXES = {
+    "rosters": "-Rosters.csv",
+    "match_reports": "-Match-Reports.csv",
+    "match_results": "-Match-Results.csv",
+    "scores": "-Scores.csv",
+}
+
+
+def memory_report(data_dir=None):
+    """Memory usage of every csv in data_dir, as loaded versus compacted
+
+    Returns:
+        pd.DataFrame: bytes per table kind, with and without the schema
+    """
+    if data_dir is None:
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    report = []
+    for table in SCHEMAS:
+        paths = sorted(glob.glob(os.path.join(data_dir, "*_{t}.csv".format(t=table))) +
+                       glob.glob(os.path.join(data_dir, "*" + _LEGACY_SUFFIXES[table])))
+        if not paths:
+            continue
+        frames = [read_table(path) for path in paths]
+        default = sum(frame.memory_usage(deep=True).sum() for frame in frames)
+        combined = pd.concat(frames, ignore_index=True, sort=False)
+        compact = concat_tables(frames, table, registry=CategoryRegistry(),
+                                ignore_index=True, sort=False)
+        report.append(OrderedDict([
+            ("Table", table),
+            ("Files", len(paths)),
+            ("Rows", len(combined)),
+            ("Default Bytes", default),
+            ("Concat Bytes", combined.memory_usage(deep=True).sum()),
+            ("Compact Bytes", compact.memory_usage(deep=True).sum()),
+        ]))
+    report = pd.DataFrame(report)
+    report["Savings"] = 1 - report["Compact Bytes"] / report["Concat Bytes"]
+    return report
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+"""
+Local JSON HTTP service over loaded tournament data.
+
+Events are loaded once, on first use (or up front with ``--preload``), and
+shared by all request threads. Rendered responses are cached by query and
+by the versions of the events they read, so a refresh of an event's data
+invalidates exactly the responses that depended on it.
+
+Endpoints (GET, JSON responses):
+
+    /events
+    /leaderboard?event=2018_club_nationals_men&event=...&n=25&per_game=1
+        &goal_weight=1&assist_weight=1&d_weight=1&turn_weight=-0.5
+        &keep_team=...&skip_team=...
+    /team_results?event=...
+    /match_results?event=...&team=...
+    /score_progressions?event=...&team=...&url=...
+    /players?name=...&event=...
+    /fantasy?n=20&beta=0.2&captain_multiplier=2
+    /stats
+
+POST /refresh?event=... reloads events from disk (all loaded events if
+none are given).
+
+Example:
+
+    python -m usau.server --port 8000 --preload
+    curl 'localhost:8000/leaderboard?event=2018_club_nationals_men&n=10'
+"""
+from __future__ import print_function
+
+import argparse
+from collections import OrderedDict
+import glob
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from usau import archive, fantasy, snapshot
+from usau.leaderboard import Leaderboard
+from usau.reports import USAUResults
+
+_logger = logging.getLogger(__name__)
+
+# Events of the (only) fantasy contest so far, see usau.fantasy
+FANTASY_EVENTS = ("2016_d1college_nationals_men", "2016_d1college_nationals_women")
+
+
+def _records(df):
+    """JSON-ready list of rows; NaN becomes null"""
+    if df is None:
+        return []
+    return json.loads(df.to_json(orient="records"))
+
+
+class DataStore(object):
+    """Events loaded once and shared between request threads
+
+    Args:
+        data_dir (str): Directory of csvs; defaults to the bundled usau/data
+        snapshots (bool): Load from (and write) binary snapshots next to the
+            csvs, see :mod:`usau.snapshot`
+    """
+
+    def __init__(self, data_dir=None, snapshots=False):
+        self.data_dir = os.path.expanduser(data_dir or archive._default_data_dir())
+        self.snapshots = snapshots
+        self._events = OrderedDict()  # name -> USAUResults
+        self._mtimes = {}  # name -> newest mtime of its source files
+        self._versions = {"*": 0}  # name -> version, "*" for any event
+        self._listeners = []  # called with the names of refreshed events
+        self._loading = {}  # name -> lock held while the event first loads
+        self._lock = threading.RLock()
+
+    def names(self):
+        """Events available in the data directory"""
+        names = list(pd.unique(archive.discover(self.data_dir)["event"].values))
+        with self._lock:
+            return names + [name for name in self._events if name not in names]
+
+    def _source_mtime(self, results):
+        paths = (glob.glob(os.path.join(self.data_dir, results._name() + "_*.csv")) +
+                 glob.glob(os.path.join(self.data_dir, results._legacy_name() + "-*.csv")))
+        return max([os.path.getmtime(path) for path in paths] or [0])
+
+    def _load(self, name):
+        try:
+            year, level, tournament, gender = name.split("_")
+        except ValueError:
+            raise KeyError("Malformed event name: {name}".format(name=name))
+        try:
+            results = USAUResults.from_event(level=level, year=year, gender=gender,
+                                             event=tournament)
+        except ValueError as e:
+            raise KeyError(str(e))
+        mtime = self._source_mtime(results)
+        if not mtime:
+            raise KeyError("No data for event: {name}".format(name=name))
+        path = snapshot.default_path(results, self.data_dir)
+        if self.snapshots and os.path.exists(path) and os.path.getmtime(path) >= mtime:
+            results.load_snapshot(path)
+        else:
+            results.load_from_csvs(self.data_dir)
+            if self.snapshots and results.score_progression_dfs is not None:
+                results.to_snapshot(path)
+        return results, mtime
+
+    def event(self, name):
+        """Loaded USAUResults of an event, loading it on first use
+
+        An event loads under its own lock, so that requests for other events
+        are not held up, and concurrent first requests load it once.
+
+        Raises:
+            KeyError: if the event is unknown or has no data
+        """
+        with self._lock:
+            if name in self._events:
+                return self._events[name]
+            loading = self._loading.setdefault(name, threading.Lock())
+        try:
+            with loading:
+                with self._lock:
+                    if name in self._events:  # Loaded while waiting
+                        return self._events[name]
+                results, mtime = self._load(name)
+                with self._lock:
+                    self._events[name] = results
+                    self._mtimes[name] = mtime
+                    self._versions.setdefault(name, 0)
+                    return results
+        finally:
+            with self._lock:
+                if self._loading.get(name) is loading:
+                    del self._loading[name]
+
+    def preload(self):
+        for name in self.names():
+            self.event(name)
+        return self
+
+    def versions(self, names):
+        with self._lock:
+            return tuple(self._versions.get(name, 0) for name in names)
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def refresh(self, names=None):
+        """Reload events from disk, by default all loaded events
+
+        Returns:
+            list[str]: names of the reloaded events
+        """
+        with self._lock:
+            names = list(self._events) if names is None else list(names)
+        # Load before swapping, so that readers never see a partial event
+        loaded = [(name,) + self._load(name) for name in names]
+        with self._lock:
+            for name, results, mtime in loaded:
+                self._events[name] = results
+                self._mtimes[name] = mtime
+                self._versions[name] = self._versions.get(name, 0) + 1
+            self._versions["*"] += 1
+        _logger.info("Refreshed events: {names}".format(names=names))
+        for listener in self._listeners:
+            listener(names)
+        return names
+
+    def refresh_stale(self):
+        """Reload loaded events whose files changed since they were loaded"""
+        with self._lock:
+            stale = [name for name, results in self._events.items()
+                     if self._source_mtime(results) > self._mtimes[name]]
+        return self.refresh(stale) if stale else []
+
+    def watch(self, interval=30.):
+        """Poll for changed files every ``interval`` seconds, in a thread"""
+        def poll():
+            while not stop.wait(interval):
+                try:
+                    self.refresh_stale()
+                except Exception:
+                    _logger.exception("Failed to refresh changed events")
+        stop = threading.Event()
+        thread = threading.Thread(target=poll)
+        thread.daemon = True
+        thread.start()
+        return stop
+
+
+class ResponseCache(object):
+    """LRU cache of rendered responses
+
+    Concurrent requests for a response that is not yet cached wait for the
+    first of them to render it, rather than each rendering it again.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> response
+        self._pending = {}  # key -> threading.Event, while rendering
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        if key in self._entries:
+            self.hits += 1
+            value = self._entries.pop(key)
+            self._entries[key] = value  # Most recently used
+            return True, value
+        return False, None
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = threading.Event()
+        if pending is not None:
+            pending.wait()
+            with self._lock:
+                found, value = self._lookup(key)
+                if found:
+                    return value
+            # The first request failed; render (and fail) independently
+            return compute()
+        try:
+            value = compute()
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = value
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def invalidate(self, names=None):
+        """Drop responses that read any of the given events (or all)"""
+        with self._lock:
+            if names is None:
+                self._entries.clear()
+                return
+            names = set(names) | {"*"}
+            for key in list(self._entries):
+                if any(name in names for name, _ in key[-1]):
+                    del self._entries[key]
+
+
+def _get(params, name, default=None, type=str):
+    values = params.get(name)
+    if not values:
+        return default
+    return type(values[-1])
+
+
+def _flag(value):
+    return value.lower() in ("1", "true", "yes")
+
+
+class QueryService(object):
+    """Renders endpoint queries to JSON, through a ResponseCache"""
+    ENDPOINTS = ("events", "leaderboard", "team_results", "match_results",
+                 "score_progressions", "players", "fantasy")
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache or ResponseCache()
+        store.add_listener(self.cache.invalidate)
+
+    def dependencies(self, endpoint, params):
+        """Names of the events a query reads"""
+        if endpoint == "events":
+            return ["*"]
+        if endpoint == "fantasy":
+            return list(FANTASY_EVENTS)
+        if endpoint == "players" and not params.get("event"):
+            return ["*"] + self.store.names()
+        return self._event_names(params)
+
+    def query(self, endpoint, params):
+        """JSON response of an endpoint
+
+        Raises:
+            KeyError: for unknown endpoints or events
+            ValueError: for missing or malformed parameters
+        """
+        if endpoint not in self.ENDPOINTS:
+            raise KeyError("Unknown endpoint: {endpoint}".format(endpoint=endpoint))
+        names = self.dependencies(endpoint, params)
+        key = (endpoint,
+               tuple(sorted((k, tuple(v)) for k, v in params.items())),
+               tuple(zip(names, self.store.versions(names))))
+        render = getattr(self, "_" + endpoint)
+        return self.cache.get_or_compute(key, lambda: json.dumps(render(params)))
+
+    def _event_names(self, params, required=True):
+        events = params.get("event", [])
+        if required and not events:
+            raise ValueError("Missing event parameter; see /events")
+        return events
+
+    def _events(self, params):
+        return [{"event": name} for name in self.store.names()]
+
+    def _leaderboard(self, params):
+        leaderboard = Leaderboard(
+            [self.store.event(name) for name in self._event_names(params)],
+            goal_weight=_get(params, "goal_weight", 1, float),
+            assist_weight=_get(params, "assist_weight", 1, float),
+            d_weight=_get(params, "d_weight", 1, float),
+            turn_weight=_get(params, "turn_weight", -0.5, float))
+        tables = leaderboard.tables(
+            num_players=_get(params, "n", 25, int),
+            sort_per_game=_flag(_get(params, "per_game", "0")),
+            keep_teams=params.get("keep_team"),
+            skip_teams=params.get("skip_team"))
+        return OrderedDict((name, _records(table)) for name, table in tables.items())
+
+    def _team_results(self, params):
+        return OrderedDict(
+            (name, _records(self.store.event(name).team_results.reset_index()))
+            for name in self._event_names(params))
+
+    def _match_results(self, params):
+        team = _get(params, "team")
+        response = OrderedDict()
+        for name in self._event_names(params):
+            df = self.store.event(name).match_results
+            if team is not None:
+                df = df[(df["Team"] == team).values]
+            response[name] = _records(df)
+        return response
+
+    def _score_progressions(self, params):
+        team, url = _get(params, "team"), _get(params, "url")
+        response = OrderedDict()
+        for name in self._event_names(params):
+            df = self.store.event(name).score_progressions
+            if df is not None and team is not None:
+                df = df[((df["home_team"] == team) | (df["away_team"] == team)).values]
+            if df is not None and url is not None:
+                df = df[(df["url"] == url).values]
+            response[name] = _records(df)
+        return response
+
+    def _players(self, params):
+        name = _get(params, "name")
+        if not name:
+            raise ValueError("Missing name parameter")
+        events = self._event_names(params, required=False) or self.store.names()
+        response = OrderedDict()
+        for event in events:
+            rosters = self.store.event(event).rosters
+            mask = rosters["Name"].astype(str).str.upper().str.contains(
+                name.upper(), regex=False)
+            if mask.any():
+                response[event] = _records(rosters[mask.values])
+        return response
+
+    def _fantasy(self, params):
+        mens, womens = [self.store.event(name).rosters for name in FANTASY_EVENTS]
+        standings = fantasy.compute_fantasy_contest_results(
+            min_players=_get(params, "n", 20, int),
+            display=False,
+            beta=_get(params, "beta", 0.2, float),
+            captain_multiplier=_get(params, "captain_multiplier", 2, int),
+            mens=mens, womens=womens)
+        return _records(standings)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send(self, status, body):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, respond):
+        try:
+            self._send(200, respond())
+        except KeyError as e:
+            self._send(404, json.dumps({"error": str(e.args[0] if e.args else e)}))
+        except (ValueError, IOError) as e:
+            self._send(400, json.dumps({"error": str(e)}))
+        except Exception as e:
+            _logger.exception("Failed to serve {path}".format(path=self.path))
+            self._send(500, json.dumps({"error": repr(e)}))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.strip("/")
+        params = parse_qs(url.query)
+        service = self.server.service
+        if endpoint == "stats":
+            cache = service.cache
+            return self._dispatch(lambda: json.dumps(
+                {"hits": cache.hits, "misses": cache.misses, "entries": len(cache)}))
+        self._dispatch(lambda: service.query(endpoint, params))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.strip("/") != "refresh":
+            return self._send(404, json.dumps({"error": "Unknown endpoint"}))
+        events = parse_qs(url.query).get("event") or None
+        self._dispatch(lambda: json.dumps(
+            {"refreshed": self.server.service.store.refresh(events)}))
+
+    def log_message(self, format, *args):
+        _logger.debug(format, *args)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server of a QueryService"""
+    daemon_threads = True
+
+    def __init__(self, service, host="127.0.0.1", port=8000):
+        HTTPServer.__init__(self, (host, port), _Handler)
+        self.service = service
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument("--data_dir", help="Path to directory of csvs")
+    parser.add_argument("--preload", action="store_true",
+                        help="Load every event on startup, rather than on first use")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="Load events from binary snapshots, writing them if missing")
+    parser.add_argument("--watch", type=float,
+                        help="Reload events whose csvs changed, every WATCH seconds")
+    parser.add_argument("--log_level", default="INFO",
+                        help="Python logging verbosity level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    store = DataStore(args.data_dir, snapshots=args.snapshots)
+    if args.preload:
+        store.preload()
+    if args.watch:
+        store.watch(args.watch)
+    server = Server(QueryService(store), host=args.host, port=args.port)
+    _logger.info("Serving on http://{host}:{port}".format(host=args.host, port=args.port))
+    server.serve_forever()
@@ -0,0 +1,469 @@
+"""
+Monte Carlo simulation of tournament pools and brackets.
+
+Every simulated game draws a point margin from a normal distribution centered
+on the difference in team strengths, e.g. as fit by :mod:`usau.ratings`.
+Simulations are batched: each game is drawn for all simulations at once as a
+column of a (simulations x games) array, so the cost of a run is a handful of
+numpy operations per pool and bracket round.
+
+Example:
+
+    sim = TournamentSimulator.from_results(usau.reports.club_nats_men_2017,
+                                           ratings=ratings)
+    sim.simulate(100000, seed=0).summary()
+
+Pools, and which played games were pool rather than bracket games, are taken
+from :class:`usau.pickem.Bracket`, which rebuilds them from the graph of the
+games played.
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import logging
+
+import numpy as np
+import pandas as pd
+
+_logger = logging.getLogger(__name__)
+
+# Bracket rounds by number of teams remaining
+_ROUND_NAMES = OrderedDict([(1, "Champion"), (2, "Finals"), (4, "Semis"),
+                            (8, "Quarters"), (16, "Prequarters")])
+
+
+def snake_pools(teams, num_pools):
+    """Split teams (ordered by seed) into pools by snake seeding
+
+    For 16 teams and 4 pools, pool A is seeds 1, 8, 9 and 16.
+    """
+    pools = [[] for _ in range(num_pools)]
+    for i, team in enumerate(teams):
+        lap, offset = divmod(i, num_pools)
+        pools[offset if lap % 2 == 0 else num_pools - 1 - offset].append(team)
+    return pools
+
+
+def bracket_order(size):
+    """Seed numbers (1-based) by bracket position, e.g. [1, 8, 4, 5, 2, 7, 3, 6]
+
+    Adjacent positions meet in the first round; higher seeds play the lowest
+    remaining seeds and the top two seeds can only meet in the final.
+    """
+    order = [1]
+    while len(order) < size:
+        n = 2 * len(order)
+        order = [s for seed in order for s in (seed, n + 1 - seed)]
+    return order
+
+
+def strengths_from_seeds(seeds, points_per_seed=0.4):
+    """Team strengths (in points) that are linear in seed"""
+    seeds = np.asarray(seeds, dtype=float)
+    return -points_per_seed * (seeds - seeds.mean())
+
+
+def played_games(results):
+    """An event's match results in the order of its event page, which lists
+    pool games before bracket games, and the urls of its pool games
+
+    Unreported scores (blank, or tied such as 0-0) are taken from the last
+    point of the game's score progression, where it has one; e.g. the 2018
+    club men's final is 0-0 in its match results.
+
+    Args:
+        results (usau.reports.USAUResults): Event
+
+    Returns:
+        (pd.DataFrame, set): match results, and pool game urls as from
+            USAUResults.pool_game_urls, or None
+    """
+    played = results.match_results
+    if results.match_urls:
+        position = {url: i for i, url in enumerate(results.match_urls)}
+        order = [position.get(url, len(position)) for url in played["url"]]
+        played = played.iloc[np.argsort(order, kind="mergesort")]
+
+    scores = results.score_progressions
+    unreported = (played["Score"].isnull() | played["Opp Score"].isnull() |
+                  (played["Score"] == played["Opp Score"])).values
+    if unreported.any() and scores is not None and len(scores):
+        last = scores.drop_duplicates(subset=["url"], keep="last").set_index("url")
+        last = last.reindex(played["url"].values)
+        home = played["Team"].astype(str).values == last["home_team"].astype(str).values
+        score = np.where(home, last["home_score"].values, last["away_score"].values)
+        opp_score = np.where(home, last["away_score"].values, last["home_score"].values)
+        with np.errstate(invalid="ignore"):
+            fill = unreported & (score != opp_score) & ~pd.isnull(score + opp_score)
+        if fill.any():
+            played = played.assign(**{
+                "Score": np.where(fill, score, played["Score"].values),
+                "Opp Score": np.where(fill, opp_score, played["Opp Score"].values)})
+    return played, results.pool_game_urls()
+
+
+def rank_pool(teams, a, b, margin):
+    """Order of finish of a played pool, by USA Ultimate's tiebreakers
+
+    Teams are ranked by wins, then teams tied on wins by their wins and then
+    their point differential in the games between them, starting over with
+    any subset still tied; remaining ties go by overall point differential,
+    then seed.
+
+    Args:
+        teams (list[int]): Team indices of the pool, in seed order
+        a, b (np.ndarray): Team indices of the pool games
+        margin (np.ndarray): Margin of a over b per game
+
+    Returns:
+        list[int]: Team indices, first place first
+    """
+    teams = list(teams)
+    n = max(teams + list(a) + list(b)) + 1 if teams else 0
+
+    def record(group):
+        mask = np.isin(a, group) & np.isin(b, group)
+        wins = (np.bincount(a[mask], margin[mask] > 0, minlength=n) +
+                np.bincount(b[mask], margin[mask] < 0, minlength=n))
+        diff = (np.bincount(a[mask], margin[mask], minlength=n) -
+                np.bincount(b[mask], margin[mask], minlength=n))
+        return wins, diff
+
+    wins, overall = record(teams)
+
+    def order(group, keys):
+        """Group ordered by keys, each a per team array, breaking ties
+        among the teams left tied by head to head"""
+        for key in keys:
+            levels = sorted(set(key[group]), reverse=True)
+            if len(levels) > 1:
+                ranked = []
+                for level in levels:
+                    tied = [t for t in group if key[t] == level]
+                    ranked += order(tied, record(tied)) if len(tied) > 1 else tied
+                return ranked
+        return sorted(group, key=lambda t: (-overall[t], teams.index(t)))
+
+    return order(teams, (wins,))
+
+
+def pool_game_mask(urls, a, b, pool, pool_urls=None):
+    """Which games are pool games, as opposed to bracket games
+
+    Only games between pool mates can be pool games. Given ``pool_urls``,
+    they are the games listed there; otherwise the first meeting of a pair
+    is its pool game, so games must be in the order played, e.g. as from
+    :func:`played_games`.
+
+    Args:
+        urls (array-like): Match report url per game
+        a, b (np.ndarray): Team indices per game
+        pool (np.ndarray): Pool per team index, -1 for teams in none
+        pool_urls (set): Urls of pool games
+
+    Returns:
+        np.ndarray: bool per game
+    """
+    mates = (pool[a] == pool[b]) & (pool[a] >= 0)
+    if pool_urls is not None:
+        return mates & np.array([url in pool_urls for url in urls], dtype=bool)
+    pairs = np.minimum(a, b) * len(pool) + np.maximum(a, b)
+    first = np.zeros(len(pairs), dtype=bool)
+    first[np.unique(pairs, return_index=True)[1]] = True
+    return mates & first
+
+
+def _simulate_chunk(sim, num_sims, seed_seq):
+    """Run one batch of simulations; module-level so it pickles to workers"""
+    return sim._simulate(num_sims, np.random.default_rng(seed_seq))
+
+
+class SimulationResult(object):
+    """Counts of simulated outcomes per team
+
+    Attributes:
+        num_sims (int): Number of simulations
+        place_counts (np.ndarray): (teams x pool size) counts of pool finishes
+        round_counts (np.ndarray): (teams x rounds) counts of reaching each
+            bracket round, ordered as :attr:`rounds`
+        wins (np.ndarray): Total pool wins per team over all simulations
+    """
+
+    def __init__(self, teams, rounds, num_sims, place_counts, round_counts, wins):
+        self.teams = teams
+        self.rounds = rounds
+        self.num_sims = num_sims
+        self.place_counts = place_counts
+        self.round_counts = round_counts
+        self.wins = wins
+
+    def __add__(self, other):
+        return SimulationResult(self.teams, self.rounds,
+                                self.num_sims + other.num_sims,
+                                self.place_counts + other.place_counts,
+                                self.round_counts + other.round_counts,
+                                self.wins + other.wins)
+
+    def summary(self):
+        """Returns pd.DataFrame of per-team outcome probabilities"""
+        columns = OrderedDict([("Team", self.teams),
+                               ("Pool Wins", self.wins / self.num_sims)])
+        for place in range(self.place_counts.shape[1]):
+            columns["Pool #{n}".format(n=place + 1)] = \
+                self.place_counts[:, place] / self.num_sims
+        for i, name in enumerate(self.rounds):
+            columns[name] = self.round_counts[:, i] / self.num_sims
+        df = pd.DataFrame(columns)
+        return df.sort_values(self.rounds[::-1], ascending=False).reset_index(drop=True)
+
+
+def seeded_layout(num_pools, advance):
+    """Bracket positions seeded by pool finish, then pool order
+
+    Returns:
+        list: Per bracket position, the (pool, pool finish) of its team,
+            both 0-based, or None for a bye; as :func:`bracket_order`
+    """
+    size = 1
+    while size < num_pools * advance:
+        size *= 2
+    return [(seed % num_pools, seed // num_pools) if seed < num_pools * advance else None
+            for seed in (s - 1 for s in bracket_order(size))]
+
+
+class TournamentSimulator(object):
+    """Simulate pool play followed by a single-elimination bracket
+
+    The top ``advance`` teams of each pool enter a bracket, by default seeded
+    by pool finish, then by pool order; so with four pools of four and
+    ``advance=3`` the pool winners receive byes into quarterfinals, as at
+    USAU nationals. Pools whose games have all been played finish in their
+    actual order, by :func:`rank_pool`.
+
+    Args:
+        pools (list[list[str]]): Team names by pool, each in seed order
+        strengths (dict): Team name to strength, in points
+        sigma (float): Standard deviation of a game's point margin
+        advance (int): Number of teams per pool that enter the bracket
+        played (pd.DataFrame): Games already played, as in
+            :attr:`usau.reports.USAUResults.match_results`; these keep their
+            actual results in every simulation.
+        pool_urls (set): Urls of the played pool games; see
+            :func:`pool_game_mask`
+        bracket (list): Per bracket position, the (pool, pool finish) of its
+            team or None for a bye, as from :meth:`usau.pickem.Bracket.layout`;
+            by default :func:`seeded_layout`
+    """
+
+    def __init__(self, pools, strengths, sigma=4.0, advance=3, played=None,
+                 pool_urls=None, bracket=None):
+        self.pools = [list(pool) for pool in pools]
+        self.teams = [team for pool in self.pools for team in pool]
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        self.strengths = np.array([strengths.get(team, 0.) for team in self.teams],
+                                  dtype=float)
+        self.sigma = sigma
+        self.advance = advance
+
+        # Round robin game list per pool
+        self.pool_games = []
+        for pool in self.pools:
+            ids = [self.team_index[team] for team in pool]
+            self.pool_games.append(np.array(
+                [(a, b) for i, a in enumerate(ids) for b in ids[i + 1:]],
+                dtype=np.int64).reshape(-1, 2))
+
+        n = len(self.teams)
+        self.num_bracket = advance * len(self.pools)
+        self.bracket = list(bracket or seeded_layout(len(self.pools), advance))
+        self.bracket_size = len(self.bracket)
+        entrants = [tuple(slot) for slot in self.bracket if slot is not None]
+        expected = set((p, place) for p in range(len(self.pools)) for place in range(advance))
+        if (self.bracket_size & (self.bracket_size - 1) or
+                len(entrants) != len(expected) or set(entrants) != expected):
+            raise ValueError("Bracket layout must place the top {advance} of each pool "
+                             "once in a power of two positions".format(advance=advance))
+        self.rounds = [name for size, name in _ROUND_NAMES.items()
+                       if size <= self.bracket_size][::-1]
+        # Actual margins of played games, NaN where not yet played. Bracket
+        # games between the same pair take the last result.
+        self.pool_margins = np.full((n, n), np.nan)
+        self.bracket_margins = np.full((n, n), np.nan)
+        # Local finish order of each pool whose games have all been played
+        self.pool_orders = [None] * len(self.pools)
+        if played is not None:
+            self._fix_played(played, pool_urls)
+
+    def _fix_played(self, played, pool_urls=None):
+        games = played.dropna(subset=["Score", "Opp Score"])
+        # 0-0 and other tied results are unreported games
+        games = games[games["Score"].values != games["Opp Score"].values]
+        games = games.drop_duplicates(subset=["url"])
+        known = np.array([team in self.team_index and opp in self.team_index
+                          for team, opp in zip(games["Team"], games["Opponent"])],
+                         dtype=bool)
+        for team, opp in zip(games["Team"][~known], games["Opponent"][~known]):
+            _logger.warning("Ignoring game between unknown teams: "
+                            "{team} vs {opp}".format(team=team, opp=opp))
+        games = games[known]
+        a = np.array([self.team_index[team] for team in games["Team"]], dtype=np.int64)
+        b = np.array([self.team_index[opp] for opp in games["Opponent"]], dtype=np.int64)
+        margin = (games["Score"].values - games["Opp Score"].values).astype(float)
+        pool = np.repeat(np.arange(len(self.pools)), [len(p) for p in self.pools])
+        urls = games["url"].values
+        is_pool = pool_game_mask(urls, a, b, pool, pool_urls)
+        if pool_urls is not None:
+            for i in np.flatnonzero((pool[a] != pool[b]) &
+                                    np.array([url in pool_urls for url in urls], dtype=bool)):
+                _logger.warning("Pool game {url} is between {team} and {opp} of different "
+                                "pools; taking it as a bracket game".format(
+                                    url=urls[i], team=self.teams[a[i]], opp=self.teams[b[i]]))
+        for i in range(len(a)):
+            margins = self.pool_margins if is_pool[i] else self.bracket_margins
+            margins[a[i], b[i]], margins[b[i], a[i]] = margin[i], -margin[i]
+
+        unplayed = 0
+        for p, pairs in enumerate(self.pool_games):
+            if not len(pairs):
+                continue
+            pool_margin = self.pool_margins[pairs[:, 0], pairs[:, 1]]
+            if np.isnan(pool_margin).any():
+                unplayed += int(np.isnan(pool_margin).sum())
+                continue
+            ids = [self.team_index[team] for team in self.pools[p]]
+            order = rank_pool(ids, pairs[:, 0], pairs[:, 1], pool_margin)
+            self.pool_orders[p] = np.array([ids.index(team) for team in order])
+        if unplayed and (~np.isnan(self.bracket_margins)).any():
+            _logger.warning("{n} pool games are unplayed though bracket games have "
+                            "been; check the pools".format(n=unplayed))
+
+    @classmethod
+    def from_results(cls, results, ratings=None, pools=None, num_pools=4,
+                     points_per_seed=0.4, **kwargs):
+        """Constructor from a (possibly partially played) USAUResults event
+
+        Args:
+            results (usau.reports.USAUResults): Event; its match results so far
+                are fixed in every simulation, with pool games told apart
+                by :func:`played_games`.
+            ratings (usau.ratings.TeamRatings): Source of team strengths;
+                by default strengths are linear in seed.
+            pools (list[list[str]]): Pool assignments; by default inferred
+                from the games played, see :func:`usau.pickem.infer_pools`.
+
+        The bracket layout defaults to that of the games played, once the
+        bracket is complete. Placement games are not simulated and dropped.
+        """
+        from usau.pickem import Bracket
+
+        seeds = (results.rosters[["Team", "Seed"]]
+                 .drop_duplicates(subset=["Team"])
+                 .sort_values("Seed"))
+        teams = list(seeds["Team"].astype(str))
+        played, pool_urls = played_games(results)
+        bracket = Bracket(played, teams, pools=pools, num_pools=num_pools,
+                          advance=kwargs.get("advance", 3), pool_urls=pool_urls)
+        pools = bracket.pools
+        kwargs.setdefault("bracket", bracket.layout())
+        if ratings is not None:
+            division = "{level}_{gender}".format(level=results.event_info["level"],
+                                                 gender=results.gender)
+            strengths = {team: ratings.rating(team, division=division)
+                         for team in teams}
+            strengths = {team: (0. if np.isnan(rating) else rating)
+                         for team, rating in strengths.items()}
+        else:
+            strengths = dict(zip(teams, strengths_from_seeds(
+                seeds["Seed"].values, points_per_seed=points_per_seed)))
+        played = played[played["url"].isin(bracket.pool_urls | bracket.bracket_urls).values]
+        return cls(pools, strengths, played=played, pool_urls=bracket.pool_urls, **kwargs)
+
+    def _play(self, rng, a, b, fixed):
+        """Margins of a over b for arrays of team indices, shape (sims, games)"""
+        margins = rng.normal(self.strengths[a] - self.strengths[b], self.sigma)
+        actual = fixed[a, b]
+        return np.where(np.isnan(actual), margins, actual)
+
+    def _simulate(self, num_sims, rng):
+        n = len(self.teams)
+        pool_size = max(len(pool) for pool in self.pools)
+        place_counts = np.zeros((n, pool_size), dtype=np.int64)
+        round_counts = np.zeros((n, len(self.rounds)), dtype=np.int64)
+        wins = np.zeros(n, dtype=np.int64)
+
+        # Bracket position by (pool, pool finish)
+        position = {tuple(slot): i for i, slot in enumerate(self.bracket) if slot is not None}
+        slots = np.full((num_sims, self.bracket_size), -1, dtype=np.int64)
+        for p, (pool, games) in enumerate(zip(self.pools, self.pool_games)):
+            ids = np.array([self.team_index[team] for team in pool])
+            local = {team: i for i, team in enumerate(ids)}
+            pool_wins = np.zeros((num_sims, len(ids)))
+            pool_diff = np.zeros((num_sims, len(ids)))
+            if len(games):
+                a, b = games[:, 0], games[:, 1]
+                margins = self._play(rng, np.broadcast_to(a, (num_sims, len(a))),
+                                     np.broadcast_to(b, (num_sims, len(b))),
+                                     self.pool_margins)
+                # Incidence matrix of pool games to (local) teams
+                incidence = np.zeros((len(a), len(ids)))
+                incidence[np.arange(len(a)), [local[i] for i in a]] = 1
+                incidence[np.arange(len(b)), [local[i] for i in b]] = -1
+                pool_wins = ((margins > 0) @ (incidence > 0).astype(float) +
+                             (margins < 0) @ (incidence < 0).astype(float))
+                pool_diff = margins @ incidence
+            if self.pool_orders[p] is not None:
+                finish = np.broadcast_to(self.pool_orders[p], pool_wins.shape)
+            else:
+                # Rank on wins, then point differential, then coin flip
+                key = (pool_wins * 1e4 + pool_diff +
+                       rng.uniform(0, 1e-3, size=pool_wins.shape))
+                finish = np.argsort(-key, axis=1)  # (sims, pool) local team indices
+            for place in range(len(ids)):
+                place_counts[:, place] += np.bincount(ids[finish[:, place]],
+                                                      minlength=n)
+                if place < self.advance:
+                    slots[:, position[(p, place)]] = ids[finish[:, place]]
+            np.add.at(wins, ids, pool_wins.sum(axis=0).astype(np.int64))
+
+        for r in range(len(self.rounds)):
+            present = slots[slots >= 0]
+            round_counts[:, r] += np.bincount(present, minlength=n)
+            if slots.shape[1] == 1:
+                break
+            a, b = slots[:, 0::2], slots[:, 1::2]
+            bye = (a < 0) | (b < 0)
+            margins = self._play(rng, np.maximum(a, 0), np.maximum(b, 0),
+                                 self.bracket_margins)
+            slots = np.where(bye, np.maximum(a, b), np.where(margins > 0, a, b))
+        return SimulationResult(self.teams, self.rounds, num_sims,
+                                place_counts, round_counts, wins)
+
+    def simulate(self, num_sims=100000, seed=None, executor=None,
+                 chunk_size=10000):
+        """Simulate the remainder of the tournament
+
+        Args:
+            num_sims (int): Number of simulations
+            seed (int | None): Seed for reproducibility. Simulations are run
+                in chunks with independent child seeds, so results do not
+                depend on whether an executor is used.
+            executor (concurrent.futures.Executor): Optionally run chunks
+                concurrently, e.g. a ProcessPoolExecutor across cores
+            chunk_size (int): Number of simulations per chunk
+
+        Returns:
+            SimulationResult: counts of pool finishes and bracket rounds
+        """
+        sizes = [chunk_size] * (num_sims // chunk_size)
+        if num_sims % chunk_size:
+            sizes.append(num_sims % chunk_size)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        if executor is None:
+            chunks = [_simulate_chunk(self, size, s) for size, s in zip(sizes, seeds)]
+        else:
+            chunks = list(executor.map(_simulate_chunk, [self] * len(sizes),
+                                       sizes, seeds))
+        result = chunks[0]
+        for chunk in chunks[1:]:
+            result = result + chunk
+        return result
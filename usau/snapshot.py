@@ -0,0 +1,187 @@
+"""
+Binary snapshots of a USAUResults event, for near-instant reloading.
+
+A snapshot is a single file holding the event metadata, the team and match
+links resolved while scraping, cache provenance, and the rosters, match
+reports, match results and score progression tables with their dtypes.
+
+Layout::
+
+    b"USAUSNAP" | uint64 header length | JSON header | column buffers
+
+Every column buffer starts on a 64-byte boundary. Numeric columns are
+stored as raw arrays and categorical columns as their integer codes, with
+categories kept in the header; so on load these columns are zero-copy views
+into a copy-on-write memory map of the file. Pages are only read as columns
+are touched, and processes loading the same snapshot share them until they
+write. String columns are stored as codes into their unique values, and are
+materialized on load.
+"""
+from __future__ import division, print_function
+
+import datetime
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"USAUSNAP"
+VERSION = 1
+_ALIGN = 64
+# Attribute of USAUResults holding each table
+TABLES = [("rosters", "roster_dfs"),
+          ("match_reports", "match_report_dfs"),
+          ("match_results", "match_result_dfs"),
+          ("scores", "score_progression_dfs")]
+
+
+def _pad(n):
+    return (-n) % _ALIGN
+
+
+def _encode_column(values):
+    """Split a column into (spec, buffer); spec is JSON-serializable"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        return ({"kind": "categorical",
+                 "categories": [_to_json(c) for c in categories],
+                 "categories_dtype": str(categories.dtype),
+                 "ordered": bool(values.cat.ordered),
+                 "dtype": values.cat.codes.dtype.str},
+                np.ascontiguousarray(values.cat.codes.values))
+    if values.dtype.kind in "biufcmM":
+        array = np.ascontiguousarray(values.values)
+        return {"kind": "numeric", "dtype": array.dtype.str}, array
+    # Strings (and any other objects): codes into the unique values
+    codes, uniques = pd.factorize(values)  # -1 for missing values
+    return ({"kind": "string",
+             "categories": [_to_json(u) for u in uniques],
+             "pandas_dtype": str(values.dtype),
+             "dtype": np.dtype(np.int32).str},
+            codes.astype(np.int32))
+
+
+def _to_json(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating,)):
+        return float(value)
+    return value
+
+
+def write_snapshot(results, path, provenance=None):
+    """Write a USAUResults' tables and metadata to a snapshot file
+
+    Args:
+        results (usau.reports.USAUResults): Event with data already loaded
+        path (str): Destination file
+        provenance (dict): Extra provenance fields to record
+
+    Returns:
+        str: path
+    """
+    header = {
+        "version": VERSION,
+        "event": {"event_info": results.event_info,
+                  "gender": results.gender,
+                  "year": int(results.year)},
+        "links": {"teams": results.team_links,
+                  "matches": results.match_urls},
+        "provenance": dict(results.provenance or {}, **(provenance or {})),
+        "tables": {},
+    }
+    header["provenance"]["snapshot_created"] = \
+        datetime.datetime.utcnow().isoformat() + "Z"
+
+    buffers = []
+    offset = 0
+    for table, attr in TABLES:
+        df = getattr(results, attr)
+        if df is None:
+            continue
+        columns = []
+        for name, values in ([("__index__", df.index.to_series())] +
+                             list(df.items())):
+            spec, buf = _encode_column(values)
+            spec["name"] = name
+            spec["offset"] = offset
+            spec["length"] = len(buf)
+            columns.append(spec)
+            buffers.append(buf)
+            offset += buf.nbytes + _pad(buf.nbytes)
+        header["tables"][table] = {"columns": columns, "rows": len(df)}
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix = len(MAGIC) + 8 + len(header_bytes)
+    header_bytes += b" " * _pad(prefix)
+    with open(path, "wb") as fd:
+        fd.write(MAGIC)
+        fd.write(struct.pack("<Q", len(header_bytes)))
+        fd.write(header_bytes)
+        for buf in buffers:
+            fd.write(buf.tobytes())
+            fd.write(b"\0" * _pad(buf.nbytes))
+    return path
+
+
+def read_header(path):
+    """Read a snapshot's JSON header, without touching the column data
+
+    Returns:
+        (dict, int): header and the file offset at which column data starts
+    """
+    with open(path, "rb") as fd:
+        if fd.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a USAU snapshot: {path}".format(path=path))
+        length, = struct.unpack("<Q", fd.read(8))
+        header = json.loads(fd.read(length).decode("utf-8"))
+    if header["version"] != VERSION:
+        raise ValueError("Unsupported snapshot version {v} in {path}"
+                         .format(v=header["version"], path=path))
+    return header, len(MAGIC) + 8 + length
+
+
+def _decode_column(spec, data):
+    if spec["length"] == 0:
+        array = np.zeros(0, dtype=spec["dtype"])
+    else:
+        array = np.frombuffer(data, dtype=spec["dtype"], count=spec["length"],
+                              offset=spec["offset"])
+    if spec["kind"] == "numeric":
+        return array
+    categories = pd.Index(spec["categories"], dtype=(
+        spec.get("categories_dtype") if spec["kind"] == "categorical" else object))
+    if spec["kind"] == "categorical":
+        return pd.Categorical.from_codes(
+            array, dtype=pd.CategoricalDtype(categories, ordered=spec["ordered"]))
+    values = categories.take(array, allow_fill=True, fill_value=np.nan)
+    return pd.Series(values, copy=False).astype(spec["pandas_dtype"]).values
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot file
+
+    Returns:
+        (dict, dict): header, and table name to pd.DataFrame
+    """
+    header, start = read_header(path)
+    frames = {}
+    if not header["tables"]:
+        return header, frames
+    # Copy-on-write: pages are shared between processes until modified
+    data = np.memmap(path, dtype=np.uint8, mode="c", offset=start)
+    for table, spec in header["tables"].items():
+        columns = [(c["name"], _decode_column(c, data)) for c in spec["columns"]]
+        index = pd.Index(columns[0][1], copy=False)
+        frames[table] = pd.DataFrame(dict(columns[1:]), index=index, copy=False)
+    return header, frames
+
+
+def default_path(results, data_dir=None):
+    """Snapshot path next to an event's csvs, i.e. {data_dir}/{name}.usnap"""
+    if data_dir is None:
+        data_dir = results.data_dir or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "data")
+    return os.path.join(os.path.expanduser(data_dir), results._name() + ".usnap")
@@ -0,0 +1,255 @@
+"""
+Append-only NDJSON streams of scraped records.
+
+In streaming mode (see :func:`usau.reports.USAUResults.set_stream`), each
+scraped roster and match report is appended to a stream file as soon as it
+arrives, rather than being held in memory until the whole event has been
+scraped. So a crash loses at most the unflushed records, a rerun resumes
+where the last one stopped, and other processes can :func:`tail` the stream
+during a live event.
+
+Every line is a JSON object, one of:
+
+    {"header": {...event metadata...}, "time": ...}
+    {"key": url, "tables": {table: {"columns": .., "index": .., "data": ..}},
+     "time": ...}
+    {"end": true, "time": ...}
+
+where each table is a DataFrame in pandas' "split" JSON orientation.
+:func:`compact` folds a stream back into the standard tables; if a key was
+written more than once, e.g. a game re-scraped by a refresh, the last
+record wins.
+"""
+from __future__ import division, print_function
+
+from collections import OrderedDict
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from usau import schema
+
+_logger = logging.getLogger(__name__)
+
+_clock = getattr(time, "monotonic", time.time)
+
+
+def _now():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def _parse(line):
+    """Decoded record of a line, or None for an incomplete or corrupt line"""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _truncate_partial(path):
+    """Drop an incomplete last line, e.g. after a crash mid-write, so that
+    appended records start on a line of their own"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as fd:
+        fd.seek(0, os.SEEK_END)
+        size = end = fd.tell()
+        while end > 0:
+            fd.seek(max(0, end - 4096))
+            chunk = fd.read(end - max(0, end - 4096))
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                end = max(0, end - 4096) + newline + 1
+                break
+            end = max(0, end - 4096)
+        if end < size:
+            _logger.warning("Truncating incomplete record at the end of {path}"
+                            .format(path=path))
+            fd.truncate(end)
+
+
+class StreamSink(object):
+    """Thread-safe append-only writer of a stream file
+
+    Args:
+        path (str): Stream file; appended to if it exists
+        header (dict): Metadata written at the start of a new stream
+        flush_every (int): Flush after this many unflushed records
+        flush_interval (float): Flush a write if this many seconds have
+            passed since the last flush
+        fsync (bool): Also fsync on each flush, to survive power loss
+    """
+
+    def __init__(self, path, header=None, flush_every=10, flush_interval=1.,
+                 fsync=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._keys = {}  # table -> keys written so far, including earlier runs
+        _truncate_partial(path)
+        for record in read_records(path):
+            for table in record["tables"]:
+                self._keys.setdefault(table, set()).add(record["key"])
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        self._fd = open(path, "a")
+        self._pending = 0
+        self._last_flush = _clock()
+        self._lock = threading.Lock()
+        if new:
+            self._write_line(json.dumps({"header": header or {}, "time": _now()}))
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self, table):
+        """Keys (e.g. urls) already written with a given table"""
+        with self._lock:
+            return set(self._keys.get(table, ()))
+
+    def _write_line(self, line):
+        self._fd.write(line)
+        self._fd.write("\n")
+
+    def write(self, key, **tables):
+        """Append one record, e.g. all the tables scraped from one url
+
+        Args:
+            key (str): Record key, such as the scraped url
+            tables (pd.DataFrame): Tables by name, e.g. rosters=df
+        """
+        # Tables are serialized by pandas, which handles numpy types and NaN
+        line = '{{"key": {key}, "time": {time}, "tables": {{{tables}}}}}'.format(
+            key=json.dumps(key), time=json.dumps(_now()),
+            tables=", ".join("{name}: {df}".format(name=json.dumps(name),
+                                                   df=df.to_json(orient="split"))
+                             for name, df in tables.items()))
+        with self._lock:
+            self._write_line(line)
+            for name in tables:
+                self._keys.setdefault(name, set()).add(key)
+            self._pending += 1
+            if (self._pending >= self.flush_every or
+                    _clock() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        self._fd.flush()
+        if self.fsync:
+            os.fsync(self._fd.fileno())
+        self._pending = 0
+        self._last_flush = _clock()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self, end=False):
+        """Flush and close; with ``end``, mark the stream finished for tailers"""
+        with self._lock:
+            if self._fd.closed:
+                return
+            if end:
+                self._write_line(json.dumps({"end": True, "time": _now()}))
+            self._flush()
+            self._fd.close()
+
+
+def read_records(path):
+    """Iterate over the data records of a stream file
+
+    Headers and end markers are skipped, as is an incomplete last line
+    (e.g. from a crash mid-write).
+    """
+    if not os.path.exists(path):
+        return
+    with open(path) as fd:
+        for line in fd:
+            record = _parse(line)
+            if record is None:
+                if line.endswith("\n"):
+                    _logger.warning("Skipping corrupt line in {path}".format(path=path))
+                continue
+            if "key" in record:
+                yield record
+
+
+def read_header(path):
+    """Event metadata written at the start of a stream"""
+    with open(path) as fd:
+        return _parse(fd.readline())["header"]
+
+
+def tail(path, poll_interval=1., stop=None, timeout=None):
+    """Follow a stream file, yielding records as they are flushed
+
+    Starts from the beginning of the file, and ends at an end marker, when
+    ``stop`` (a threading.Event) is set, or after ``timeout`` seconds
+    without new records.
+    """
+    while not os.path.exists(path):
+        if stop is not None and stop.is_set():
+            return
+        time.sleep(poll_interval)
+    buffered = ""
+    idle_since = _clock()
+    with open(path) as fd:
+        while stop is None or not stop.is_set():
+            chunk = fd.readline()
+            if not chunk:
+                if timeout is not None and _clock() - idle_since > timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+            buffered += chunk
+            if not buffered.endswith("\n"):
+                continue  # Partially flushed line; wait for the rest
+            record, buffered = _parse(buffered), ""
+            idle_since = _clock()
+            if record is None:
+                continue
+            if record.get("end"):
+                return
+            if "key" in record:
+                yield record
+
+
+def _frame(split):
+    return pd.DataFrame(split["data"], index=split["index"],
+                        columns=split["columns"])
+
+
+def compact(path, tables=None, compact_dtypes=False):
+    """Fold a stream into the standard tables
+
+    Args:
+        tables (list[str]): Only build these tables
+        compact_dtypes (bool): Cast the standard tables to the compact
+            dtypes of :mod:`usau.schema`, as USAUResults.compact does
+
+    Returns:
+        OrderedDict: table name to pd.DataFrame, for tables present in the
+            stream
+    """
+    latest = OrderedDict()  # table -> key -> split frame, last record wins
+    for record in read_records(path):
+        for table, split in record["tables"].items():
+            if tables is None or table in tables:
+                latest.setdefault(table, OrderedDict())[record["key"]] = split
+    compacted = OrderedDict()
+    for table, frames in latest.items():
+        frames = [_frame(split) for split in frames.values()]
+        if compact_dtypes and table in schema.SCHEMAS:
+            compacted[table] = schema.concat_tables(frames, table)
+        else:
+            compacted[table] = pd.concat(frames)
+    return compacted
@@ -0,0 +1,363 @@
+"""
+Adaptive concurrency and rate limiting for scraping play.usaultimate.org.
+
+A fixed number of workers is either slower than the server allows, or fast
+enough to get throttled (HTTP 429/503) and time out. Instead, requests go
+through a :class:`Fetcher`, which
+
+* caps the request rate per host with a token bucket, and pauses a host
+  for the duration of any Retry-After header;
+* bounds the number of requests in flight with an :class:`AdaptiveLimiter`,
+  which grows the bound additively while responses are fast and successful,
+  and halves it on errors, throttling or slow responses (AIMD);
+* retries throttled and failed requests with exponential backoff.
+
+:class:`AdaptiveExecutor` runs scrape tasks on enough threads for the
+limiter's maximum concurrency, and retries failed pages once the rest of
+the run is finished.
+
+Example:
+
+    results = usau.reports.USAUResults.from_event("club", 2018, "men")
+    results.set_executor("thread", max_workers=4, adaptive=True)
+    results.to_csvs()
+"""
+from __future__ import division, print_function
+
+from collections import defaultdict
+import functools
+import logging
+import threading
+import time
+
+import requests
+from six.moves.urllib.parse import urlparse
+
+_logger = logging.getLogger(__name__)
+
+_clock = getattr(time, "monotonic", time.time)
+
+# Responses that signal the server wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket, refilled at ``rate`` tokens per second
+
+    Args:
+        rate (float): Sustained requests per second
+        burst (int): Bucket capacity, i.e. requests allowed back to back
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = self.capacity
+        self._stamp = _clock()
+        self._paused_until = 0.
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = _clock()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now,
+                           (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hand out no tokens for the next ``seconds``, e.g. on Retry-After"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, _clock() + seconds)
+
+
+class AdaptiveLimiter(object):
+    """Bound on concurrent requests, adjusted by additive increase and
+    multiplicative decrease
+
+    Every successful response faster than ``latency_target`` raises the
+    limit by ``increase / limit``, i.e. by about ``increase`` per round of
+    requests; an error or a slow response multiplies it by ``backoff``. The
+    limit is decreased at most once per ``cooldown`` seconds, so a burst of
+    failures from the same round of requests only counts once.
+
+    Args:
+        initial (int): Starting limit
+        minimum, maximum (int): Range of the limit
+        latency_target (float): Responses slower than this many seconds are
+            treated as congestion
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, latency_target=5.,
+                 increase=1., backoff=0.5, cooldown=1.):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.increase = increase
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.history = [(_clock(), self.limit)]  # (time, limit) on each change
+        self._active = 0
+        self._last_decrease = None
+        self._cond = threading.Condition()
+
+    @property
+    def active(self):
+        """Number of requests currently in flight"""
+        return self._active
+
+    def acquire(self):
+        """Block until fewer than :attr:`limit` requests are in flight"""
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+
+    def release(self, latency=None, ok=True):
+        """Record a finished request and adjust the limit"""
+        with self._cond:
+            self._active -= 1
+            now = _clock()
+            congested = not ok or (self.latency_target is not None and
+                                   latency is not None and
+                                   latency > self.latency_target)
+            if congested:
+                if (self._last_decrease is None or
+                        now - self._last_decrease >= self.cooldown):
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.history.append((now, self.limit))
+                    _logger.debug("Decreased concurrency limit to {limit:.2f}"
+                                  .format(limit=self.limit))
+            elif self.limit < self.maximum:
+                self.limit = min(self.maximum,
+                                 self.limit + self.increase / self.limit)
+                self.history.append((now, self.limit))
+            self._cond.notify_all()
+
+
+class Fetcher(object):
+    """Rate-limited, adaptively concurrent and retrying HTTP GETs
+
+    Args:
+        limiter (AdaptiveLimiter): Shared bound on requests in flight
+        rate (float): Requests per second allowed per host
+        burst (int): Token bucket capacity per host
+        retries (int): Retries of a request on throttling or errors
+        backoff (float): Seconds before the first retry, doubled thereafter
+        timeout (float): Timeout of a single request, in seconds
+        session (requests.Session): Session whose connections are reused
+    """
+
+    def __init__(self, limiter=None, rate=8., burst=None, retries=3,
+                 backoff=0.5, timeout=30., session=None):
+        self.limiter = limiter or AdaptiveLimiter()
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.stats = defaultdict(int)
+        self.latencies = []
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        """Token bucket of a url's host"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, burst=self.burst)
+            return self._buckets[host]
+
+    def _count(self, key, latency=None):
+        with self._lock:
+            self.stats[key] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def get(self, url):
+        """GET a url, retrying on throttling, server errors and timeouts
+
+        Returns:
+            requests.Response: successful response
+
+        Raises:
+            requests.RequestException: if all attempts failed, or on a client
+                error (other than 429) that retrying would not fix
+        """
+        bucket = self.bucket(url)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            bucket.acquire()
+            self.limiter.acquire()
+            start = _clock()
+            response, error = None, None
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                error = e
+            finally:
+                latency = _clock() - start
+                status = getattr(response, "status_code", None)
+                # Missing pages and other client errors say nothing of load
+                congested = (status in THROTTLE_STATUSES or
+                             (status is not None and status >= 500) or
+                             isinstance(error, requests.Timeout))
+                self.limiter.release(latency=latency, ok=not congested)
+            self._count("requests", latency)
+            if error is None:
+                return response
+
+            if status in THROTTLE_STATUSES:
+                self._count("throttled")
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    bucket.pause(int(retry_after))
+            elif status is not None and 400 <= status < 500:
+                self._count("errors")
+                raise error
+            else:
+                self._count("errors")
+            _logger.warning("Attempt {n} of {url} failed: {error}"
+                            .format(n=attempt + 1, url=url, error=error))
+        raise error
+
+    def fetch(self, url):
+        """Text of a url, as in :func:`get`"""
+        return self.get(url).text
+
+    def summary(self):
+        """Counts of requests, retries, throttled responses and errors,
+        latency percentiles and the current concurrency limit"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            summary = dict(self.stats)
+        for name, q in (("p50", 0.5), ("p90", 0.9)):
+            summary["latency_" + name] = (
+                latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+                if latencies else None)
+        summary["limit"] = self.limiter.limit
+        return summary
+
+
+# Returned by a task of an AdaptiveExecutor to have it retried at the end
+RETRY = object()
+
+
+def _none_to_retry(fn, *args):
+    result = fn(*args)
+    return RETRY if result is None else result
+
+
+def retry_none(fn):
+    """Wrap a task to have an AdaptiveExecutor retry it when it returns None,
+    e.g. :func:`USAUResults._scrape_roster` on a failed download"""
+    return functools.partial(_none_to_retry, fn)
+
+
+class AdaptiveExecutor(object):
+    """Thread pool for scrape tasks whose requests go through a Fetcher
+
+    The pool has a thread per request the limiter could ever allow; the
+    limiter, not the pool size, sets how many requests are in flight. Tasks
+    that raise or return :data:`RETRY` are retried after all other tasks
+    have finished; None is a result like any other, e.g. of
+    :func:`USAUResults._scrape_match` on an empty match report.
+
+    Args:
+        fetcher (Fetcher): Fetcher used by the tasks
+        max_workers (int): Number of threads; defaults to the limiter maximum
+        retry_rounds (int): Rounds of retrying failed tasks at the end
+        retry_delay (float): Seconds to wait before each retry round
+    """
+
+    def __init__(self, fetcher=None, max_workers=None, retry_rounds=1,
+                 retry_delay=5.):
+        from concurrent.futures import ThreadPoolExecutor
+        self.fetcher = fetcher or Fetcher()
+        self.retry_rounds = retry_rounds
+        self.retry_delay = retry_delay
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or self.fetcher.limiter.maximum)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def completed(self, fn, *iterables):
+        """Yield (index, result) of fn over the zipped iterables as each task
+        finishes, retrying failed tasks at the end
+
+        Tasks which still return :data:`RETRY` after their retries yield
+        None. If a task still raises after its retries, the first such
+        exception (by index) is raised once every other task is yielded.
+        """
+        from concurrent.futures import as_completed
+
+        args = list(zip(*iterables))
+        pending = list(range(len(args)))
+        errors = {}
+        for attempt in range(self.retry_rounds + 1):
+            if attempt:
+                if not pending:
+                    break
+                _logger.info("Retrying {n} failed tasks after {s}s"
+                             .format(n=len(pending), s=self.retry_delay))
+                time.sleep(self.retry_delay)
+            futures = dict((self._pool.submit(fn, *args[i]), i) for i in pending)
+            failed = []
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[i] = e
+                    failed.append(i)
+                    continue
+                errors.pop(i, None)
+                if result is RETRY:
+                    failed.append(i)
+                else:
+                    yield i, result
+            pending = sorted(failed)
+        if pending:
+            _logger.warning("{n} tasks failed after retries".format(n=len(pending)))
+        for i in pending:
+            if i not in errors:
+                yield i, None
+        if errors:
+            raise errors[min(errors)]
+
+    def map(self, fn, *iterables, **kwargs):
+        """As :func:`concurrent.futures.Executor.map`, plus end-of-run retries
+
+        Results are yielded in order as soon as they and all earlier ones
+        are done, so a failed task holds back later results until it is
+        retried; see :func:`completed` for results in the order they finish.
+        ``chunksize`` is accepted for compatibility and ignored.
+        """
+        done = {}
+        next_index = 0
+        for i, result in self.completed(fn, *iterables):
+            done[i] = result
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
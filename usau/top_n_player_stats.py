@@ -16,19 +16,16 @@ import pandas as pd
 import usau.reports
 import usau.fantasy
 import usau.markdown
-
-def compute_plus_minus(df, g_weight=1, a_weight=1, d_weight=1, turn_weight=-0.5):
-  return (g_weight * df["Goals"].fillna(0) +
-          a_weight * df["Assists"].fillna(0) +
-          d_weight * df["Ds"].fillna(0) +
-          turn_weight * df["Turns"].fillna(0))
+import usau.profiling
+# Re-exported for the notebooks which import it from this script
+from usau.leaderboard import Leaderboard, compute_plus_minus
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser()
-  parser.add_argument("-y", "--year", type=int, required=True,
-                      help="Year, e.g. 20xx")
-  parser.add_argument("-e", "--event", default="nationals",
-                      help="USAU event label, such as \"nationals\" or \"us open\"")
+  parser.add_argument("-y", "--year", type=int, nargs="+", required=True,
+                      help="Year(s), e.g. 20xx")
+  parser.add_argument("-e", "--event", nargs="+", default=["nationals"],
+                      help="USAU event label(s), such as \"nationals\" or \"us open\"")
   parser.add_argument("-l", "--level",
                       required=True, choices=usau.reports.USAUResults._NATIONALS_LEVELS,
                       help="Competition level")
@@ -54,64 +51,39 @@ if __name__ == "__main__":
                       help="Teams to keep")
   parser.add_argument("--skip_teams", nargs="+",
                       help="Teams to skip")
+  usau.profiling.add_profile_argument(parser)
   args = parser.parse_args()
+  usau.profiling.start_profiling(args.profile)
 
   # rosters = {}
   genders = args.gender
   if genders is None:
     genders = ["Men", "Mixed", "Women"] if args.level == "club" else ["Men", "Women"]
 
-  for gender in genders:
-    report = usau.reports.USAUResults.from_event(year=args.year,
-                                                 level=args.level,
-                                                 gender=gender,
-                                                 event=args.event)
-    report.load_from_csvs(mandatory=False, write=True)
-    roster = report.rosters
-    if "Points" in roster.columns:
-        roster.rename(columns={"Points": "Goals"}, inplace=True)
-    elif "Goals" not in roster.columns:
-        raise ValueError("No goals column found: {}".format(roster.column))
-
-    for col in ("Goals", "Assists", "Ds", "Turns"):
-      roster[col] = roster[col].fillna(0).astype(int)
-    roster["+/-"] = compute_plus_minus(roster,
-                                       g_weight=args.goal_weight,
-                                       a_weight=args.assist_weight,
-                                       d_weight=args.d_weight,
-                                       turn_weight=args.turn_weight)
-
-    # Compute the total number of games played per team, for normalization purposes
-    matches = report.match_results.drop_duplicates(subset=["Team", "url"])
-    matches["Team Games Played"] = 1
-    matches["Team Points Played"] = matches["Score"] + matches["Opp Score"]
-    matches = matches[matches["Gs"] > 0] \
-        .rename(columns={"Score": "Team Score",
-                         "Opp Score": "Team Opp Score",
-                        })
-    matches = matches.groupby("Team")[["Team Games Played", "Team Points Played",
-                                       "Team Score", "Team Opp Score"]].sum()
-    roster = roster.join(matches, on="Team")
-    roster["+/- per Game"] = roster["+/-"] / roster["Team Games Played"]
-    roster["#Games"] = roster["Team Games Played"]
-
-    if args.keep_teams:
-      roster = roster.loc[roster["Team"].isin(args.keep_teams)].copy()
-    if args.skip_teams:
-      roster = roster.loc[~roster["Team"].isin(args.skip_teams)].copy()
+  # Load every requested event up front, so that the leaderboards
+  # of the whole batch are computed in one pass.
+  reports = []
+  for year in args.year:
+    for event in args.event:
+      for gender in genders:
+        report = usau.reports.USAUResults.from_event(year=year,
+                                                     level=args.level,
+                                                     gender=gender,
+                                                     event=event)
+        report.load_from_csvs(mandatory=False, write=True)
+        reports.append(report)
 
-    # Sort by +/-
-    sort_column = "+/- per Game" if args.sort_per_game else "+/-"
-    sort_fn = roster.sort_values if hasattr(roster, "sort_values") else roster.sort
-    res = (sort_fn(sort_column, ascending=False)
-                 .reset_index(drop=True)
-                 .head(args.num_players)
-                 [["Name", "Team",
-                   "Goals", "Assists", "Ds", "Turns",
-                   "+/-", "+/- per Game", "#Games"]]
-                 .rename(columns={"Goals": "Gs", "Assists": "As", "Turns": "Ts",
-                                  "+/- per Game": "+/-pg"})
-          )
+  leaderboard = Leaderboard(reports,
+                            goal_weight=args.goal_weight,
+                            assist_weight=args.assist_weight,
+                            d_weight=args.d_weight,
+                            turn_weight=args.turn_weight)
+  tables = leaderboard.tables(num_players=args.num_players,
+                              sort_per_game=args.sort_per_game,
+                              keep_teams=args.keep_teams,
+                              skip_teams=args.skip_teams)
+  for report in reports:
+    res = tables[report._name()]
     #     .style \
     #     .bar(subset=['Fantasy Score', 'Goals', 'Ds', '+/-'],
     #          color='rgba(80, 200, 100, 0.5)') \
@@ -123,7 +95,7 @@ if __name__ == "__main__":
           res["Team"].apply(lambda x: "**" + x + "**")
 
     print("{event} {gender} ({year})"
-          .format(year=args.year, event=report, gender=report.gender))
+          .format(year=report.year, event=report, gender=report.gender))
     if args.markdown:
       with pd.option_context('display.float_format', lambda x: "%.2f" % x):
         print(usau.markdown.pandas_to_markdown(res))
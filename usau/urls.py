@@ -0,0 +1,134 @@
+"""
+Canonical identifiers for USAU match report urls.
+
+The same game can be linked with different percent-encodings of its
+EventGameId (``%2b`` vs ``+``, ``%3d`` vs ``=``, upper or lower case hex) or
+under different paths, so raw hrefs are not reliable keys for deduplication.
+"""
+from __future__ import print_function
+
+from collections import OrderedDict
+import re
+
+import numpy as np
+import pandas as pd
+from six.moves.urllib.parse import quote, unquote
+
+_GAME_ID_RE = re.compile(r"[?&]EventGameId=([^&#]*)", re.IGNORECASE)
+MATCH_REPORT_PATH = "/teams/events/match_report/?EventGameId="
+
+
+def canonical_game_id(href):
+    """Decoded EventGameId of a match report link, or None if absent
+
+    Unlike form decoding, a literal '+' is kept as is, since it is part
+    of the base64-like id rather than an encoded space.
+    """
+    match = _GAME_ID_RE.search(href)
+    if match is None:
+        return None
+    return unquote(match.group(1))
+
+
+def canonical_match_url(href):
+    """Normalized relative url of a match report, as stored in the csvs
+
+    For example, both "/teams/events/match_report/?EventGameId=a+b%3D" and
+    "http://play.usaultimate.org/teams/events/match_report/?EventGameId=a%2bb%3d"
+    become "/teams/events/match_report/?EventGameId=a%2bb%3d".
+    """
+    game_id = canonical_game_id(href)
+    if game_id is None:
+        return href
+    quoted = quote(game_id, safe="")
+    return MATCH_REPORT_PATH + re.sub(r"%[0-9A-F]{2}",
+                                      lambda m: m.group(0).lower(), quoted)
+
+
+def game_ids(urls):
+    """Vectorized :func:`canonical_game_id` over a column of urls
+
+    Returns:
+        np.ndarray: object array of ids; urls without an id are kept as is
+    """
+    codes, uniques = pd.factorize(pd.Series(urls))
+    ids = np.array([canonical_game_id(str(url)) or url for url in uniques] +
+                   [None], dtype=object)
+    return ids[codes]  # Missing urls (code -1) map to None
+
+
+class GameIndex(object):
+    """Per-event index of seen games, keyed by canonical game id
+
+    Args:
+        urls (iterable[str]): Match report urls already seen
+    """
+
+    def __init__(self, urls=()):
+        self._urls = OrderedDict()  # game id -> first url seen
+        for url in urls:
+            self.add(url)
+
+    def __len__(self):
+        return len(self._urls)
+
+    def __contains__(self, url):
+        return (canonical_game_id(url) or url) in self._urls
+
+    def __iter__(self):
+        return iter(self._urls.values())
+
+    def __repr__(self):
+        return "GameIndex<{n} games>".format(n=len(self))
+
+    def add(self, url):
+        """Add a url; returns whether its game was not seen before"""
+        key = canonical_game_id(url) or url
+        if key in self._urls:
+            return False
+        self._urls[key] = url
+        return True
+
+    def new_urls(self, urls):
+        """Urls of games not yet in the index, unique by game
+
+        The index itself is not modified, so that games whose scrape fails
+        are picked up again by a later refresh.
+        """
+        seen = set()
+        new = []
+        for url in urls:
+            key = canonical_game_id(url) or url
+            if key not in self._urls and key not in seen:
+                seen.add(key)
+                new.append(url)
+        return new
+
+    @classmethod
+    def from_frame(cls, df, column="url"):
+        """Index of the games in a match results/reports/scores table"""
+        return cls(pd.unique(df[column].astype(str).values) if len(df) else ())
+
+
+def dedupe_games(df, column="url", keys=()):
+    """Drop rows of games duplicated under a different url
+
+    For each game (and each combination of the extra key columns, e.g. an
+    event label), only rows under the first url seen are kept, so per-player
+    and per-point rows of a single copy of the game remain intact.
+    """
+    if df is None or not len(df):
+        return df
+    url_codes, _ = pd.factorize(df[column])
+    group, _ = pd.factorize(game_ids(df[column]))
+    for key in keys:
+        codes, uniques = pd.factorize(df[key])
+        group, _ = pd.factorize(group * (len(uniques) + 1) + codes)
+    # Url of the first row of each group
+    uniques, first = np.unique(group, return_index=True)
+    first_url = np.empty(len(uniques), dtype=url_codes.dtype)
+    first_url[uniques] = url_codes[first]
+    keep = url_codes == first_url[group]
+    if keep.all():
+        return df
+    return df[keep]
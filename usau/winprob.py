@@ -0,0 +1,240 @@
+"""
+In-game win probabilities from archived score progressions.
+
+Every point state of every archived game, from both teams' perspectives, is
+counted into a table indexed by (covariate bucket, score for, score
+against), where the optional covariate is the seed differential or the
+rating gap between the teams. Sparse states are smoothed towards a Gaussian
+kernel average of their neighbouring states, itself smoothed towards the
+win rate at the same score margin, so even unseen states get sensible
+probabilities. A live lookup is then a single array index.
+
+Example:
+
+    scores = usau.archive.load_archive(tables=["scores"]).scores
+    model = WinProbability.fit(scores, seed_differential(scores), bins=SEED_BINS)
+    model.lookup(9, 11, covariate=3)  # Down 9-11, but seeded 3 places higher
+    win_probability_added(scores, model).nlargest(5, "home_wpa")
+"""
+from __future__ import division, print_function
+
+import numpy as np
+import pandas as pd
+
+# Bucket edges of the seed differential (opponent's seed minus own seed)
+SEED_BINS = (-4.5, -1.5, 1.5, 4.5)
+# Bucket edges of the rating gap (own rating minus opponent's), in points
+RATING_BINS = (-3., -1., 1., 3.)
+
+
+def seed_differential(scores):
+    """Per score row, the away seed minus the home seed; positive when the
+    home team is seeded higher"""
+    return (scores["away_seed"].astype(float) - scores["home_seed"].astype(float)).values
+
+
+def rating_gap(scores, ratings):
+    """Per score row, the home team's rating minus the away team's
+
+    Args:
+        scores (pd.DataFrame): With a "division" column, as in an archive
+        ratings (usau.ratings.TeamRatings): Fit ratings
+    """
+    table = ratings.ratings.set_index(["Division", "Team"])["Rating"]
+
+    def lookup(teams):
+        keys = pd.MultiIndex.from_arrays([scores["division"].astype(str).values,
+                                          scores[teams].astype(str).values])
+        indexer = table.index.get_indexer(keys)
+        return np.where(indexer >= 0, table.values[indexer], np.nan)
+    return lookup("home_team") - lookup("away_team")
+
+
+def _smooth(grid, sigma):
+    """Gaussian kernel smoothing over the last two (score) axes"""
+    radius = max(1, int(np.ceil(2 * sigma)))
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    padded = np.pad(grid, [(0, 0)] * (grid.ndim - 2) + [(radius, radius)] * 2,
+                    mode="constant")
+    rows, cols = grid.shape[-2:]
+    smoothed = np.zeros(grid.shape)
+    for i, row_weight in zip(offsets, kernel):
+        for j, col_weight in zip(offsets, kernel):
+            smoothed += row_weight * col_weight * padded[
+                ..., radius + i:radius + i + rows, radius + j:radius + j + cols]
+    return smoothed
+
+
+class WinProbability(object):
+    """Lookup table of win probability by score state
+
+    Attributes:
+        table (np.ndarray): (buckets, max_score + 1, max_score + 1)
+            probability of winning, by (bucket, score for, score against)
+        wins, counts (np.ndarray): Raw counts of states, as the table
+        bins (np.ndarray): Covariate bucket edges; empty for one bucket
+    """
+
+    def __init__(self, table, wins, counts, bins=()):
+        self.table = table
+        self.wins = wins
+        self.counts = counts
+        self.bins = np.asarray(bins, dtype=float)
+
+    def __repr__(self):
+        return ("WinProbability<{n} states, {b} buckets>"
+                .format(n=int(self.counts.sum()), b=len(self.table)))
+
+    @property
+    def max_score(self):
+        return self.table.shape[-1] - 1
+
+    @classmethod
+    def fit(cls, scores, covariate=None, bins=(), max_score=20, sigma=1.,
+            strength=5.):
+        """Fit from score progressions, as in USAUResults.score_progressions
+
+        Args:
+            scores (pd.DataFrame): Score states with final scores; tied
+                games are skipped
+            covariate (np.ndarray): Per row, from the home team's
+                perspective, e.g. :func:`seed_differential`; rows where it
+                is NaN are skipped
+            bins (list[float]): Covariate bucket edges
+            max_score (int): Scores above this share its state
+            sigma (float): Kernel width, in points, of the smoothing prior
+            strength (float): Weight of each prior, in pseudo-games; states
+                with far more games than this follow their own win rate
+
+        Returns:
+            WinProbability
+        """
+        home = scores["home_score"].values.astype(np.int64)
+        away = scores["away_score"].values.astype(np.int64)
+        home_final = scores["home_final_score"].values.astype(np.int64)
+        away_final = scores["away_final_score"].values.astype(np.int64)
+        valid = home_final != away_final
+        bins = np.asarray(bins, dtype=float)
+        if covariate is None:
+            covariate = np.zeros(len(scores))
+        covariate = np.asarray(covariate, dtype=float)
+        valid &= ~np.isnan(covariate)
+        home, away, covariate = home[valid], away[valid], covariate[valid]
+        home_won = (home_final > away_final)[valid]
+
+        # Both teams' perspectives of every state
+        score_for = np.minimum(np.r_[home, away], max_score)
+        score_against = np.minimum(np.r_[away, home], max_score)
+        bucket = np.searchsorted(bins, np.r_[covariate, -covariate], side="right")
+        won = np.r_[home_won, ~home_won]
+
+        size = max_score + 1
+        shape = (len(bins) + 1, size, size)
+        flat = (bucket * size + score_for) * size + score_against
+        counts = np.bincount(flat, minlength=np.prod(shape)).reshape(shape).astype(float)
+        wins = np.bincount(flat, weights=won, minlength=np.prod(shape)).reshape(shape)
+
+        # Win rate by margin, score for minus score against, per bucket
+        margin = np.subtract.outer(np.arange(size), np.arange(size)) + max_score
+        margin_counts = np.zeros((len(bins) + 1, 2 * size - 1))
+        margin_wins = np.zeros((len(bins) + 1, 2 * size - 1))
+        for i in range(len(bins) + 1):
+            margin_counts[i] = np.bincount(margin.ravel(), counts[i].ravel(), 2 * size - 1)
+            margin_wins[i] = np.bincount(margin.ravel(), wins[i].ravel(), 2 * size - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            margin_rate = np.where(margin_counts > 0, (margin_wins + strength * 0.5) /
+                                   (margin_counts + strength), np.nan)
+        margin_rate[:, max_score] = 0.5
+        # A bigger lead never lowers the win rate; this also fills unseen
+        # margins from the nearest seen margin of their sign
+        leads = np.fmax.accumulate(margin_rate[:, max_score:], axis=1)
+        deficits = np.fmin.accumulate(margin_rate[:, max_score::-1], axis=1)
+        margin_rate = np.c_[deficits[:, :0:-1], leads]
+        margin_prior = margin_rate[:, margin]
+
+        prior = ((_smooth(wins, sigma) + strength * margin_prior) /
+                 (_smooth(counts, sigma) + strength))
+        table = (wins + strength * prior) / (counts + strength)
+        return cls(table, wins, counts, bins)
+
+    @classmethod
+    def from_archive(cls, archive, by=None, ratings=None, **kwargs):
+        """Fit from an :class:`usau.archive.Archive`'s scores
+
+        Args:
+            by (str): None, "seed" or "rating" (which needs ``ratings``)
+        """
+        scores = archive.scores
+        if by == "seed":
+            kwargs.setdefault("bins", SEED_BINS)
+            return cls.fit(scores, seed_differential(scores), **kwargs)
+        if by == "rating":
+            kwargs.setdefault("bins", RATING_BINS)
+            return cls.fit(scores, rating_gap(scores, ratings), **kwargs)
+        return cls.fit(scores, **kwargs)
+
+    def bucket(self, covariate):
+        """Bucket of a covariate; unknown covariates fall in the even bucket"""
+        if covariate is None or np.isnan(covariate):
+            covariate = 0.
+        return int(np.searchsorted(self.bins, covariate, side="right"))
+
+    def lookup(self, score_for, score_against, covariate=None):
+        """Probability that a team leading/trailing score_for-score_against
+        wins, given its seed differential or rating gap if bucketed"""
+        return self.table[self.bucket(covariate),
+                          min(score_for, self.max_score),
+                          min(score_against, self.max_score)]
+
+    def lookup_many(self, score_for, score_against, covariate=None):
+        """Vectorized :func:`lookup`"""
+        score_for = np.minimum(np.asarray(score_for, dtype=np.int64), self.max_score)
+        score_against = np.minimum(np.asarray(score_against, dtype=np.int64), self.max_score)
+        bucket = (np.zeros(len(score_for), dtype=np.int64) if covariate is None else
+                  np.searchsorted(self.bins, np.nan_to_num(covariate), side="right"))
+        return self.table[bucket, score_for, score_against]
+
+    def frame(self, covariate=None):
+        """pd.DataFrame of a bucket's table, score for by score against"""
+        return pd.DataFrame(self.table[self.bucket(covariate)])
+
+    def save(self, path):
+        np.savez(path, table=self.table, wins=self.wins, counts=self.counts,
+                 bins=self.bins)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["table"], data["wins"], data["counts"], data["bins"])
+
+
+def win_probability_added(scores, model, covariate=None):
+    """Win probability, and that added by each point, of archived games
+
+    Args:
+        scores (pd.DataFrame): Score progressions, each game's points in
+            order and contiguous, as in USAUResults.score_progressions
+        model (WinProbability): Fit model
+        covariate (np.ndarray): Per row, as the model was fit with
+
+    Returns:
+        pd.DataFrame: scores with "home_wp" after each point and "home_wpa",
+            the change since the previous point; the away team's are
+            1 - home_wp and -home_wpa. The first state of each game is
+            compared to the 0-0 state.
+    """
+    wp = model.lookup_many(scores["home_score"].values, scores["away_score"].values,
+                           covariate)
+    urls = scores["url"].astype(str).values
+    first = np.r_[True, urls[1:] != urls[:-1]]
+    if "event" in scores.columns:
+        events = scores["event"].astype(str).values
+        first |= np.r_[True, events[1:] != events[:-1]]
+    start = model.lookup_many(np.zeros(len(scores)), np.zeros(len(scores)), covariate)
+    previous = np.where(first, start, np.r_[np.nan, wp[:-1]])
+    df = scores.copy()
+    df["home_wp"] = wp
+    df["home_wpa"] = wp - previous
+    return df